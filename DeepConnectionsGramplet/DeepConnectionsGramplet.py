@@ -26,6 +26,8 @@
 # Python modules
 #
 # ------------------------------------------------------------------------
+from collections import defaultdict, deque
+
 from gi.repository import Gtk, GLib
 
 # ------------------------------------------------------------------------
@@ -151,6 +153,12 @@ class DeepConnectionsGramplet(Gramplet):
         self.people_processed = 0
         self.queue_size = 0
 
+        # Adjacency index: handle -> [(relative handle, edge label)], its
+        # reverse, and a cache of family members; built by the first search
+        self.adjacency = None
+        self.reverse = None
+        self.families = None
+
     def clear_results(self, widget=None):
         """Clear the current results and reset the display."""
         self.set_text("")
@@ -192,91 +200,209 @@ class DeepConnectionsGramplet(Gramplet):
         changed
         """
         self.selected_handles = set()
+        self.adjacency = None
         self.connect(self.dbstate.db, "home-person-changed", self.update)
-        self.connect(self.dbstate.db, "person-add", self.update)
-        self.connect(self.dbstate.db, "person-delete", self.update)
-        self.connect(self.dbstate.db, "person-update", self.update)
-        self.connect(self.dbstate.db, "family-add", self.update)
-        self.connect(self.dbstate.db, "family-delete", self.update)
-        self.connect(self.dbstate.db, "person-rebuild", self.update)
-        self.connect(self.dbstate.db, "family-rebuild", self.update)
+        self.connect(self.dbstate.db, "person-add", self.persons_changed)
+        self.connect(self.dbstate.db, "person-delete", self.persons_deleted)
+        self.connect(self.dbstate.db, "person-update", self.persons_changed)
+        self.connect(self.dbstate.db, "family-add", self.families_changed)
+        self.connect(self.dbstate.db, "family-delete", self.families_deleted)
+        self.connect(self.dbstate.db, "family-update", self.families_changed)
+        self.connect(self.dbstate.db, "person-rebuild", self.index_rebuild)
+        self.connect(self.dbstate.db, "family-rebuild", self.index_rebuild)
+
+    def persons_changed(self, handles):
+        """
+        Reindex the edges of added or edited people.
+        """
+        if self.adjacency is not None:
+            for handle in handles:
+                self.index_person(handle)
+        self.update()
+
+    def persons_deleted(self, handles):
+        """
+        Drop deleted people, and the edges leading to them, from the index.
+        """
+        if self.adjacency is not None:
+            for handle in handles:
+                self.unindex_person(handle)
+                for source in {edge[0] for edge in self.reverse.pop(handle, ())}:
+                    if source in self.adjacency:
+                        self.adjacency[source] = [
+                            edge for edge in self.adjacency[source]
+                            if edge[0] != handle
+                        ]
+        self.update()
+
+    def families_changed(self, handles):
+        """
+        Reindex everyone who is, or was, a member of a changed family.
+        """
+        if self.adjacency is not None:
+            members = set()
+            for family_handle in handles:
+                old = self.families.pop(family_handle, None)
+                new = self.get_family(family_handle)
+                for family in (old, new):
+                    if family:
+                        members.update(family[:2])
+                        members.update(family[2])
+            members.discard(None)
+            for handle in members:
+                self.index_person(handle)
+        self.update()
+
+    def families_deleted(self, handles):
+        """
+        Drop deleted families, and reindex their former members.
+        """
+        if self.adjacency is not None:
+            members = set()
+            for family_handle in handles:
+                family = self.families.pop(family_handle, None)
+                if family:
+                    members.update(family[:2])
+                    members.update(family[2])
+            members.discard(None)
+            for handle in members:
+                self.index_person(handle)
+        self.update()
 
-    def get_links_from_notes(self, obj, path, relation, person_handle):
+    def index_rebuild(self):
+        """
+        Throw the index away, it is rebuilt by the next search.
+        """
+        self.adjacency = None
+        self.update()
+
+    def get_mentions(self, obj):
         """
         Get anyone mentioned in any note attached to this object.
         """
         retval = []
-        note_list = obj.get_note_list()
-        for note_handle in note_list:
+        for note_handle in obj.get_note_list():
             note = self.dbstate.db.get_note_from_handle(note_handle)
             if note:
-                links = note.get_links()
-                for link in links:
-                    if link[0] == "gramps" and link[1] == "Person":
-                        relation = _("mentioned in note")
-                        if link[2] == "handle":
-                            retval += [(link[3], (path, (relation, person_handle)))]
-        return retval
+                for link in note.get_links():
+                    if (
+                        link[0] == "gramps"
+                        and link[1] == "Person"
+                        and link[2] == "handle"
+                    ):
+                        retval.append(link[3])
+        return tuple(retval)
+
+    def get_family(self, family_handle):
+        """
+        Return (father, mother, children, mentions) of a family, from the
+        cache or the database.
+        """
+        if family_handle not in self.families:
+            db = self.dbstate.db
+            if db.has_family_handle(family_handle):
+                family = db.get_family_from_handle(family_handle)
+                self.families[family_handle] = (
+                    family.get_father_handle(),
+                    family.get_mother_handle(),
+                    tuple(child_ref.ref for child_ref in family.get_child_ref_list()),
+                    self.get_mentions(family),
+                )
+            else:
+                self.families[family_handle] = None
+        return self.families[family_handle]
 
-    def get_relatives(self, person_handle, path):
+    def get_relatives(self, person):
         """
-        Gets all of the relations of person_handle.
+        Gets all of the relations of a person, as (handle, label) pairs where
+        label is (relation_text, person_handle, [p1, [p2]]).
         """
         retval = []
-        person = self.dbstate.db.get_person_from_handle(person_handle)
-        if person is None:
-            return []
-        family_list = person.get_family_handle_list()
-        for family_handle in family_list:
-            family = self.dbstate.db.get_family_from_handle(family_handle)
+        person_handle = person.handle
+        mentioned = _("mentioned in note")
+        for family_handle in person.get_family_handle_list():
+            family = self.get_family(family_handle)
             if family:
-                children = family.get_child_ref_list()
-                husband = family.get_father_handle()
-                wife = family.get_mother_handle()
+                husband, wife, children, mentions = family
                 retval.extend(
-                    (child_ref.ref, (path, (_("child"), person_handle, husband, wife)))
-                    for child_ref in children
+                    (child, (_("child"), person_handle, husband, wife))
+                    for child in children
                 )
                 if husband and husband != person_handle:
-                    retval += [(husband, (path, (_("husband"), person_handle)))]
+                    retval.append((husband, (_("husband"), person_handle)))
                 if wife and wife != person_handle:
-                    retval += [(wife, (path, (_("wife"), person_handle)))]
-                retval += self.get_links_from_notes(
-                    family, path, _("Note on Family"), person_handle
+                    retval.append((wife, (_("wife"), person_handle)))
+                retval.extend(
+                    (handle, (mentioned, person_handle)) for handle in mentions
                 )
 
-        parent_family_list = person.get_parent_family_handle_list()
-        for family_handle in parent_family_list:
-            family = self.dbstate.db.get_family_from_handle(family_handle)
+        for family_handle in person.get_parent_family_handle_list():
+            family = self.get_family(family_handle)
             if family:
-                children = family.get_child_ref_list()
-                husband = family.get_father_handle()
-                wife = family.get_mother_handle()
+                husband, wife, children, mentions = family
                 retval.extend(
-                    (
-                        child_ref.ref,
-                        (path, (_("sibling"), person_handle, husband, wife)),
-                    )
-                    for child_ref in children
-                    if child_ref.ref != person_handle
+                    (child, (_("sibling"), person_handle, husband, wife))
+                    for child in children
+                    if child != person_handle
                 )
                 if husband and husband != person_handle:
-                    retval += [(husband, (path, (_("father"), person_handle, wife)))]
+                    retval.append((husband, (_("father"), person_handle, wife)))
                 if wife and wife != person_handle:
-                    retval += [(wife, (path, (_("mother"), person_handle, husband)))]
-                retval += self.get_links_from_notes(
-                    family, path, _("Note on Parent Family"), person_handle
+                    retval.append((wife, (_("mother"), person_handle, husband)))
+                retval.extend(
+                    (handle, (mentioned, person_handle)) for handle in mentions
                 )
-        assoc_list = person.get_person_ref_list()
-        for assoc in assoc_list:
+
+        for assoc in person.get_person_ref_list():
             relation = _("%s (association)") % assoc.get_relation()
-            assoc_handle = assoc.get_reference_handle()
-            retval += [(assoc_handle, (path, (relation, person_handle)))]
+            retval.append((assoc.get_reference_handle(), (relation, person_handle)))
 
-        retval += self.get_links_from_notes(
-            person, path, _("Note on Person"), person_handle
+        retval.extend(
+            (handle, (mentioned, person_handle))
+            for handle in self.get_mentions(person)
         )
-        return retval
+        return [edge for edge in retval if edge[0] is not None]
+
+    def index_person(self, person_handle, person=None):
+        """
+        (Re)compute the edges leaving a person.
+        """
+        self.unindex_person(person_handle)
+        if person is None:
+            # may have been deleted in the same transaction
+            if not self.dbstate.db.has_person_handle(person_handle):
+                return
+            person = self.dbstate.db.get_person_from_handle(person_handle)
+        edges = self.get_relatives(person)
+        self.adjacency[person_handle] = edges
+        for target, label in edges:
+            self.reverse[target].append((person_handle, label))
+
+    def unindex_person(self, person_handle):
+        """
+        Remove the edges leaving a person.
+        """
+        for target in {edge[0] for edge in self.adjacency.pop(person_handle, ())}:
+            self.reverse[target] = [
+                edge for edge in self.reverse[target] if edge[0] != person_handle
+            ]
+
+    def build_index(self):
+        """
+        Build the adjacency index of the whole tree. This is a generator,
+        yielding now and then to keep the interface responsive.
+        """
+        self.update_status(_("Indexing family tree..."))
+        db = self.dbstate.db
+        self.adjacency = {}
+        self.reverse = defaultdict(list)
+        self.families = {}
+        total = db.get_number_of_people()
+        for count, person in enumerate(db.iter_people(), 1):
+            self.index_person(person.handle, person)
+            if count % 500 == 0:
+                self.update_progress(count, total)
+                yield True
 
     def active_changed(self, handle):
         """
@@ -349,14 +475,6 @@ class DeepConnectionsGramplet(Gramplet):
             self.pause_button.set_sensitive(True)
             self.copy_button.set_sensitive(False)
 
-            self.cache = set()
-            self.queue = [
-                (
-                    self.default_person.handle,
-                    (None, (_("self"), self.default_person.handle, [])),
-                )
-            ]
-
             default_name = self.default_person.get_primary_name()
             active_name = active_person.get_primary_name()
 
@@ -375,82 +493,109 @@ class DeepConnectionsGramplet(Gramplet):
 
             yield True
 
+            if self.adjacency is None:
+                yield from self.build_index()
+
             relationship = self.relationship_calc.get_one_relationship(
                 self.dbstate.db, self.default_person, active_person
             )
 
             self.update_status(_("Searching for connections..."))
 
-            while self.queue:
-                current_handle, current_path = self.queue.pop(0)
-                self.queue_size = len(self.queue)
-                self.people_processed += 1
-
-                # Update progress every 10 people processed
-                if self.people_processed % 10 == 0:
-                    self.update_progress(
-                        self.people_processed, self.people_processed + self.queue_size
-                    )
-                    self.update_search_info(
-                        self.search_depth, self.people_processed, self.queue_size
-                    )
-                    yield True
-
-                if current_handle == active_person.handle:
-                    self.total_relations_found += 1
-                    self.append_text(
-                        _("Found relation #%d: \n   ") % self.total_relations_found
-                    )
-
-                    self.link(
-                        name_displayer.display_name(active_name),
-                        "Person",
-                        active_person.handle,
-                    )
-                    if relationship:
-                        self.append_text(" [%s]" % relationship)
-                    self.selected_handles.clear()
-                    self.selected_handles.add(active_person.handle)
-                    self.pretty_print(current_path)
-                    self.append_text("\n")
-
-                    # Enable copy button when we have results
-                    self.copy_button.set_sensitive(True)
-
-                    if self.default_person.handle != active_person.handle:
-                        self.append_text(
-                            _(
-                                "Paused.\nPress Continue to search for additional relations.\n"
-                            )
-                        )
-                        self.update_status(
-                            _("Paused - Press Continue to search for more relations")
-                        )
-                        self.continue_button.set_sensitive(True)
-                        self.pause_button.set_sensitive(False)
-                        self.pause()
-                        yield False
+            # Meet in the middle: search forward from the home person and
+            # backward from the active person, always expanding the smaller
+            # frontier by one generation. Each side keeps a parent pointer
+            # map, handle -> (next handle towards its root, edge label).
+            home_handle = self.default_person.handle
+            active_handle = active_person.handle
+            forward = {home_handle: None}
+            backward = {active_handle: None}
+            forward_queue = deque([home_handle])
+            backward_queue = deque([active_handle])
+            found = set()
+            meetings = []
+            if home_handle == active_handle:
+                meetings.append((home_handle, None, None))
+
+            while meetings or (forward_queue and backward_queue):
+                if not meetings:
+                    if len(forward_queue) <= len(backward_queue):
+                        queue, visited, other = forward_queue, forward, backward
+                        edges = self.adjacency
                     else:
-                        break
-                elif current_handle in self.cache:
+                        queue, visited, other = backward_queue, backward, forward
+                        edges = self.reverse
+                    self.search_depth += 1
+                    for _count in range(len(queue)):
+                        current_handle = queue.popleft()
+                        self.people_processed += 1
+                        for handle, label in edges.get(current_handle, ()):
+                            if handle not in visited:
+                                visited[handle] = (current_handle, label)
+                                queue.append(handle)
+                            if handle in other:
+                                if visited is forward:
+                                    edge = (current_handle, handle, label)
+                                else:
+                                    edge = (handle, current_handle, label)
+                                if edge[:2] not in found:
+                                    found.add(edge[:2])
+                                    meetings.append(edge)
+                        # Update progress every 10 people processed
+                        if self.people_processed % 10 == 0:
+                            self.queue_size = len(forward_queue) + len(
+                                backward_queue
+                            )
+                            self.update_progress(
+                                self.people_processed,
+                                self.people_processed + self.queue_size,
+                            )
+                            self.update_search_info(
+                                self.search_depth,
+                                self.people_processed,
+                                self.queue_size,
+                            )
+                            yield True
                     continue
 
-                self.cache.add(current_handle)
-                relatives = self.get_relatives(current_handle, current_path)
+                path = self.join_path(forward, backward, *meetings.pop(0))
+                if path is None:
+                    continue
+                self.total_relations_found += 1
+                self.append_text(
+                    _("Found relation #%d: \n   ") % self.total_relations_found
+                )
 
-                # Track search depth
-                if current_path[0] is not None:
-                    self.search_depth = max(
-                        self.search_depth, self._calculate_path_depth(current_path)
-                    )
+                self.link(
+                    name_displayer.display_name(active_name),
+                    "Person",
+                    active_person.handle,
+                )
+                if relationship:
+                    self.append_text(" [%s]" % relationship)
+                self.selected_handles.clear()
+                self.selected_handles.add(active_person.handle)
+                self.pretty_print(path)
+                self.append_text("\n")
 
-                for items in relatives:
-                    person_handle = items[0]
-                    path = items[1]
-                    if person_handle is not None:
-                        self.queue.append((person_handle, path))
+                # Enable copy button when we have results
+                self.copy_button.set_sensitive(True)
 
-                yield True
+                if home_handle != active_handle:
+                    self.append_text(
+                        _(
+                            "Paused.\nPress Continue to search for additional relations.\n"
+                        )
+                    )
+                    self.update_status(
+                        _("Paused - Press Continue to search for more relations")
+                    )
+                    self.continue_button.set_sensitive(True)
+                    self.pause_button.set_sensitive(False)
+                    self.pause()
+                    yield False
+                else:
+                    break
 
             self.append_text(
                 _("\nSearch completed. %d relation paths found.")
@@ -475,6 +620,38 @@ class DeepConnectionsGramplet(Gramplet):
             self.search_active = False
             yield False
 
+    def join_path(self, forward, backward, meet_from, meet_to, label):
+        """
+        Join the two halves of a connection that meet at the edge
+        meet_from -> meet_to, into the nested path used by pretty_print.
+        Returns None if the halves cross, as the path is then not simple.
+        """
+        labels = []
+        handles = set()
+        handle = meet_from
+        while forward[handle] is not None:
+            handles.add(handle)
+            handle, edge_label = forward[handle]
+            labels.append(edge_label)
+        handles.add(handle)
+        labels.reverse()
+        if label is not None:
+            labels.append(label)
+            handle = meet_to
+            while True:
+                if handle in handles:
+                    return None
+                if backward[handle] is None:
+                    break
+                handle, edge_label = backward[handle]
+                labels.append(edge_label)
+
+        # (path, (relation_text, handle, [p1, [p2]]))
+        path = (None, (_("self"), self.default_person.handle, []))
+        for edge_label in labels:
+            path = (path, edge_label)
+        return path
+
     def resume_search(self, widget):
         """Resume the search after being paused."""
         if self.search_active:
@@ -490,12 +667,3 @@ class DeepConnectionsGramplet(Gramplet):
             self.pause_button.set_sensitive(False)
             self.continue_button.set_sensitive(True)
             self.interrupt()
-
-    def _calculate_path_depth(self, path):
-        """Calculate the depth of a relationship path."""
-        depth = 0
-        current_path = path
-        while current_path[0] is not None:
-            depth += 1
-            current_path = current_path[0]
-        return depth
@@ -48,6 +48,9 @@ class DescendantCountGramplet(Gramplet):
     Show a list of Persons with a count of their descendants.
     """
     def init(self):
+        self.counter = DescendantCounter()
+        self.rows = {}
+        self.stale = True
         self.gui.WIDGET = self.build_gui()
         self.gui.get_container_widget().remove(self.gui.textview)
         self.gui.get_container_widget().add(self.gui.WIDGET)
@@ -55,30 +58,98 @@ class DescendantCountGramplet(Gramplet):
 
     def main(self):
         database = self.dbstate.db
+        self.rows = {}
+        self.model.clear()
+        if not database.is_open():
+            self.set_has_data(False)
+            return
         simple_a = SimpleAccess(database)
         # stime = time.perf_counter()
-        counts_list = {}
+        self.counter.build(database)
         count = 0
-        self.model.clear()
         for person in database.iter_people():
             if count == 200:
                 count = 0
                 yield True
             count += 1
-            result = len(countem(database, person, counts_list))
-            self.model.append((simple_a.describe(person), result,
-                               person.handle))
+            self.rows[person.handle] = self.model.append(
+                (simple_a.describe(person), self.counter.count(person.handle),
+                 person.handle))
         self.set_has_data(len(self.model) > 0)
+        self.stale = False
         # print(time.perf_counter() - stime)
 
     def db_changed(self):
-        self.connect(self.dbstate.db, 'person-add', self.update)
-        self.connect(self.dbstate.db, 'person-delete', self.update)
-        self.connect(self.dbstate.db, 'family-add', self.update)
-        self.connect(self.dbstate.db, 'family-delete', self.update)
-        self.connect(self.dbstate.db, 'family-update', self.update)
-        self.connect(self.dbstate.db, 'person-rebuild', self.update)
-        self.connect(self.dbstate.db, 'family-rebuild', self.update)
+        self.stale = True
+        self.connect(self.dbstate.db, 'person-add', self.people_added)
+        self.connect(self.dbstate.db, 'person-delete', self.people_deleted)
+        self.connect(self.dbstate.db, 'family-add', self.families_changed)
+        self.connect(self.dbstate.db, 'family-delete', self.families_changed)
+        self.connect(self.dbstate.db, 'family-update', self.families_changed)
+        self.connect(self.dbstate.db, 'person-rebuild', self.rebuild)
+        self.connect(self.dbstate.db, 'family-rebuild', self.rebuild)
+
+    def rebuild(self, *args):
+        """
+        Recount everyone.
+        """
+        self.stale = True
+        self.update()
+
+    def can_update(self):
+        """
+        Return True if the counts are complete and can be patched in place.
+        """
+        if self.stale or not self.active or self._idle_id != 0:
+            self.rebuild()
+            return False
+        return True
+
+    def people_added(self, handles):
+        """
+        Add rows for new people.
+        """
+        if not self.can_update():
+            return
+        simple_a = SimpleAccess(self.dbstate.db)
+        for handle in handles:
+            person = self.dbstate.db.get_person_from_handle(handle)
+            if person and handle not in self.rows:
+                self.rows[handle] = self.model.append(
+                    (simple_a.describe(person), 0, handle))
+        self.refresh_counts(self.counter.add_people(self.dbstate.db, handles))
+        self.set_has_data(len(self.model) > 0)
+
+    def people_deleted(self, handles):
+        """
+        Remove the rows of deleted people.
+        """
+        if not self.can_update():
+            return
+        for handle in handles:
+            iter_ = self.rows.pop(handle, None)
+            if iter_ is not None:
+                self.model.remove(iter_)
+        self.refresh_counts(self.counter.remove_people(handles))
+        self.set_has_data(len(self.model) > 0)
+
+    def families_changed(self, handles):
+        """
+        Recount the parents of changed families and their ancestors.
+        """
+        if not self.can_update():
+            return
+        self.refresh_counts(
+            self.counter.update_families(self.dbstate.db, handles))
+
+    def refresh_counts(self, handles):
+        """
+        Show the current counts of the given people.
+        """
+        for handle in handles:
+            iter_ = self.rows.get(handle)
+            if iter_ is not None:
+                self.model.set_value(iter_, 1, self.counter.count(handle))
 
     def build_gui(self):
         """
@@ -128,20 +199,217 @@ class DescendantCountGramplet(Gramplet):
 # Functions
 #
 #------------------------------------------------------------------------
-def countem(db, person, counts_list):
+class DescendantCounter:
     """
-    person is the one currently in process
-    counts_list is a dict, handle for key, h_list(set) as value
-    h_list is a set of handles of everyone below current person
+    Count the descendants of everyone in a database.
+
+    People are numbered in depth-first post-order, so without pedigree
+    collapse the descendants of anyone are a single range of numbers.
+    The descendants of each person are kept as a sorted list of merged
+    (start, stop) ranges, which de-duplicates people reached along more
+    than one line without keeping a set of handles per person.
     """
-    h_list = counts_list.get(person.handle, None)
-    if h_list:
-        return h_list
-    h_list = set()
-    counts_list[person.handle] = h_list  # protects against loops
-    for fam_handle in person.get_family_handle_list():
-        fam = db.get_family_from_handle(fam_handle)
-        for child_ref in fam.get_child_ref_list():
-            child = db.get_person_from_handle(child_ref.ref)
-            h_list.update(countem(db, child, counts_list), [child_ref.ref])
-    return h_list
+    def __init__(self):
+        self.index = {}             # handle -> number
+        self.handles = []           # number -> handle, None if deleted
+        self.children = []          # number -> child numbers
+        self.parents = []           # number -> parent numbers
+        self.ranges = []            # number -> merged descendant ranges
+        self.family_parents = {}    # family handle -> parent handles
+
+    def build(self, db):
+        """
+        Number and count everyone in the database.
+        """
+        family_children = {}
+        self.family_parents = {}
+        for handle, family in db._iter_raw_family_data():
+            family_children[handle] = [ref.ref for ref in
+                                       family.child_ref_list]
+            self.family_parents[handle] = tuple(
+                parent for parent in (family.father_handle,
+                                      family.mother_handle) if parent)
+        person_children = {}
+        for handle, person in db._iter_raw_person_data():
+            person_children[handle] = [
+                child for fam_handle in person.family_list
+                for child in family_children.get(fam_handle, ())]
+
+        # number everyone after all of their descendants
+        self.index = {}
+        self.handles = []
+        visiting = set()
+        for root in person_children:
+            if root in self.index:
+                continue
+            visiting.add(root)
+            stack = [(root, iter(person_children[root]))]
+            while stack:
+                handle, children = stack[-1]
+                for child in children:
+                    if (child in person_children and
+                            child not in self.index and
+                            child not in visiting):
+                        visiting.add(child)
+                        stack.append((child, iter(person_children[child])))
+                        break
+                else:
+                    stack.pop()
+                    visiting.discard(handle)
+                    self.index[handle] = len(self.handles)
+                    self.handles.append(handle)
+
+        self.children = [[self.index[child] for child in
+                          person_children[handle] if child in self.index]
+                         for handle in self.handles]
+        self.parents = [[] for _handle in self.handles]
+        for number, children in enumerate(self.children):
+            for child in children:
+                self.parents[child].append(number)
+        # children come first, except across a loop in the data
+        self.ranges = [[] for _handle in self.handles]
+        for number in range(len(self.handles)):
+            self.ranges[number] = self._merge(number)
+
+    def count(self, handle):
+        """
+        Return the number of descendants of a person.
+        """
+        number = self.index.get(handle)
+        if number is None:
+            return 0
+        return sum(stop - start for start, stop in self.ranges[number])
+
+    def add_people(self, db, handles):
+        """
+        Number new people. Returns the handles of people whose count may
+        have changed.
+        """
+        for handle in handles:
+            if handle not in self.index:
+                self.index[handle] = len(self.handles)
+                self.handles.append(handle)
+                self.children.append([])
+                self.parents.append([])
+                self.ranges.append([])
+        return self._refresh(db, handles)
+
+    def remove_people(self, handles):
+        """
+        Forget deleted people. Returns the handles of people whose count
+        may have changed.
+        """
+        numbers = set()
+        removed = set()
+        for handle in handles:
+            number = self.index.pop(handle, None)
+            if number is None:
+                continue
+            removed.add(number)
+            self._set_children(number, [])
+            for parent in self.parents[number]:
+                self.children[parent] = [
+                    child for child in self.children[parent]
+                    if child != number]
+                numbers.add(parent)
+            self.parents[number] = []
+            self.handles[number] = None
+        return self._recount(numbers - removed)
+
+    def update_families(self, db, handles):
+        """
+        Recount after families were added, changed or deleted. Returns the
+        handles of people whose count may have changed.
+        """
+        people = set()
+        for handle in handles:
+            people.update(self.family_parents.pop(handle, ()))
+            family = db.get_raw_family_data(handle)
+            if family:
+                parents = tuple(
+                    parent for parent in (family.father_handle,
+                                          family.mother_handle) if parent)
+                self.family_parents[handle] = parents
+                people.update(parents)
+        return self._refresh(db, people)
+
+    def _refresh(self, db, handles):
+        """
+        Reread the children of people, then recount them and their
+        ancestors.
+        """
+        numbers = set()
+        for handle in handles:
+            number = self.index.get(handle)
+            person = db.get_raw_person_data(handle)
+            if number is None or person is None:
+                continue
+            children = []
+            for fam_handle in person.family_list:
+                family = db.get_raw_family_data(fam_handle)
+                if family:
+                    children.extend(ref.ref for ref in family.child_ref_list)
+            self._set_children(number, children)
+            numbers.add(number)
+        return self._recount(numbers)
+
+    def _set_children(self, number, child_handles):
+        """
+        Replace the children of a person, keeping the parent lists in step.
+        """
+        for child in self.children[number]:
+            self.parents[child].remove(number)
+        children = [self.index[child] for child in child_handles
+                    if child in self.index]
+        for child in children:
+            self.parents[child].append(number)
+        self.children[number] = children
+
+    def _recount(self, numbers):
+        """
+        Recount people and all of their ancestors, descendants first.
+        """
+        affected = set(numbers)
+        queue = list(numbers)
+        while queue:
+            for parent in self.parents[queue.pop()]:
+                if parent not in affected:
+                    affected.add(parent)
+                    queue.append(parent)
+
+        done = set()
+        for root in affected:
+            if root in done:
+                continue
+            done.add(root)
+            stack = [(root, iter(self.children[root]))]
+            while stack:
+                number, children = stack[-1]
+                for child in children:
+                    if child in affected and child not in done:
+                        done.add(child)
+                        stack.append((child, iter(self.children[child])))
+                        break
+                else:
+                    stack.pop()
+                    self.ranges[number] = self._merge(number)
+        return [self.handles[number] for number in affected]
+
+    def _merge(self, number):
+        """
+        Return the merged descendant ranges of a person from those of the
+        children.
+        """
+        spans = []
+        for child in self.children[number]:
+            spans.append((child, child + 1))
+            spans.extend(self.ranges[child])
+        spans.sort()
+        merged = []
+        for start, stop in spans:
+            if merged and start <= merged[-1][1]:
+                if stop > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], stop)
+            else:
+                merged.append((start, stop))
+        return merged
@@ -24,6 +24,7 @@
 #
 # ----------------------------------------------------------------------------
 import itertools
+from collections import defaultdict
 
 # ----------------------------------------------------------------------------
 #
@@ -31,6 +32,7 @@ import itertools
 #
 # ----------------------------------------------------------------------------
 from gramps.gen.plug.report import Report, MenuReportOptions
+from gramps.gen.lib import ChildRefType
 from gramps.gen.plug.menu import BooleanOption
 from gramps.gen.display.name import displayer as name_displayer
 from gramps.gen.plug.docgen import ParagraphStyle, FontStyle, PARA_ALIGN_CENTER
@@ -57,6 +59,7 @@ class DoubleCousins(Report):
         self.menu = options.menu
         self.db = database
         self.persons = dict()
+        self._parents = dict()
         self.double_cousins = set()
         self.get_persons()
         self.search_double_cousins()
@@ -75,14 +78,21 @@ class DoubleCousins(Report):
                     self.persons[person_h] = (parents, grandparents)
 
     def search_double_cousins(self):
-        """Search all persons for double cousin relationship."""
-        dct = self.persons
-        items = list(iter(dct))
-        combo = itertools.combinations(items, 2)
-        for pers1, pers2 in combo:
-            if True not in [pers in dct[pers2][0] for pers in dct[pers1][0]]:
-                if all([pers in dct[pers2][1] for pers in dct[pers1][1]]):
-                    self.double_cousins.add((pers1, pers2))
+        """Search all persons for double cousin relationship.
+
+        Persons are grouped by their set of grandparents, and within that
+        by their parents. Double cousins share all grandparents but no
+        parent, so only groups of parents without a common member are
+        paired.
+        """
+        groups = defaultdict(lambda: defaultdict(list))
+        for person_h, (parents, grandparents) in self.persons.items():
+            groups[frozenset(grandparents)][parents].append(person_h)
+        for families in groups.values():
+            for parents1, parents2 in itertools.combinations(families, 2):
+                if set(parents1).isdisjoint(parents2):
+                    self.double_cousins.update(itertools.product(
+                        families[parents1], families[parents2]))
 
     def get_parents(self, person_h):
         """Return a tuple of parent handles of a person or None.
@@ -90,20 +100,22 @@ class DoubleCousins(Report):
         Return tuple(father_h, mother_h) if person has a father and a mother
         and the relationship to them is birth. If not, return None.
         """
-        person = self.db.get_person_from_handle(person_h)
-        for family_h in person.get_parent_family_handle_list():
-            family = self.db.get_family_from_handle(family_h)
+        if person_h in self._parents:
+            return self._parents[person_h]
+        person = self.db.get_raw_person_data(person_h)
+        for family_h in person.parent_family_list:
+            family = self.db.get_raw_family_data(family_h)
             if family:
-                father_h = family.get_father_handle()
-                mother_h = family.get_mother_handle()
+                father_h = family.father_handle
+                mother_h = family.mother_handle
                 if father_h and mother_h:
-                    for child_ref in family.get_child_ref_list():
+                    for child_ref in family.child_ref_list:
                         if child_ref.ref == person_h:
-                            father_rel = child_ref.get_father_relation()
-                            mother_rel = child_ref.get_mother_relation()
-                            if father_rel == _("Birth") and \
-                               mother_rel == _("Birth"):
+                            if child_ref.frel.value == ChildRefType.BIRTH \
+                               and child_ref.mrel.value == ChildRefType.BIRTH:
+                                self._parents[person_h] = (father_h, mother_h)
                                 return (father_h, mother_h)
+        self._parents[person_h] = None
         return None
 
     def write_report(self):
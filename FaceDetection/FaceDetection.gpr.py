@@ -13,3 +13,19 @@ register(
     gramplet_title=_("Faces"),
     navtypes=["Media"],
 )
+
+register(
+    TOOL,
+    id="FaceDetectionTool",
+    name=_("Face Detection"),
+    description=_("Detect faces in all images, for the Face Detection gramplet"),
+    version = '1.0.33',
+    gramps_target_version="6.0",
+    include_in_listing=False,
+    status=UNSTABLE,
+    fname="FaceDetectionTool.py",
+    category=TOOL_UTILS,
+    toolclass="FaceDetectionWindow",
+    optionclass="FaceDetectionOptions",
+    tool_modes=[TOOL_MODE_GUI],
+)
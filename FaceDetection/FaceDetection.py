@@ -23,16 +23,11 @@
 from gramps.gen.plug import Gramplet
 from gramps.gui.widgets import Photo
 from gramps.gen.utils.file import media_path_full
-from gi.repository import Gtk
-import os
-try:
-    import cv2
-    computer_vision_available = True
-except ImportError:
-    computer_vision_available = False
-# import Image
-# import ImageDraw
-# import StringIO
+from gi.repository import Gtk, Gdk
+import cairo
+
+from facedetect import (computer_vision_available, detect_faces, get_cache,
+                        media_checksum)
 
 from gramps.gen.const import GRAMPS_LOCALE as glocale
 try:
@@ -41,9 +36,6 @@ except ValueError:
     _trans = glocale.translation
 _ = _trans.gettext
 
-path, filename = os.path.split(__file__)
-HAARCASCADE_PATH = os.path.join(path, 'haarcascade_frontalface_alt.xml')
-
 
 class FaceDetection(Gramplet):
     """
@@ -117,9 +109,11 @@ class FaceDetection(Gramplet):
                                          media.get_path())
         self.mime_type = media.get_mime_type()
         self.photo.set_image(self.full_path, self.mime_type)
-        # show where image parts are used by people:
+        # show where image parts are used by people, and faces detected
+        # before:
         rects = self.find_references()
-        self.draw_rectangles([], rects)
+        faces = get_cache().get(media_checksum(self.dbstate.db, media))
+        self.draw_rectangles(faces or [], rects)
 
     def find_references(self):
         """
@@ -151,57 +145,51 @@ class FaceDetection(Gramplet):
         active_handle = self.get_active('Media')
         media = self.dbstate.db.get_media_from_handle(active_handle)
         self.load_image(media)
-        min_face_size = (50, 50)  # FIXME: get from setting
-        self.cv_image = cv2.LoadImage(self.full_path,
-                                      cv2.CV_LOAD_IMAGE_GRAYSCALE)
-        o_width, o_height = self.cv_image.width, self.cv_image.height
-        cv2.EqualizeHist(self.cv_image, self.cv_image)
-        cascade = cv2.Load(HAARCASCADE_PATH)
-        faces = cv2.HaarDetectObjects(self.cv_image, cascade,
-                                      cv2.CreateMemStorage(0),
-                                      1.2, 2, cv2.CV_HAAR_DO_CANNY_PRUNING,
-                                      min_face_size)
+        checksum = media_checksum(self.dbstate.db, media)
+        cache = get_cache()
+        faces = cache.get(checksum) if checksum else None
+        if faces is None:
+            faces = detect_faces(self.full_path)
+            if checksum:
+                cache.put(checksum, faces)
+                cache.save()
         references = self.find_references()
-        rects = []
-        o_width, o_height = [float(t) for t in (self.cv_image.width,
-                                                self.cv_image.height)]
-        for ((x, y, width, height), neighbors) in faces:
-            # percentages:
-            rects.append((x / o_width, y / o_height,
-                          width / o_width, height / o_height))
-        self.draw_rectangles(rects, references)
+        self.draw_rectangles(faces, references)
 
     def draw_rectangles(self, faces, references):
         # reset image:
         self.photo.set_image(self.full_path, self.mime_type)
-        # draw on it
         pixbuf = self.photo.photo.get_pixbuf()
-        pixmap, mask = pixbuf.render_pixmap_and_mask()
-        cm = pixmap.get_colormap()
+        if pixbuf is None:
+            return
         # the thumbnail's actual size:
-        t_width, t_height = [float(t) for t in self.photo.photo.size_request()]
+        t_width, t_height = pixbuf.get_width(), pixbuf.get_height()
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, t_width, t_height)
+        context = cairo.Context(surface)
+        Gdk.cairo_set_source_pixbuf(context, pixbuf, 0, 0)
+        context.paint()
         # percents:
         for (x, y, width, height) in references:
-            self.draw_rectangle(cm, pixmap, t_width, t_height,
-                                x, y, width, height, "blue")
+            self.draw_rectangle(context, t_width, t_height,
+                                x, y, width, height, (0, 0, 1))
         for (x, y, width, height) in faces:
-            self.draw_rectangle(cm, pixmap, t_width, t_height,
-                                x, y, width, height, "red")
-        self.photo.photo.set_from_pixmap(pixmap, mask)
+            self.draw_rectangle(context, t_width, t_height,
+                                x, y, width, height, (1, 0, 0))
+        self.photo.photo.set_from_pixbuf(
+            Gdk.pixbuf_get_from_surface(surface, 0, 0, t_width, t_height))
 
-    def draw_rectangle(self, cm, pixmap, t_width, t_height,
+    def draw_rectangle(self, context, t_width, t_height,
                        x, y, width, height, color):
-        cmcolor = cm.alloc_color("white")
-        gc = pixmap.new_gc(foreground=cmcolor)
-        pixmap.draw_rectangle(gc, False,  # fill it?
-                              int(x * t_width) + 1,
-                              int(y * t_height) + 1,
-                              int(width * t_width),
-                              int(height * t_height))
-        cmcolor = cm.alloc_color(color)
-        gc = pixmap.new_gc(foreground=cmcolor)
-        pixmap.draw_rectangle(gc, False,  # fill it?
-                              int(x * t_width),
-                              int(y * t_height),
-                              int(width * t_width),
-                              int(height * t_height))
+        context.set_line_width(1)
+        context.set_source_rgb(1, 1, 1)
+        context.rectangle(int(x * t_width) + 1.5,
+                          int(y * t_height) + 1.5,
+                          int(width * t_width),
+                          int(height * t_height))
+        context.stroke()
+        context.set_source_rgb(*color)
+        context.rectangle(int(x * t_width) + 0.5,
+                          int(y * t_height) + 0.5,
+                          int(width * t_width),
+                          int(height * t_height))
+        context.stroke()
@@ -0,0 +1,136 @@
+# Gramps - a GTK+/GNOME based genealogy program
+#
+# Copyright (C) 2011 Nick Hall
+#           (c) 2011 Doug Blank <doug.blank@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# $Id: $
+#
+
+"""
+Batch face detection over the media of a tree. The results are stored in
+the face cache, where the Face Detection gramplet shows them.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+from gramps.gui.plug import MenuToolOptions, PluginWindows
+from gramps.gen.plug.menu import FilterOption
+from gramps.gui.dialog import OkDialog, WarningDialog
+from gramps.gui.utils import ProgressMeter
+from gramps.gen.filters import CustomFilters, GenericFilterFactory, rules
+from gramps.gen.utils.file import media_path_full
+
+from facedetect import (computer_vision_available, detect_faces, get_cache,
+                        media_checksum)
+
+from gramps.gen.const import GRAMPS_LOCALE as glocale
+try:
+    _trans = glocale.get_addon_translator(__file__)
+except ValueError:
+    _trans = glocale.translation
+_ = _trans.gettext
+
+# Number of images handed to a worker process at a time
+CHUNK_SIZE = 4
+# Save the cache after this many images, so an interrupted run keeps
+# its results
+SAVE_INTERVAL = 500
+
+
+class FaceDetectionOptions(MenuToolOptions):
+    """
+    Options of the batch face detection tool.
+    """
+    def __init__(self, name, person_id=None, dbstate=None):
+        MenuToolOptions.__init__(self, name, person_id, dbstate)
+
+    def add_menu_options(self, menu):
+        """
+        Add the media filter option.
+        """
+        media_filter = FilterOption(_("Media Filter"), 0)
+        media_filter.set_help(_("Detect faces in these media objects."))
+        all_media = GenericFilterFactory('Media')()
+        all_media.set_name(_("All Media"))
+        all_media.add_rule(rules.media.AllMedia([]))
+        filter_list = CustomFilters.get_filters('Media')
+        filter_list.insert(0, all_media)
+        media_filter.set_filters(filter_list)
+        menu.add_option(_("Options"), "media_filter", media_filter)
+
+
+class FaceDetectionWindow(PluginWindows.ToolManagedWindowBatch):
+    """
+    Detect faces in all filtered images not processed before.
+    """
+    def get_title(self):
+        return _("Face Detection")
+
+    def initial_frame(self):
+        return _("Options")
+
+    def pre_run(self):
+        self.progress = ProgressMeter(self.get_title(), can_cancel=True,
+                                      parent=self.window)
+
+    def run(self):
+        if not computer_vision_available:
+            WarningDialog(_("Face Detection"),
+                          _("OpenCV-Python is not installed"),
+                          parent=self.window)
+            return
+        self.db = self.dbstate.get_database()
+        option = self.options.menu.get_option_by_name('media_filter')
+        handles = option.get_filter().apply(self.db,
+                                            list(self.db.iter_media_handles()))
+
+        cache = get_cache()
+        todo = {}
+        self.progress.set_pass(_('Finding images'), len(handles))
+        for handle in handles:
+            if self.progress.get_cancelled():
+                return
+            media = self.db.get_media_from_handle(handle)
+            self.progress.step()
+            if not media.get_mime_type().startswith('image'):
+                continue
+            checksum = media_checksum(self.db, media)
+            if checksum and checksum not in cache and checksum not in todo:
+                todo[checksum] = media_path_full(self.db, media.get_path())
+
+        self.progress.set_pass(_('Detecting faces'), len(todo))
+        count = 0
+        if todo:
+            executor = ProcessPoolExecutor()
+            try:
+                results = executor.map(detect_faces, todo.values(),
+                                       chunksize=CHUNK_SIZE)
+                for checksum, faces in zip(todo, results):
+                    cache.put(checksum, faces)
+                    count += 1
+                    if count % SAVE_INTERVAL == 0:
+                        cache.save()
+                    self.progress.step()
+                    if self.progress.get_cancelled():
+                        break
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
+                cache.save()
+
+        OkDialog(_("Face Detection"),
+                 _("%d images were searched for faces.") % count,
+                 parent=self.window)
@@ -0,0 +1,168 @@
+# Gramps - a GTK+/GNOME based genealogy program
+#
+# Copyright (C) 2011 Nick Hall
+#           (c) 2011 Doug Blank <doug.blank@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# $Id: $
+#
+
+"""
+Face detection, and the persistent cache of detected faces shared by the
+gramplet and the batch tool.
+"""
+
+import io
+import json
+import os
+try:
+    import cv2
+    computer_vision_available = True
+except ImportError:
+    computer_vision_available = False
+
+from gramps.gen.const import USER_CACHE
+from gramps.gen.utils.file import media_path_full, create_checksum
+
+path, filename = os.path.split(__file__)
+HAARCASCADE_PATH = os.path.join(path, 'haarcascade_frontalface_alt.xml')
+CACHE_FILE = os.path.join(USER_CACHE, 'face_detection.json')
+
+# Images are downscaled so that their longest side is at most this many
+# pixels before detection
+DETECT_SIZE = 1024
+# Smallest face detected, in pixels of the downscaled image
+MIN_FACE_SIZE = 20
+
+_classifier = None
+_cache = None
+
+
+def get_classifier():
+    """
+    Return the face classifier, loading it once per process.
+    """
+    global _classifier
+    if _classifier is None:
+        _classifier = cv2.CascadeClassifier(HAARCASCADE_PATH)
+    return _classifier
+
+
+def detect_faces(full_path):
+    """
+    Detect faces in an image file. Return a list of (x, y, width, height)
+    rectangles as fractions of the image size, empty if the file cannot
+    be read or decoded. May run in a worker process.
+    """
+    try:
+        return _detect_faces(full_path)
+    except cv2.error:
+        return []
+
+
+def _detect_faces(full_path):
+    """
+    Detect faces in an image file with OpenCV.
+    """
+    image = cv2.imread(full_path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        return []
+    height, width = image.shape[:2]
+    scale = DETECT_SIZE / float(max(width, height))
+    if scale < 1.0:
+        width = max(1, int(width * scale))
+        height = max(1, int(height * scale))
+        image = cv2.resize(image, (width, height),
+                           interpolation=cv2.INTER_AREA)
+    image = cv2.equalizeHist(image)
+    faces = get_classifier().detectMultiScale(
+        image, scaleFactor=1.2, minNeighbors=2,
+        minSize=(MIN_FACE_SIZE, MIN_FACE_SIZE))
+    return [(float(x) / width, float(y) / height,
+             float(w) / width, float(h) / height)
+            for (x, y, w, h) in faces]
+
+
+def media_checksum(db, media):
+    """
+    Return the checksum of a media object, computing it from the file
+    if it has not been stored.
+    """
+    checksum = media.get_checksum()
+    if not checksum:
+        checksum = create_checksum(media_path_full(db, media.get_path()))
+    return checksum
+
+
+def get_cache():
+    """
+    Return the face cache, loading it once per process.
+    """
+    global _cache
+    if _cache is None:
+        _cache = FaceCache()
+    return _cache
+
+
+class FaceCache:
+    """
+    Persistent cache of detected face rectangles, by media checksum.
+    """
+    def __init__(self, filename=CACHE_FILE):
+        self.filename = filename
+        self.entries = {}
+        self.changed = False
+        try:
+            with io.open(filename, 'r', encoding='utf-8') as cache_file:
+                self.entries = json.load(cache_file)
+        except (IOError, ValueError):
+            pass
+
+    def __contains__(self, checksum):
+        return checksum in self.entries
+
+    def get(self, checksum):
+        """
+        Return the faces detected in an image, or None if it has not been
+        processed.
+        """
+        faces = self.entries.get(checksum)
+        if faces is None:
+            return None
+        return [tuple(face) for face in faces]
+
+    def put(self, checksum, faces):
+        """
+        Store the faces detected in an image.
+        """
+        self.entries[checksum] = [list(face) for face in faces]
+        self.changed = True
+
+    def save(self):
+        """
+        Write the cache to disk, if it has changed.
+        """
+        if not self.changed:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+            temp_name = self.filename + '.tmp'
+            with io.open(temp_name, 'w', encoding='utf-8') as cache_file:
+                json.dump(self.entries, cache_file)
+            os.replace(temp_name, self.filename)
+            self.changed = False
+        except IOError:
+            pass
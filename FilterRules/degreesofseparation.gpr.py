@@ -30,6 +30,7 @@ register(
     gramps_target_version="6.0",
     status=STABLE,
     fname="degreesofseparation.py",
+    depends_on=["libdbindex"],
     ruleclass="DegreesOfSeparation",  # must be rule class name
     namespace="Person",  # one of the primary object classes
     help_url="Addon:Rule_expansions#People_Separated_less_than_.3CN.3E_degrees_of_.3Cperson.3E",
@@ -26,6 +26,7 @@
 #
 # -------------------------------------------------------------------------
 from __future__ import annotations
+from collections import defaultdict
 
 # -------------------------------------------------------------------------
 #
@@ -41,7 +42,7 @@ from gramps.gen.const import GRAMPS_LOCALE as glocale
 # Typing modules
 #
 # -------------------------------------------------------------------------
-from typing import Set
+from typing import Dict, FrozenSet, Set
 from gramps.gen.types import PersonHandle
 from gramps.gen.lib import Person
 from gramps.gen.db import Database
@@ -52,6 +53,60 @@ except ValueError:
     _trans = glocale.translation
 _ = _trans.gettext
 
+from libdbindex import SharedIndex, iter_raw_families
+
+
+# -------------------------------------------------------------------------
+#
+# Kinship index
+#
+# -------------------------------------------------------------------------
+class KinshipIndex(SharedIndex):
+    """
+    Parents, children, siblings and partners of every person, built from
+    the raw family data. Shared by all rule instances, and rebuilt only
+    after the families of the database have changed.
+    """
+
+    SIGNALS = ("family-add", "family-update", "family-delete", "family-rebuild")
+
+    def __init__(self):
+        super().__init__()
+        self.relatives: Dict[PersonHandle, FrozenSet[PersonHandle]] = {}
+
+    def get_relatives(self, db: Database
+                      ) -> Dict[PersonHandle, FrozenSet[PersonHandle]]:
+        """Return the relatives of every person in the database."""
+        self.update(db)
+        return self.relatives
+
+    def build(self, db: Database):
+        """Build the index from the raw family data."""
+        parents = defaultdict(set)
+        children = defaultdict(set)
+        relatives = defaultdict(set)
+        for _handle, fam in iter_raw_families(db):
+            spouses = [handle for handle in (fam.father_handle,
+                                             fam.mother_handle) if handle]
+            kids = [child_ref.ref for child_ref in fam.child_ref_list]
+            for spouse in spouses:
+                children[spouse].update(kids)
+                relatives[spouse].update(spouses)
+            for kid in kids:
+                parents[kid].update(spouses)
+        for handle, kids in children.items():
+            relatives[handle].update(kids)
+        for handle, kid_parents in parents.items():
+            relatives[handle].update(kid_parents)
+            # siblings, including half siblings
+            for parent in kid_parents:
+                relatives[handle].update(children[parent])
+        self.relatives = {handle: frozenset(handles - {handle})
+                          for handle, handles in relatives.items()}
+
+
+KINSHIP_INDEX = KinshipIndex()
+
 
 # -------------------------------------------------------------------------
 #
@@ -85,74 +140,32 @@ class DegreesOfSeparation(Rule):
         """Prepare a reference list for the filter."""
         self.db = db
         self.selected_handles: Set[PersonHandle] = set()
-
-        self.persons = set()
         degrees = int(self.list[1])
 
-        self.get_root_handle()
-        for i in range(degrees+1):
-            for handle in list(self.persons):
-                person = self.db.get_raw_person_data(handle)
-                self.get_parents(person)
-                self.get_children(person)
-                self.get_siblings(person)
-                self.get_partners(person)
-                self.persons.remove(handle)
-                self.selected_handles.add(handle)
+        root_handle = self.get_root_handle()
+        if not root_handle:
+            return
+        relatives = KINSHIP_INDEX.get_relatives(db)
+        self.selected_handles.add(root_handle)
+        frontier = [root_handle]
+        for i in range(degrees):
+            next_frontier = []
+            for handle in frontier:
+                for relative in relatives.get(handle, ()):
+                    if relative not in self.selected_handles:
+                        self.selected_handles.add(relative)
+                        next_frontier.append(relative)
+            if not next_frontier:
+                break
+            frontier = next_frontier
 
     def get_root_handle(self):
         """Get the handle of the starting person."""
         pid = self.list[0]
-        person = self.db._get_raw_person_from_id_data(pid)
+        person = self.db.get_person_from_gramps_id(pid)
         if person:
-            self.persons.add(person.handle)
-
-    def get_parents(self, person: Person):
-        """Get all parents of a person."""
-        fam_list = person.parent_family_list
-        for fam_h in fam_list:
-            fam = self.db.get_raw_family_data(fam_h)
-            father_h = fam.father_handle
-            mother_h = fam.mother_handle
-            if father_h:
-                self.persons.add(father_h)
-            if mother_h:
-                self.persons.add(mother_h)
-
-    def get_children(self, person: Person):
-        """Get all children of a person."""
-        fam_list = person.family_list
-        for fam_h in fam_list:
-            fam = self.db.get_raw_family_data(fam_h)
-            for child_ref in fam.child_ref_list:
-                self.persons.add(child_ref.ref)
-
-    def get_siblings(self, person: Person):
-        """Get all siblings of a person."""
-        fam_list = person.parent_family_list
-        for fam_h in fam_list:
-            fam = self.db.get_raw_family_data(fam_h)
-            father_h = fam.father_handle
-            if father_h:
-                father = self.db.get_raw_person_data(father_h)
-                self.get_children(father)
-            mother_h = fam.mother_handle
-            if mother_h:
-                mother = self.db.get_raw_person_data(mother_h)
-                self.get_children(mother)
-
-    def get_partners(self, person: Person):
-        """Get all partners."""
-        fam_list = person.family_list
-        if fam_list:
-            for fam_h in fam_list:
-                fam = self.db.get_raw_family_data(fam_h)
-                father_h = fam.father_handle
-                mother_h = fam.mother_handle
-                if father_h:
-                    self.persons.add(father_h)
-                if mother_h:
-                    self.persons.add(mother_h)
+            return person.handle
+        return None
 
     def apply_to_one(self, db: Database, person: Person) -> bool:
         """Check if the filter applies to the person."""
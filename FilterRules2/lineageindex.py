@@ -0,0 +1,233 @@
+#
+# Gramps - a GTK+/GNOME based genealogy program
+#
+# Copyright (C) 2020  Matthias Kemmer
+# Copyright (C) 2025  Steve Youngs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+"""Shared traversal engine for the lineage inheritance filter rules."""
+
+# ------------------------------------------------
+# Standard python modules
+# ------------------------------------------------
+from __future__ import annotations
+from collections import defaultdict
+
+# -------------------------------------------------------------------------
+#
+# Gramps modules
+#
+# -------------------------------------------------------------------------
+from gramps.gen.lib import ChildRefType, Person
+
+# -------------------------------------------------------------------------
+#
+# Typing modules
+#
+# -------------------------------------------------------------------------
+from typing import Dict, FrozenSet, List, Optional, Tuple
+from gramps.gen.types import PersonHandle
+from gramps.gen.db import Database
+
+from libdbindex import SharedIndex, iter_raw_families, iter_raw_people
+
+MALE = Person.MALE
+FEMALE = Person.FEMALE
+BIRTH = ChildRefType.BIRTH
+
+# -------------------------------------------------------------------------
+#
+# LineageIndex
+#
+# -------------------------------------------------------------------------
+class LineageIndex(SharedIndex):
+    """
+    Gender of every person and the parents and children of every person,
+    with their relation types, read from raw data.
+
+    Inheritance sets are memoized per line and root, and a traversal that
+    reaches a person with a memoized set reuses it. Index and memos are
+    shared by all rule instances and rebuilt after the database changes.
+    Rules call update() once in prepare, then query the index.
+    """
+
+    SIGNALS = (
+        "person-add",
+        "person-update",
+        "person-delete",
+        "person-rebuild",
+        "family-add",
+        "family-update",
+        "family-delete",
+        "family-rebuild",
+    )
+
+    def __init__(self):
+        super().__init__()
+        self.genders: Dict[PersonHandle, int] = {}
+        # parent -> [(child, father relation, mother relation)]
+        self.children: Dict[PersonHandle, List[Tuple[PersonHandle, int, int]]] = {}
+        # child -> [(father, mother, father relation, mother relation)]
+        self.parents: Dict[
+            PersonHandle,
+            List[Tuple[Optional[PersonHandle], Optional[PersonHandle], int, int]],
+        ] = {}
+        self.memo: Dict[str, dict] = defaultdict(dict)
+
+    def build(self, db: Database):
+        """Build the index from the raw person and family data."""
+        self.genders = {handle: data.gender for handle, data in iter_raw_people(db)}
+        self.children = defaultdict(list)
+        self.parents = defaultdict(list)
+        for _handle, fam in iter_raw_families(db):
+            father_h = fam.father_handle or None
+            mother_h = fam.mother_handle or None
+            for child_ref in fam.child_ref_list:
+                frel = child_ref.frel.value
+                mrel = child_ref.mrel.value
+                for parent_h in (father_h, mother_h):
+                    if parent_h:
+                        self.children[parent_h].append((child_ref.ref, frel, mrel))
+                self.parents[child_ref.ref].append((father_h, mother_h, frel, mrel))
+        self.memo = defaultdict(dict)
+
+    # ---------------------------------------------------------------------
+    #
+    # Inheritance lines
+    #
+    # Each returns the people a line continues to from a person. "root" is
+    # True for the person the search starts from.
+    #
+    # ---------------------------------------------------------------------
+    def _y_chromosome(self, handle: PersonHandle, root: bool):
+        """Male children by birth."""
+        return [
+            child
+            for child, frel, _mrel in self.children.get(handle, ())
+            if frel == BIRTH and self.genders.get(child) == MALE
+        ]
+
+    def _mitochondrial(self, handle: PersonHandle, root: bool):
+        """Children by birth of a mother; the root is followed regardless."""
+        if not root and self.genders.get(handle) != FEMALE:
+            return []
+        return [
+            child
+            for child, _frel, mrel in self.children.get(handle, ())
+            if mrel == BIRTH
+        ]
+
+    def _x_descendants(self, handle: PersonHandle, root: bool):
+        """All children of a mother, daughters of a father, by birth."""
+        gender = self.genders.get(handle)
+        if gender == FEMALE:
+            return [
+                child
+                for child, _frel, mrel in self.children.get(handle, ())
+                if mrel == BIRTH and self.genders.get(child) in (FEMALE, MALE)
+            ]
+        if gender == MALE:
+            return [
+                child
+                for child, frel, _mrel in self.children.get(handle, ())
+                if frel == BIRTH and self.genders.get(child) == FEMALE
+            ]
+        return []
+
+    def _x_ancestors(self, handle: PersonHandle, root: bool):
+        """Birth mother of a man, birth mother and father of a woman."""
+        gender = self.genders.get(handle)
+        if gender not in (FEMALE, MALE):
+            return []
+        result = []
+        for father_h, mother_h, frel, mrel in self.parents.get(handle, ()):
+            if mother_h and mrel == BIRTH:
+                result.append(mother_h)
+            if gender == FEMALE and father_h and frel == BIRTH:
+                result.append(father_h)
+        return result
+
+    LINES = {
+        "y": _y_chromosome,
+        "mt": _mitochondrial,
+        "x-descendants": _x_descendants,
+        "x-ancestors": _x_ancestors,
+    }
+
+    def inheritance(self, line: str, root: PersonHandle) -> FrozenSet[PersonHandle]:
+        """
+        Return the root and everyone reached from it following one of the
+        LINES. The index must have been updated for the database first.
+        """
+        memo = self.memo[line]
+        if root in memo:
+            return memo[root]
+        step = self.LINES[line]
+        result = {root}
+        stack = step(self, root, True)
+        while stack:
+            handle = stack.pop()
+            if handle in result:
+                continue
+            if handle in memo and step(self, handle, False) == step(
+                self, handle, True
+            ):
+                # the line continues from here as from a root
+                result.update(memo[handle])
+                continue
+            result.add(handle)
+            stack.extend(step(self, handle, False))
+        memo[root] = frozenset(result)
+        return memo[root]
+
+    def _unique_parent(self, handle: PersonHandle, parent: str):
+        """
+        Return the birth father or mother of a person, or None if there is
+        none or more than one.
+        """
+        parents = set()
+        for father_h, mother_h, frel, mrel in self.parents.get(handle, ()):
+            if parent == "father" and frel == BIRTH:
+                parents.add(father_h)
+            elif parent == "mother" and mrel == BIRTH:
+                parents.add(mother_h)
+        if len(parents) == 1 and None not in parents:
+            return parents.pop()
+        return None
+
+    def progenitor(self, parent: str, root: PersonHandle) -> Optional[PersonHandle]:
+        """
+        Return the earliest ancestor reached by following the unique birth
+        "father" or "mother" of each person, or None if the root has none.
+        The index must have been updated for the database first.
+        """
+        memo = self.memo["progenitor-" + parent]
+        path = []
+        handle = root
+        while handle not in memo:
+            path.append(handle)
+            parent_h = self._unique_parent(handle, parent)
+            if parent_h is None or parent_h in path:
+                memo[handle] = handle
+                break
+            handle = parent_h
+        result = memo[handle]
+        for step_h in path:
+            memo[step_h] = result
+        return None if result == root else result
+
+
+LINEAGE_INDEX = LineageIndex()
@@ -30,6 +30,7 @@ register(
     gramps_target_version="6.0",
     status=STABLE,
     fname="matrilinealprogenitrix.py",
+    depends_on=["libdbindex"],
     ruleclass="MatrilinealProgenitrix",  # must be rule class name
     namespace="Person",  # one of the primary object classes
     help_url="Addon:Rule_expansions#Matrilineal_progenitrix_of_.3Cperson.3E",
@@ -33,6 +33,8 @@ from __future__ import annotations
 from gramps.gen.filters.rules.person._hasidof import HasGrampsId
 from gramps.gen.const import GRAMPS_LOCALE as glocale
 
+from lineageindex import LINEAGE_INDEX
+
 # -------------------------------------------------------------------------
 #
 # Typing modules
@@ -67,51 +69,12 @@ class MatrilinealProgenitrix(HasGrampsId):
         """Prepare a reference list for the filter."""
         self.db = db
         self.selected_handles: Set[PersonHandle] = set()
-        self.run_search = True
-
         person = self.db.get_person_from_gramps_id(self.list[0])
         if person:
-            start_mother = self.get_mother(person)
-            if start_mother:
-                self.get_root_mother(start_mother)
-
-    def get_mother(self, person: Person) -> Person | None:
-        """
-        Get the mother of a person.
-
-        This function returns the mother of a person if the child relationship
-        type to the mother is brith and only one mother exists.
-        """
-        family_list = person.get_parent_family_handle_list()
-        mother_set = set()
-
-        if not family_list:
-            return None
-
-        for family_handle in family_list:
-            family = self.db.get_family_from_handle(family_handle)
-            for child_ref in family.get_child_ref_list():
-                if (
-                    person.get_handle() == child_ref.ref
-                    and child_ref.get_mother_relation() == _("Birth")
-                ):
-                    mother_handle = family.get_mother_handle()
-                    mother_set.add(mother_handle)
-
-        if len(mother_set) == 1 and None not in mother_set:
-            mother = self.db.get_person_from_handle(mother_set.pop())
-            return mother
-        return None
-
-    def get_root_mother(self, person: Person):
-        """Search recursively for the root mother of a person."""
-        while self.run_search:
-            mother = self.get_mother(person)
-            if mother:
-                self.get_root_mother(mother)
-            else:
-                self.run_search = False
-                self.selected_handles.add(person.handle)
+            LINEAGE_INDEX.update(db)
+            mother_h = LINEAGE_INDEX.progenitor("mother", person.handle)
+            if mother_h:
+                self.selected_handles.add(mother_h)
 
     def apply_to_one(self, db: Database, person: Person) -> bool:
         """Check if the filter applies to a person."""
@@ -33,6 +33,7 @@ register(
     gramps_target_version="6.0",
     status=STABLE,
     fname="mtinheritance.py",
+    depends_on=["libdbindex"],
     ruleclass="MtChromInheritance",  # must be rule class name
     namespace="Person",  # one of the primary object classes
     help_url="Addon:Rule_expansions#Patrilineal_progenitor_of_.3Cperson.3E",
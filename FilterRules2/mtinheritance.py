@@ -33,6 +33,8 @@ from __future__ import annotations
 from gramps.gen.filters.rules.person._hasidof import HasGrampsId
 from gramps.gen.const import GRAMPS_LOCALE as glocale
 
+from lineageindex import LINEAGE_INDEX
+
 # -------------------------------------------------------------------------
 #
 # Typing modules
@@ -68,55 +70,10 @@ class MtChromInheritance(HasGrampsId):
         """Prepare a reference list for the filter."""
         self.db = db
         self.selected_handles: Set[PersonHandle] = set()
-        self.root_mother = self.db.get_person_from_gramps_id(self.list[0])
-        self.current_children = set()
-        self.next_children = set()
-        if self.root_mother:
-            self.setup()
-            self.get_mt_desc()
-
-    def setup(self):
-        """Get the first round of male descendants."""
-        self.selected_handles.add(self.root_mother.get_handle())
-        children = self.get_all_children(self.root_mother)
-        if children:
-            for child_handle in children:
-                self.current_children.update(children)
-        else:
-            return False
-
-    def get_all_children(self, person):
-        """Get all children of a person."""
-        children = set()
-        family_list = person.get_family_handle_list()
-
-        if len(family_list) == 0:
-            return False
-
-        for family_handle in family_list:
-            family = self.db.get_family_from_handle(family_handle)
-            for child_ref in family.get_child_ref_list():
-                if child_ref.get_mother_relation() == _("Birth"):
-                    children.add(child_ref.ref)
-        return children
-
-    def get_mt_desc(self, setup=False):
-        """Get all descendants of a person sharing mtDNA."""
-        if self.current_children and (False not in self.current_children):
-            for child_handle in self.current_children:
-                if child_handle not in self.selected_handles:
-                    self.selected_handles.add(child_handle)
-                    child = self.db.get_person_from_handle(child_handle)
-                    if child.get_gender() == 0:
-                        has_children = self.get_all_children(child)
-                        if has_children:
-                            self.next_children.update(has_children)
-            self.current_children.clear()
-            self.get_mt_desc()
-        elif len(self.current_children) == 0 and len(self.next_children) > 0:
-            self.current_children.update(self.next_children)
-            self.next_children.clear()
-            self.get_mt_desc()
+        person = self.db.get_person_from_gramps_id(self.list[0])
+        if person:
+            LINEAGE_INDEX.update(db)
+            self.selected_handles = LINEAGE_INDEX.inheritance("mt", person.handle)
 
     def apply_to_one(self, db: Database, person: Person) -> bool:
         """Check if the filter applies to a person."""
@@ -33,6 +33,7 @@ register(
     gramps_target_version="6.0",
     status=STABLE,
     fname="mtinheritanceoffiltermatch.py",
+    depends_on=["libdbindex"],
     ruleclass="MtInheritanceFilterMatch",  # must be rule class name
     namespace="Person",  # one of the primary object classes
     help_url="Addon:Rule_expansions#Mitochondrial_inheritance_of_.3Cfilter.3E",
@@ -33,6 +33,8 @@ from __future__ import annotations
 from gramps.gen.filters.rules.person._hasidof import HasGrampsId
 from gramps.gen.const import GRAMPS_LOCALE as glocale
 
+from lineageindex import LINEAGE_INDEX
+
 # -------------------------------------------------------------------------
 #
 # Typing modules
@@ -67,51 +69,12 @@ class PatrilinealProgenitor(HasGrampsId):
         """Prepare a reference list for the filter."""
         self.db = db
         self.selected_handles: Set[PersonHandle] = set()
-        self.run_search = True
-
         person = self.db.get_person_from_gramps_id(self.list[0])
         if person:
-            start_father = self.get_father(person)
-            if start_father:
-                self.get_root_father(start_father)
-
-    def get_father(self, person):
-        """
-        Get the father of a person.
-
-        This function returns the father of a person if the child relationship
-        type to the father is brith and only one father exists.
-        """
-        family_list = person.get_parent_family_handle_list()
-        father_set = set()
-
-        if not family_list:
-            return False
-
-        for family_handle in family_list:
-            family = self.db.get_family_from_handle(family_handle)
-            for child_ref in family.get_child_ref_list():
-                if (
-                    person.get_handle() == child_ref.ref
-                    and child_ref.get_father_relation() == _("Birth")
-                ):
-                    father_handle = family.get_father_handle()
-                    father_set.add(father_handle)
-
-        if len(father_set) == 1 and None not in father_set:
-            father = self.db.get_person_from_handle(father_set.pop())
-            return father
-        return False
-
-    def get_root_father(self, person):
-        """Search recursively for the root father of a person."""
-        while self.run_search:
-            father = self.get_father(person)
-            if father:
-                self.get_root_father(father)
-            else:
-                self.run_search = False
-                self.selected_handles.add(person.get_handle())
+            LINEAGE_INDEX.update(db)
+            father_h = LINEAGE_INDEX.progenitor("father", person.handle)
+            if father_h:
+                self.selected_handles.add(father_h)
 
     def apply_to_one(self, db: Database, person: Person) -> bool:
         """Check if the filter applies to a person."""
@@ -32,6 +32,7 @@ register(
     gramps_target_version="6.0",
     status=STABLE,
     fname="xchromancestors.py",
+    depends_on=["libdbindex"],
     ruleclass="XChromAncestors",  # must be rule class name
     namespace="Person",  # one of the primary object classes
     help_url="Addon:Rule_expansions#X-chromosomal_ancestors_of_.3Cperson.3E",
@@ -37,6 +37,8 @@ from gramps.gen.filters.rules.person._hasidof import HasGrampsId
 # -------------------------------------------------------------------------
 from gramps.gen.const import GRAMPS_LOCALE as glocale
 
+from lineageindex import LINEAGE_INDEX
+
 
 # -------------------------------------------------------------------------
 #
@@ -77,49 +79,10 @@ class XChromAncestors(HasGrampsId):
         self.selected_handles: Set[PersonHandle] = set()
         person = self.db.get_person_from_gramps_id(self.list[0])
         if person:
-            self.get_ancestors(person)
-
-    def get_ancestors(self, person):
-        """Get all ancestors who contributed to X-chromosomal inheritance."""
-        self.selected_handles.add(person.get_handle())
-        male = person.get_gender() == 1
-        female = person.get_gender() == 0
-        family_handels = person.get_parent_family_handle_list()
-        for family_h in family_handels:
-            if (male or female) and family_h:
-                family = self.db.get_family_from_handle(family_h)
-
-                if male:  # one X-chromosome from mother
-                    mother_h = family.get_mother_handle()
-                    if mother_h and self.mother_relationship(person, family):
-                        mother = self.db.get_person_from_handle(mother_h)
-                        self.get_ancestors(mother)
-
-                if female:  # two X-chromosome, one from each mother and father
-                    mother_h = family.get_mother_handle()
-                    if mother_h and self.mother_relationship(person, family):
-                        mother = self.db.get_person_from_handle(mother_h)
-                        self.get_ancestors(mother)
-                    father_h = family.get_father_handle()
-                    if father_h and self.father_relationship(person, family):
-                        father = self.db.get_person_from_handle(father_h)
-                        self.get_ancestors(father)
-
-    def mother_relationship(self, person, family):
-        """Check if mother-child relationship type is birth."""
-        for child_ref in family.get_child_ref_list():
-            if child_ref.ref == person.get_handle():
-                if child_ref.get_mother_relation() == _("Birth"):
-                    return True
-        return False
-
-    def father_relationship(self, person, family):
-        """Check if father-child relationship type is birth."""
-        for child_ref in family.get_child_ref_list():
-            if child_ref.ref == person.get_handle():
-                if child_ref.get_father_relation() == _("Birth"):
-                    return True
-        return False
+            LINEAGE_INDEX.update(db)
+            self.selected_handles = LINEAGE_INDEX.inheritance(
+                "x-ancestors", person.handle
+            )
 
     def apply_to_one(self, db: Database, person: Person) -> bool:
         """Check if the filter applies to a person."""
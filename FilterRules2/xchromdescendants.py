@@ -37,6 +37,8 @@ from gramps.gen.filters.rules.person._hasidof import HasGrampsId
 # -------------------------------------------------------------------------
 from gramps.gen.const import GRAMPS_LOCALE as glocale
 
+from lineageindex import LINEAGE_INDEX
+
 # -------------------------------------------------------------------------
 #
 # Typing modules
@@ -76,32 +78,10 @@ class XChromDescendants(HasGrampsId):
         self.selected_handles: Set[PersonHandle] = set()
         person = self.db.get_person_from_gramps_id(self.list[0])
         if person:
-            self.get_descendants(person)
-            self.selected_handles.add(person.get_handle())
-
-    def get_descendants(self, person):
-        """Get all descendants following a X-chrom inheritance pattern."""
-        family_list = person.get_family_handle_list()
-        for family_h in family_list:
-            family = self.db.get_family_from_handle(family_h)
-            children = family.get_child_ref_list()
-            for child_ref in children:
-                child = self.db.get_person_from_handle(child_ref.ref)
-                gender = child.get_gender()
-                if (
-                    person.get_gender() == 0
-                    and child_ref.get_mother_relation() == _("Birth")
-                    and gender in [0, 1]
-                ):
-                    self.selected_handles.add(child.get_handle())
-                    self.get_descendants(child)
-                if (
-                    person.get_gender() == 1
-                    and child_ref.get_father_relation() == _("Birth")
-                    and gender == 0
-                ):
-                    self.selected_handles.add(child.get_handle())
-                    self.get_descendants(child)
+            LINEAGE_INDEX.update(db)
+            self.selected_handles = LINEAGE_INDEX.inheritance(
+                "x-descendants", person.handle
+            )
 
     def apply_to_one(self, db: Database, person: Person) -> bool:
         """Check if the filter applies to a person."""
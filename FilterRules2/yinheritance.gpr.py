@@ -33,6 +33,7 @@ register(
     gramps_target_version="6.0",
     status=STABLE,
     fname="yinheritance.py",
+    depends_on=["libdbindex"],
     ruleclass="YChromInheritance",  # must be rule class name
     namespace="Person",  # one of the primary object classes
     help_url="Addon:Rule_expansions#Y-chromosomal_inheritance_of_.3Cperson.3E",
@@ -33,6 +33,7 @@ register(
     gramps_target_version="6.0",
     status=STABLE,
     fname="yinheritanceoffiltermatch.py",
+    depends_on=["libdbindex"],
     ruleclass="YChromInheritanceFilterMatch",  # must be rule class name
     namespace="Person",  # one of the primary object classes
     help_url="Addon:Rule_expansions#Y-chromosomal_inheritance_of_.3Cperson_filter.3E",
@@ -27,6 +27,8 @@ from gramps.gen.lib.primaryobj import BasicPrimaryObject as GrampsObject
 # types
 Action = tuple[str, str, str, GrampsObject | None, GrampsObject | None]
 Actions = list[Action]
+# change time of every object, by class name and handle
+Manifest = dict[str, dict[str, int]]
 
 
 # changed: added, deleteed, updated - local/remote/both
@@ -21,11 +21,15 @@
 
 from __future__ import annotations
 
+from collections.abc import Iterable
 from copy import deepcopy
 
 from gramps.gen.db import DbTxn
 from gramps.gen.db.base import DbReadBase
-from gramps.gen.merge.diff import diff_dbs
+from gramps.gen.db.utils import make_database
+from gramps.gen.errors import HandleError
+from gramps.gen.lib.json_utils import data_to_object, object_to_dict
+from gramps.gen.merge.diff import diff_dbs, diff_items
 from gramps.gen.user import User
 
 from const import (
@@ -51,6 +55,7 @@ from const import (
     Action,
     Actions,
     GrampsObject,
+    Manifest,
 )
 
 
@@ -63,11 +68,17 @@ class WebApiSyncDiffHandler:
         db2: DbReadBase,
         user: User,
         last_synced: float | None = None,
+        manifests: tuple[Manifest, Manifest] | None = None,
     ) -> None:
-        """Initialize given the two databases and a User instance."""
+        """Initialize given the two databases and a User instance.
+
+        If the local and remote manifests are given, db2 only needs to
+        contain the remote objects returned by `get_mismatches`.
+        """
         self.db1 = db1
         self.db2 = db2
         self.user = user
+        self.manifests = manifests
         self._diff_dbs = self.get_diff_dbs()
         self.differences: dict[tuple[str, str], tuple[GrampsObject, GrampsObject]] = {
             (obj1.handle, obj_type): (obj1, obj2)
@@ -93,7 +104,52 @@ class WebApiSyncDiffHandler:
         list[tuple[str, GrampsObject]],
     ]:
         """Return a database diff tuple: changed, missing from 1, missing from 2."""
-        return diff_dbs(self.db1, self.db2, user=self.user)
+        if self.manifests is None:
+            return diff_dbs(self.db1, self.db2, user=self.user)
+        return self._diff_manifests()
+
+    def _diff_manifests(
+        self,
+    ) -> tuple[
+        list[tuple[str, GrampsObject, GrampsObject]],
+        list[tuple[str, GrampsObject]],
+        list[tuple[str, GrampsObject]],
+    ]:
+        """Return a database diff tuple from the manifests.
+
+        Only objects whose change times differ are loaded and compared.
+        """
+        assert self.manifests  # for type checker
+        local, remote = self.manifests
+        diffs = []
+        missing_from_db1 = []
+        missing_from_db2 = []
+        for class_name in OBJ_LST:
+            changes1 = local.get(class_name, {})
+            changes2 = remote.get(class_name, {})
+            handle_func = self.db1.method("get_%s_from_handle", class_name)
+            handle_func_db2 = self.db2.method("get_%s_from_handle", class_name)
+            assert handle_func and handle_func_db2  # for type checker
+            for handle, change in changes1.items():
+                if handle not in changes2:
+                    missing_from_db2.append((class_name, handle_func(handle)))
+                elif change != changes2[handle]:
+                    try:
+                        obj2 = handle_func_db2(handle)
+                    except HandleError:
+                        continue  # deleted remotely after the manifest was fetched
+                    obj1 = handle_func(handle)
+                    if diff_items(
+                        class_name, object_to_dict(obj1), object_to_dict(obj2)
+                    ):
+                        diffs.append((class_name, obj1, obj2))
+            for handle in changes2.keys() - changes1.keys():
+                try:
+                    obj2 = handle_func_db2(handle)
+                except HandleError:
+                    continue
+                missing_from_db1.append((class_name, obj2))
+        return diffs, missing_from_db1, missing_from_db2
 
     def get_latest_common_timestamp(self) -> int:
         """Get the timestamp of the latest common object."""
@@ -104,6 +160,15 @@ class WebApiSyncDiffHandler:
 
     def _get_latest_common_timestamp(self, class_name: str) -> int | None:
         """Get the timestamp of the latest common object of given type."""
+        if self.manifests is not None:
+            local, remote = self.manifests
+            changes2 = remote.get(class_name, {})
+            dates = [
+                change
+                for handle, change in local.get(class_name, {}).items()
+                if changes2.get(handle) == change
+            ]
+            return max(dates) if dates else None
         handles_func = self.db1.method("get_%s_handles", class_name)
         handle_func = self.db1.method("get_%s_from_handle", class_name)
         handle_func_db2 = self.db2.method("get_%s_from_handle", class_name)
@@ -285,6 +350,46 @@ class WebApiSyncDiffHandler:
             self.commit_action(action, trans1, trans2)
 
 
+def get_local_manifest(db: DbReadBase) -> Manifest:
+    """Get the change time of every object in a database, by class and handle."""
+    manifest: Manifest = {}
+    for class_name in OBJ_LST:
+        iter_func = db.method("_iter_raw_%s_data", class_name)
+        assert iter_func  # for type checker
+        manifest[class_name] = {handle: data["change"] for handle, data in iter_func()}
+    return manifest
+
+
+def get_mismatches(local: Manifest, remote: Manifest) -> dict[str, set[str]]:
+    """Get the handles of remote objects missing or changed locally, by class."""
+    mismatches = {}
+    for class_name, changes2 in remote.items():
+        changes1 = local.get(class_name, {})
+        mismatches[class_name] = {
+            handle
+            for handle, change in changes2.items()
+            if changes1.get(handle) != change
+        }
+    return mismatches
+
+
+def objects_to_database(objects: Iterable[tuple[str, dict]]) -> DbReadBase:
+    """Store (class name, data) pairs in a new in-memory database.
+
+    The objects keep their change time, which the diff handler compares
+    with the time of the last sync.
+    """
+    db = make_database("sqlite")
+    db.load(":memory:")
+    with DbTxn("", db, batch=True) as trans:
+        for class_name, data in objects:
+            obj = data_to_object(data)
+            commit_func = db.method("commit_%s", class_name)
+            assert commit_func  # for type checker
+            commit_func(obj, trans, obj.change)
+    return db
+
+
 def changes_to_actions(changes, sync_mode: int) -> Actions:
     """Get actions from changes depending on sync mode."""
     if sync_mode == MODE_BIDIRECTIONAL:
@@ -25,6 +25,7 @@ import logging
 import os
 import threading
 from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from urllib.error import HTTPError, URLError
 from urllib.parse import urlparse
@@ -46,14 +47,16 @@ from const import (
 from diffhandler import (
     WebApiSyncDiffHandler,
     changes_to_actions,
+    get_local_manifest,
+    get_mismatches,
     has_local_actions,
     has_remote_actions,
+    objects_to_database,
 )
 from gi.repository import GLib, Gtk
 from gramps.gen.config import config as configman
 from gramps.gen.const import GRAMPS_LOCALE as glocale
 from gramps.gen.db import DbTxn
-from gramps.gen.db.utils import import_as_dict
 from gramps.gen.errors import HandleError
 from gramps.gen.lib import Tag
 from gramps.gen.utils.file import media_path_full
@@ -73,6 +76,9 @@ ngettext = _trans.ngettext
 
 LOG = logging.getLogger("grampswebsync")
 
+# number of media files transferred at the same time
+MAX_TRANSFER_WORKERS = 4
+
 
 def get_password(service: str, username: str) -> str | None:
     """If keyring is installed, return the user's password or None."""
@@ -94,6 +100,11 @@ def set_password(service: str, username: str, password: str) -> None:
     keyring.set_password(service, username, password)
 
 
+def _raise(exc: Exception) -> None:
+    """Raise an exception caught in another thread."""
+    raise exc
+
+
 class GrampsWebSyncTool(BatchTool, ManagedWindow):
     """Main class for the Gramps Web Sync tool."""
 
@@ -407,16 +418,73 @@ class GrampsWebSyncTool(BatchTool, ManagedWindow):
         elif page == self.file_confirmation:
             pass
 
-    def download_files(self):
-        """Download media files missing locally."""
-        if not self.files_missing_local:
-            return
-        res = {}
-        for gramps_id, handle in self.files_missing_local:
-            LOG.debug("Downloading file %s", gramps_id)
-            self.downloaded[gramps_id] = self._download_file(handle)
-            self._update_file_progress()
-        return res
+    def get_transfers(
+        self, files: list[tuple[str, str]]
+    ) -> list[tuple[str, str, str, str]]:
+        """Get Gramps ID, handle, path and checksum of media files."""
+        transfers = []
+        for gramps_id, handle in files:
+            try:
+                obj = self.db1.get_media_from_handle(handle)
+            except HandleError:
+                self.handle_error(_("Error accessing media object."))
+                continue
+            path = media_path_full(self.db1, obj.get_path())
+            transfers.append((gramps_id, handle, path, obj.get_checksum()))
+        return transfers
+
+    def transfer_files(self, downloads, uploads) -> None:
+        """Download and upload media files concurrently.
+
+        Runs in a background thread; results and errors are passed to the
+        GTK thread with idle callbacks.
+        """
+        with ThreadPoolExecutor(max_workers=MAX_TRANSFER_WORKERS) as executor:
+            futures = {}
+            for gramps_id, handle, path, checksum in downloads:
+                LOG.debug("Downloading file %s", gramps_id)
+                future = executor.submit(
+                    self.api.download_media_file, handle, path, checksum
+                )
+                futures[future] = (self.downloaded, gramps_id)
+            for gramps_id, handle, path, checksum in uploads:
+                LOG.debug("Uploading file %s", gramps_id)
+                future = executor.submit(
+                    self.api.upload_media_file, handle, path, checksum
+                )
+                futures[future] = (self.uploaded, gramps_id)
+            for future in as_completed(futures):
+                try:
+                    success = future.result()
+                except Exception as exc:  # pylint: disable=broad-except
+                    # abort: skip the transfers that have not started yet
+                    for pending in futures:
+                        pending.cancel()
+                    GLib.idle_add(self._transfer_failed, exc)
+                    return
+                results, gramps_id = futures[future]
+                GLib.idle_add(self._file_transferred, results, gramps_id, success)
+        GLib.idle_add(self._done_transferring_files)
+
+    def _transfer_failed(self, exc: Exception) -> None:
+        """Report the error that aborted the file transfers."""
+        if isinstance(exc, (HTTPError, URLError, ValueError)):
+            self.handle_server_errors(_raise, exc)
+        else:
+            LOG.exception("Error while transferring media files", exc_info=exc)
+            self.handle_error(_("Error while transferring media files: %s") % exc)
+
+    def _file_transferred(
+        self, results: dict[str, bool], gramps_id: str, success: bool
+    ) -> None:
+        """Store the result of a file transfer and update the progress."""
+        results[gramps_id] = success
+        self._update_file_progress()
+
+    def _done_transferring_files(self) -> None:
+        """Move on after all files have been transferred."""
+        self.file_progress_page.set_complete()
+        self.assistant.next_page()
 
     def _update_file_progress(self):
         """Update the file progress bars."""
@@ -426,40 +494,6 @@ class GrampsWebSyncTool(BatchTool, ManagedWindow):
             self.downloaded,
             self.uploaded,
         )
-        # force updating progress bar
-        while Gtk.events_pending():
-            Gtk.main_iteration()
-
-    def _download_file(self, handle):
-        """Download a single media file."""
-        try:
-            obj = self.db1.get_media_from_handle(handle)
-        except HandleError:
-            self.handle_error(_("Error accessing media object."))
-            return
-        path = media_path_full(self.db1, obj.get_path())
-        return self.api.download_media_file(handle=handle, path=path)
-
-    def upload_files(self):
-        """Upload media files missing remotely."""
-        if not self.files_missing_remote:
-            return
-        res = {}
-        for gramps_id, handle in self.files_missing_remote:
-            LOG.debug("Uploading file %s", gramps_id)
-            self.uploaded[gramps_id] = self._upload_file(handle)
-            self._update_file_progress()
-        return res
-
-    def _upload_file(self, handle):
-        """Upload a single media file."""
-        try:
-            obj = self.db1.get_media_from_handle(handle)
-        except HandleError:
-            self.handle_error(_("Error accessing media object."))
-            return
-        path = media_path_full(self.db1, obj.get_path())
-        return self.api.upload_media_file(handle=handle, path=path)
 
     def get_password(self):
         """Get a stored password."""
@@ -483,30 +517,37 @@ class GrampsWebSyncTool(BatchTool, ManagedWindow):
         self.assistant.next_page()
 
     def async_compare_dbs(self):
-        """Download the remote data and import it to an in-memory database."""
-        # store timestamp just before downloading the XML
+        """Fetch the remote changes and compare them to local."""
+        # store timestamp just before fetching the remote data
         self._download_timestamp = datetime.now().timestamp()
         GLib.idle_add(self.get_diff_actions)
 
     def get_diff_actions(self) -> None:
-        """Download the remote data, import it and compare it to local."""
-        LOG.info("Downloading Gramps XML file.")
-        path = self.handle_server_errors(self.api.download_xml)
-        if path is None:
+        """Fetch the remote changes and compare them to local."""
+        LOG.info("Fetching the remote manifest.")
+        remote_manifest = self.handle_server_errors(self.api.get_manifest)
+        if remote_manifest is None:
             return
-        LOG.debug("Importing Gramps XML file.")
-        db2 = import_as_dict(str(path), self._user)
+        local_manifest = get_local_manifest(self.db1)
+        mismatches = get_mismatches(local_manifest, remote_manifest)
+        LOG.debug(
+            "Fetching %s remote objects.",
+            sum(len(handles) for handles in mismatches.values()),
+        )
+        db2 = self.handle_server_errors(self.fetch_remote_objects, mismatches)
         if db2 is None:
-            self.handle_error(_("Failed importing downloaded XML file."))
             return
-        LOG.debug("Successfully imported Gramps XML file.")
-        path.unlink()  # delete temporary file
+        LOG.debug("Successfully fetched remote objects.")
         self.db2 = db2
         self.diff_progress_page.label.set_text(_("Comparing local and remote data..."))
         LOG.info("Comparing local and remote data...")
         timestamp = self.config.get("credentials.timestamp") or None
         self._sync = WebApiSyncDiffHandler(
-            self.db1, self.db2, user=self._user, last_synced=timestamp
+            self.db1,
+            self.db2,
+            user=self._user,
+            last_synced=timestamp,
+            manifests=(local_manifest, remote_manifest),
         )
         self._changes = self.sync.get_changes()
         self.diff_progress_page.label.set_text("")
@@ -517,16 +558,26 @@ class GrampsWebSyncTool(BatchTool, ManagedWindow):
         else:
             self.assistant.next_page()
 
+    def fetch_remote_objects(self, handles: dict[str, set[str]]):
+        """Fetch remote objects into an in-memory database."""
+        return objects_to_database(
+            (class_name, data)
+            for class_name, class_handles in handles.items()
+            if class_handles
+            for data in self.api.get_objects(class_name, class_handles)
+        )
+
     def async_transfer_media(self):
         """Upload/download media files."""
         GLib.idle_add(self._async_transfer_media)
 
     def _async_transfer_media(self):
         """Upload/download media files."""
-        self.handle_server_errors(self.download_files)
-        self.handle_server_errors(self.upload_files)
-        self.file_progress_page.set_complete()
-        self.assistant.next_page()
+        # the database is only read on the GTK thread
+        downloads = self.get_transfers(self.files_missing_local)
+        uploads = self.get_transfers(self.files_missing_remote)
+        t = threading.Thread(target=self.transfer_files, args=(downloads, uploads))
+        t.start()
 
     def handle_server_errors(self, callback: Callable, *args) -> None:
         """Handle server errors while executing a function."""
@@ -0,0 +1,55 @@
+#
+# Gramps - a GTK+/GNOME based genealogy program
+#
+# Copyright (C) 2021-2024       David Straub
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Unit tests for the diff handler helpers."""
+
+import os
+import sys
+import unittest
+
+from gramps.gen.lib import Note, Person
+from gramps.gen.lib.json_utils import object_to_dict
+
+# the addon modules import each other as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from diffhandler import objects_to_database  # noqa: E402
+
+
+class ObjectsToDatabaseTestCase(unittest.TestCase):
+    """Test storing fetched remote objects."""
+
+    def test_change_time_kept(self):
+        person = Person()
+        person.set_handle("P0001")
+        person.set_gramps_id("I0001")
+        person.change = 1600000000
+        note = Note("text")
+        note.set_handle("N0001")
+        note.set_gramps_id("N0001")
+        note.change = 1500000000
+        db = objects_to_database(
+            [("Person", object_to_dict(person)), ("Note", object_to_dict(note))]
+        )
+        self.assertEqual(db.get_person_from_handle("P0001").change, 1600000000)
+        self.assertEqual(db.get_note_from_handle("N0001").change, 1500000000)
+
+
+if __name__ == "__main__":
+    unittest.main()
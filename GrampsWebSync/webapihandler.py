@@ -22,26 +22,53 @@
 from __future__ import annotations
 
 import base64
-import gzip
 import json
 import logging
 import os
 import platform
 import time
-from collections.abc import Callable
+import zlib
+from collections.abc import Callable, Iterable, Iterator
 from pathlib import Path
 from tempfile import NamedTemporaryFile
 from time import sleep
 from typing import Any
 from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
 from urllib.request import Request, urlopen
 
 from gramps.gen.lib.json_utils import remove_object
 from gramps.gen.db import KEY_TO_CLASS_MAP, DbTxn
 from gramps.gen.db.dbconst import TXNADD, TXNDEL, TXNUPD
+from gramps.gen.utils.file import create_checksum
+
+from const import OBJ_LST, Manifest
 
 LOG = logging.getLogger("grampswebsync")
 
+# Web API endpoints of the object classes
+OBJ_ENDPOINTS = {
+    "Family": "families",
+    "Person": "people",
+    "Citation": "citations",
+    "Event": "events",
+    "Media": "media",
+    "Note": "notes",
+    "Place": "places",
+    "Repository": "repositories",
+    "Source": "sources",
+    "Tag": "tags",
+}
+
+# page sizes when listing (handle, change) pairs and full objects
+MANIFEST_PAGE_SIZE = 10000
+OBJECT_PAGE_SIZE = 500
+# up to this many objects of a class are fetched one by one, more are
+# picked out of the pages of the full listing
+SINGLE_FETCH_MAX = 50
+# bytes read from a response at a time
+READ_SIZE = 65536
+
 
 def parse_version(version) -> tuple[int, int]:
     """Simple dependency-free version to parse a SemVer into a list of ints."""
@@ -79,6 +106,23 @@ def create_macos_ssl_context():
     return ctx
 
 
+class GunzipWriter:
+    """Wrap a binary file, decompressing gzip data written to it."""
+
+    def __init__(self, fobj) -> None:
+        """Initialize given the file the decompressed data is written to."""
+        self.fobj = fobj
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def write(self, chunk: bytes) -> None:
+        """Decompress a chunk and write it."""
+        self.fobj.write(self._decompressor.decompress(chunk))
+
+    def flush(self) -> None:
+        """Write the remaining decompressed data."""
+        self.fobj.write(self._decompressor.flush())
+
+
 def decode_jwt_payload(jwt: str) -> dict[str, Any]:
     """Decode and return the payload from a JWT."""
     payload_part = jwt.split(".")[1]
@@ -189,17 +233,100 @@ class WebApiHandler:
     def download_xml(self) -> Path:
         """Download an XML export and return the path of the temp file."""
         url = f"{self.url}/exporters/gramps/file"
-        temp = NamedTemporaryFile(delete=False)
+        temp = NamedTemporaryFile(delete=False, suffix=".gramps")
         try:
-            self._download_file(url=url, fobj=temp)
+            # decompress while downloading instead of reading it all at the end
+            writer = GunzipWriter(temp)
+            self._download_file(url=url, fobj=writer)
+            writer.flush()
         finally:
             temp.close()
-        unzipped_name = f"{temp.name}.gramps"
-        with open(unzipped_name, "wb") as fu:
-            with gzip.open(temp.name) as fz:
-                fu.write(fz.read())
-        os.remove(temp.name)
-        return Path(unzipped_name)
+        return Path(temp.name)
+
+    def get_manifest(self) -> Manifest:
+        """Fetch the change time of every remote object, by class and handle."""
+        manifest: Manifest = {}
+        for class_name in OBJ_LST:
+            changes = manifest[class_name] = {}
+            for page in self._iter_pages(
+                class_name, MANIFEST_PAGE_SIZE, keys="handle,change"
+            ):
+                for item in page:
+                    changes[item["handle"]] = item["change"]
+        return manifest
+
+    def get_objects(self, class_name: str, handles: Iterable[str]) -> Iterator[dict]:
+        """Fetch the remote objects of a class with the given handles.
+
+        Objects deleted on the server in the meantime are skipped.
+        """
+        handles = set(handles)
+        if len(handles) <= SINGLE_FETCH_MAX:
+            url = f"{self.url}/{OBJ_ENDPOINTS[class_name]}"
+            for handle in handles:
+                try:
+                    item = self._get_json(f"{url}/{handle}")
+                except HTTPError as exc:
+                    if exc.code == 404:
+                        continue
+                    raise
+                item.setdefault("_class", class_name)
+                yield item
+        else:
+            for page in self._iter_pages(class_name, OBJECT_PAGE_SIZE):
+                for item in page:
+                    if item["handle"] in handles:
+                        item.setdefault("_class", class_name)
+                        yield item
+
+    def _iter_pages(
+        self, class_name: str, pagesize: int, keys: str | None = None
+    ) -> Iterator[list[dict]]:
+        """Iterate over the pages of the listing of a remote object class."""
+        url = f"{self.url}/{OBJ_ENDPOINTS[class_name]}/"
+        page = 1
+        while True:
+            query: dict[str, Any] = {"page": page, "pagesize": pagesize}
+            if keys:
+                query["keys"] = keys
+            items = self._get_json(f"{url}?{urlencode(query)}")
+            if items:
+                yield items
+            if len(items) < pagesize:
+                return
+            page += 1
+
+    def _get_json(self, url: str, retry: bool = True) -> Any:
+        """Fetch a JSON response, decompressing it chunk by chunk."""
+        req = Request(
+            url,
+            headers={
+                "Authorization": f"Bearer {self.access_token}",
+                "Accept-Encoding": "gzip",
+            },
+        )
+        data = bytearray()
+        try:
+            with urlopen(req, context=self._ctx) as res:
+                decompressor = None
+                if res.headers.get("Content-Encoding") == "gzip":
+                    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                chunk = res.read(READ_SIZE)
+                while chunk:
+                    if decompressor is not None:
+                        chunk = decompressor.decompress(chunk)
+                    data += chunk
+                    chunk = res.read(READ_SIZE)
+                if decompressor is not None:
+                    data += decompressor.flush()
+        except HTTPError as exc:
+            if exc.code == 401 and retry:
+                # in case of 401, retry once with a new token
+                sleep(1)  # avoid server-side rate limit
+                self.fetch_token()
+                return self._get_json(url=url, retry=False)
+            raise
+        return json.loads(data)
 
     def commit(
         self,
@@ -301,9 +428,19 @@ class WebApiHandler:
         return res_json
 
     def _download_file(
-        self, url: str, fobj, retry: bool = True, token_url: bool = False
+        self,
+        url: str,
+        fobj,
+        retry: bool = True,
+        token_url: bool = False,
+        offset: int = 0,
     ):
-        """Download a file."""
+        """Download a file.
+
+        If offset is given, only the rest of the file is requested and
+        appended. If the server sends the whole file instead, fobj is
+        truncated first.
+        """
         if token_url:
             req = Request(f"{url}?jwt={self.access_token}")
         else:
@@ -311,8 +448,13 @@ class WebApiHandler:
                 url,
                 headers={"Authorization": f"Bearer {self.access_token}"},
             )
+        if offset:
+            req.add_header("Range", f"bytes={offset}-")
         try:
             with urlopen(req, context=self._ctx) as res:
+                if offset and res.getcode() != 206:
+                    fobj.seek(0)
+                    fobj.truncate()
                 chunk_size = 1024
                 chunk = res.read(chunk_size)
                 fobj.write(chunk)
@@ -327,19 +469,54 @@ class WebApiHandler:
                 sleep(1)  # avoid server-side rate limit
                 self.fetch_token()
                 return self._download_file(
-                    url=url, fobj=fobj, retry=False, token_url=token_url
+                    url=url, fobj=fobj, retry=False, token_url=token_url, offset=offset
                 )
             raise
 
-    def download_media_file(self, handle: str, path) -> bool:
-        """Download a media file."""
-        url = f"{self.url}/media/{handle}/file"
-        with open(path, "wb") as f:
-            self._download_file(url=url, fobj=f, token_url=True)
+    def download_media_file(
+        self, handle: str, path, checksum: str | None = None
+    ) -> bool:
+        """Download a media file.
+
+        The file is first written to a ``.part`` file next to it, so an
+        interrupted download is resumed where it stopped. If a checksum
+        is given, a file already matching it is not downloaded again.
+        """
+        path = Path(path)
+        if checksum and path.exists() and create_checksum(path) == checksum:
+            return True
+        part = path.with_name(f"{path.name}.part")
+        offset = part.stat().st_size if part.exists() else 0
+        if not (checksum and offset and create_checksum(part) == checksum):
+            url = f"{self.url}/media/{handle}/file"
+            with open(part, "ab") as f:
+                try:
+                    self._download_file(
+                        url=url, fobj=f, token_url=True, offset=offset
+                    )
+                except HTTPError as exc:
+                    # range starts at the end of the file: nothing left
+                    if exc.code != 416:
+                        raise
+            if checksum and offset and create_checksum(part) != checksum:
+                # the partial file was stale, start over
+                LOG.debug("Resumed download of %s is corrupt, restarting", handle)
+                with open(part, "wb") as f:
+                    self._download_file(url=url, fobj=f, token_url=True)
+        os.replace(part, path)
         return True
 
-    def upload_media_file(self, handle: str, path) -> bool:
-        """Upload a media file."""
+    def upload_media_file(
+        self, handle: str, path, checksum: str | None = None
+    ) -> bool:
+        """Upload a media file.
+
+        If a checksum is given and the local file does not match it, the
+        server would reject the file, so it is not uploaded.
+        """
+        if checksum and create_checksum(path) != checksum:
+            LOG.warning("Checksum mismatch, not uploading media file %s", handle)
+            return False
         url = f"{self.url}/media/{handle}/file?uploadmissing=1"
         try:
             with open(path, "rb") as f:
@@ -8,7 +8,7 @@ register(
     status=STABLE,
     fname="JSONExport.py",
     export_function="exportData",
-    export_options="WriterOptionBox",
+    export_options="JSONWriterOptionBox",
     export_options_title=_("JSON options"),
     extension="json",
     help_url="Addon:JSON_Export_Import#Export_JSON",
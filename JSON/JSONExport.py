@@ -19,6 +19,20 @@
 #
 #
 
+# ------------------------------------------------------------------------
+#
+# Standard Python Modules
+#
+# ------------------------------------------------------------------------
+import sys
+
+# ------------------------------------------------------------------------
+#
+# GTK modules
+#
+# ------------------------------------------------------------------------
+from gi.repository import Gtk
+
 # ------------------------------------------------------------------------
 #
 # Gramps modules
@@ -27,107 +41,86 @@
 from gramps.gui.plug.export import WriterOptionBox
 from gramps.gen.plug.utils import OpenFileOrStdout
 from gramps.gen.lib.json_utils import object_to_string
+from gramps.gen.const import GRAMPS_LOCALE as glocale
+
+from jsonchunks import (
+    COMPRESSION_NONE,
+    COMPRESSION_GZIP,
+    COMPRESSION_ZSTD,
+    available_compressions,
+    write_container,
+)
+
+_ = glocale.translation.sgettext
+
+COMPRESSION_LABELS = {
+    COMPRESSION_NONE: _("None (plain JSON lines)"),
+    COMPRESSION_GZIP: _("gzip (chunked)"),
+    COMPRESSION_ZSTD: _("zstd (chunked)"),
+}
 
 
 def exportData(db, filename, error_dialog=None, option_box=None, callback=None):
     if not callable(callback):
         callback = lambda percent: None  # dummy
 
-    with OpenFileOrStdout(filename, encoding="utf-8") as fp:
+    compression = COMPRESSION_NONE
+    if option_box:
+        option_box.parse_options()
+        db = option_box.get_filtered_database(db)
+        compression = getattr(option_box, "compression", COMPRESSION_NONE)
+
+    total = (
+        db.get_number_of_notes()
+        + db.get_number_of_people()
+        + db.get_number_of_events()
+        + db.get_number_of_families()
+        + db.get_number_of_repositories()
+        + db.get_number_of_places()
+        + db.get_number_of_media()
+        + db.get_number_of_citations()
+        + db.get_number_of_sources()
+        + db.get_number_of_tags()
+    )
+    sources = [
+        ("Note", db.iter_notes()),
+        ("Event", db.iter_events()),
+        ("Person", db.iter_people()),
+        ("Family", db.iter_families()),
+        ("Repository", db.iter_repositories()),
+        ("Place", db.iter_places()),
+        ("Source", db.iter_sources()),
+        ("Citation", db.iter_citations()),
+        ("Media", db.iter_media()),
+        ("Tag", db.iter_tags()),
+    ]
+
+    if compression != COMPRESSION_NONE:
+        # Chunked container, serialized and compressed in worker processes
+        if filename == "-":
+            write_container(
+                sys.stdout.buffer,
+                sources,
+                compression,
+                lambda count: callback(100 * count / total),
+            )
+        else:
+            with open(filename, "wb") as fp:
+                write_container(
+                    fp,
+                    sources,
+                    compression,
+                    lambda count: callback(100 * count / total),
+                )
+        return True
 
-        total = (
-            db.get_number_of_notes()
-            + db.get_number_of_people()
-            + db.get_number_of_events()
-            + db.get_number_of_families()
-            + db.get_number_of_repositories()
-            + db.get_number_of_places()
-            + db.get_number_of_media()
-            + db.get_number_of_citations()
-            + db.get_number_of_sources()
-            + db.get_number_of_tags()
-        )
+    with OpenFileOrStdout(filename, encoding="utf-8") as fp:
         count = 0.0
-
-        # ---------------------------------
-        # Notes
-        # ---------------------------------
-        for obj in db.iter_notes():
-            write_line(fp, obj)
-            count += 1
-            callback(100 * count / total)
-
-        # ---------------------------------
-        # Event
-        # ---------------------------------
-        for obj in db.iter_events():
-            write_line(fp, obj)
-            count += 1
-            callback(100 * count / total)
-
-        # ---------------------------------
-        # Person
-        # ---------------------------------
-        for obj in db.iter_people():
-            write_line(fp, obj)
-            count += 1
-            callback(100 * count / total)
-
-        # ---------------------------------
-        # Family
-        # ---------------------------------
-        for obj in db.iter_families():
-            write_line(fp, obj)
-            count += 1
-            callback(100 * count / total)
-
-        # ---------------------------------
-        # Repository
-        # ---------------------------------
-        for obj in db.iter_repositories():
-            write_line(fp, obj)
-            count += 1
-            callback(100 * count / total)
-
-        # ---------------------------------
-        # Place
-        # ---------------------------------
-        for obj in db.iter_places():
-            write_line(fp, obj)
-            count += 1
-            callback(100 * count / total)
-
-        # ---------------------------------
-        # Source
-        # ---------------------------------
-        for obj in db.iter_sources():
-            write_line(fp, obj)
-            count += 1
-            callback(100 * count / total)
-
-        # ---------------------------------
-        # Citation
-        # ---------------------------------
-        for obj in db.iter_citations():
-            write_line(fp, obj)
-            count += 1
-            callback(100 * count / total)
-
-        # ---------------------------------
-        # Media
-        # ---------------------------------
-        for obj in db.iter_media():
-            write_line(fp, obj)
-            count += 1
-            callback(100 * count / total)
-
-        # ---------------------------------
-        # Tag
-        # ---------------------------------
-        for obj in db.iter_tags():
-            write_line(fp, obj)
-            count += 1
-            callback(100 * count / total)
+        for _class_name, objs in sources:
+            for obj in objs:
+                write_line(fp, obj)
+                count += 1
+                callback(100 * count / total)
 
     return True
 
@@ -137,3 +130,44 @@ def write_line(fp, obj):
     Write a single object to the file.
     """
     fp.write(object_to_string(obj) + "\n")
+
+
+# ------------------------------------------------------------------------
+#
+# JSONWriterOptionBox
+#
+# ------------------------------------------------------------------------
+class JSONWriterOptionBox(WriterOptionBox):
+    """
+    Writer options with a choice of compression.
+    """
+
+    def __init__(self, person, dbstate, uistate, track=None, window=None):
+        super().__init__(person, dbstate, uistate, track=track, window=window)
+        self.compression = COMPRESSION_NONE
+        self.compression_list = None
+        self.compressions = available_compressions()
+
+    def get_option_box(self):
+        option_box = super().get_option_box()
+
+        hbox = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=10)
+        label = Gtk.Label(label=_("Compression:"))
+        self.compression_list = Gtk.ComboBoxText()
+        for compression in self.compressions:
+            self.compression_list.append_text(COMPRESSION_LABELS[compression])
+        self.compression_list.set_active(0)
+
+        hbox.pack_start(label, False, False, 0)
+        hbox.pack_start(self.compression_list, False, False, 0)
+        option_box.pack_start(hbox, False, False, 0)
+
+        return option_box
+
+    def parse_options(self):
+        """
+        Get the options and store locally.
+        """
+        super().parse_options()
+        if self.compression_list:
+            self.compression = self.compressions[self.compression_list.get_active()]
@@ -27,6 +27,8 @@
 #
 # -------------------------------------------------------------------------
 import logging
+import sys
+from itertools import chain
 
 # -------------------------------------------------------------------------
 #
@@ -34,7 +36,6 @@ import logging
 #
 # -------------------------------------------------------------------------
 from gramps.gen.db import DbTxn
-from gramps.gen.plug.utils import OpenFileOrStdin
 from gramps.gen.lib import (
     Note,
     Person,
@@ -50,6 +51,8 @@ from gramps.gen.lib import (
 from gramps.gen.lib.json_utils import string_to_object
 from gramps.gen.const import GRAMPS_LOCALE as glocale
 
+from jsonchunks import is_container, read_container, read_header
+
 _ = glocale.translation.sgettext
 
 # ------------------------------------------------------------------------
@@ -59,42 +62,75 @@ _ = glocale.translation.sgettext
 # ------------------------------------------------------------------------
 LOG = logging.getLogger(".ImportJSON")
 
+# Database method adding each kind of object
+ADD_METHODS = {
+    Person: "add_person",
+    Family: "add_family",
+    Event: "add_event",
+    Media: "add_media",
+    Repository: "add_repository",
+    Tag: "add_tag",
+    Source: "add_source",
+    Citation: "add_citation",
+    Note: "add_note",
+    Place: "add_place",
+}
+
 
 def importData(db, filename, user):
     """Function called by Gramps to import data on persons in CSV format."""
     db.disable_signals()
 
     try:
-        with DbTxn(_("JSON import"), db, batch=True) as trans:
-            with OpenFileOrStdin(filename, encoding="utf-8") as fp:
-                line = fp.readline()
-                while line:
-                    obj = string_to_object(line)
-                    if isinstance(obj, Person):
-                        db.add_person(obj, trans)
-                    elif isinstance(obj, Family):
-                        db.add_family(obj, trans)
-                    elif isinstance(obj, Event):
-                        db.add_event(obj, trans)
-                    elif isinstance(obj, Media):
-                        db.add_media(obj, trans)
-                    elif isinstance(obj, Repository):
-                        db.add_repository(obj, trans)
-                    elif isinstance(obj, Tag):
-                        db.add_tag(obj, trans)
-                    elif isinstance(obj, Source):
-                        db.add_source(obj, trans)
-                    elif isinstance(obj, Citation):
-                        db.add_citation(obj, trans)
-                    elif isinstance(obj, Note):
-                        db.add_note(obj, trans)
-                    elif isinstance(obj, Place):
-                        db.add_place(obj, trans)
-                    else:
-                        LOG.warn("ignored: " + data)
-                    line = fp.readline()
+        if filename == "-":
+            # The chunked container is binary, as on export
+            read_objects(db, sys.stdin.buffer)
+        else:
+            with open(filename, "rb") as fp:
+                read_objects(db, fp)
     except EnvironmentError as err:
         user.notify_error(_("%s could not be opened\n") % filename, str(err))
 
     db.enable_signals()
     db.request_rebuild()
+
+
+def read_objects(db, fp):
+    """
+    Add the objects of a JSON lines file or chunked container, read from a
+    binary file, to the database.
+    """
+    first_line = fp.readline()
+    if is_container(first_line):
+        # Chunks are decoded in worker processes, objects are still
+        # added by this single writer inside one transaction
+        header = read_header(first_line)
+        chunks = read_container(fp, header["compression"])
+    else:
+        chunks = ([string_to_object(line)] for line in _iter_lines(first_line, fp))
+
+    with DbTxn(_("JSON import"), db, batch=True) as trans:
+        for chunk in chunks:
+            for obj in chunk:
+                add_object(db, obj, trans)
+
+
+def _iter_lines(first_line, fp):
+    """
+    Yield the decoded non-empty lines of a plain JSON lines file.
+    """
+    for line in chain([first_line], iter(fp.readline, b"")):
+        line = line.decode("utf-8").strip()
+        if line:
+            yield line
+
+
+def add_object(db, obj, trans):
+    """
+    Add an object to the database with the method matching its class.
+    """
+    method = ADD_METHODS.get(type(obj))
+    if method:
+        getattr(db, method)(obj, trans)
+    else:
+        LOG.warning("ignored: %s", obj)
@@ -0,0 +1,236 @@
+#
+# Gramps - a GTK+/GNOME based genealogy program
+#
+# Copyright (C) 2013       Doug Blank <doug.blank@gmail.com>
+# Copyright (C) 2016-2017  Nick Hall
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+"""
+Chunked, optionally compressed container for JSON lines.
+
+The file starts with a header line::
+
+    {"format": "gramps-json-chunks", "version": 1, "compression": "gzip"}
+
+followed by chunks. Each chunk is an index line giving the object class,
+the number of objects and the payload size in bytes, followed by the
+payload: the objects as JSON lines, compressed as a whole. Chunks are
+independent, so they are encoded and decoded in worker processes.
+"""
+
+# -------------------------------------------------------------------------
+#
+# Standard Python Modules
+#
+# -------------------------------------------------------------------------
+import gzip
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import zstandard
+
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# -------------------------------------------------------------------------
+#
+# Gramps modules
+#
+# -------------------------------------------------------------------------
+from gramps.gen.lib.json_utils import object_to_string, string_to_object
+
+# -------------------------------------------------------------------------
+#
+# Constants
+#
+# -------------------------------------------------------------------------
+FORMAT_NAME = "gramps-json-chunks"
+FORMAT_VERSION = 1
+
+COMPRESSION_NONE = "none"
+COMPRESSION_GZIP = "gzip"
+COMPRESSION_ZSTD = "zstd"
+
+CHUNK_SIZE = 1000
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def available_compressions():
+    """
+    Return the compression methods usable on this system.
+    """
+    methods = [COMPRESSION_NONE, COMPRESSION_GZIP]
+    if ZSTD_AVAILABLE:
+        methods.append(COMPRESSION_ZSTD)
+    return methods
+
+
+def is_container(first_line):
+    """
+    Return True if the first line of a file is a container header.
+    """
+    try:
+        header = json.loads(first_line)
+    except ValueError:
+        return False
+    return isinstance(header, dict) and header.get("format") == FORMAT_NAME
+
+
+def compress(data, compression):
+    """
+    Compress a payload.
+    """
+    if compression == COMPRESSION_GZIP:
+        return gzip.compress(data, GZIP_LEVEL)
+    if compression == COMPRESSION_ZSTD:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return data
+
+
+def decompress(data, compression):
+    """
+    Decompress a payload.
+    """
+    if compression == COMPRESSION_GZIP:
+        return gzip.decompress(data)
+    if compression == COMPRESSION_ZSTD:
+        if not ZSTD_AVAILABLE:
+            raise ValueError("zstd compressed file, but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
+
+
+def encode_chunk(objs, compression):
+    """
+    Serialize and compress a list of objects. Runs in a worker process.
+    """
+    lines = "".join(object_to_string(obj) + "\n" for obj in objs)
+    return compress(lines.encode("utf-8"), compression)
+
+
+def decode_chunk(payload, compression):
+    """
+    Decompress and deserialize a chunk. Runs in a worker process.
+    """
+    text = decompress(payload, compression).decode("utf-8")
+    return [string_to_object(line) for line in text.splitlines() if line]
+
+
+def iter_chunks(objs, size=CHUNK_SIZE):
+    """
+    Split an iterator of objects into lists of at most size objects.
+    """
+    chunk = []
+    for obj in objs:
+        chunk.append(obj)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def write_container(fp, sources, compression, callback=None, workers=None):
+    """
+    Write objects to a binary file as a chunked container.
+
+    :param fp: file opened for binary writing
+    :param sources: list of (class_name, iterator of objects)
+    :param compression: one of the COMPRESSION_* names
+    :param callback: called with the number of objects written so far
+    :param workers: number of worker processes, default CPU count
+    """
+    workers = workers or os.cpu_count() or 1
+    header = {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "compression": compression,
+    }
+    fp.write(json.dumps(header).encode("utf-8") + b"\n")
+
+    count = 0
+    pending = deque()
+
+    def write_next():
+        nonlocal count
+        class_name, size, future = pending.popleft()
+        payload = future.result()
+        index = {"class": class_name, "count": size, "size": len(payload)}
+        fp.write(json.dumps(index).encode("utf-8") + b"\n")
+        fp.write(payload)
+        count += size
+        if callback:
+            callback(count)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for class_name, objs in sources:
+            for chunk in iter_chunks(objs):
+                pending.append(
+                    (
+                        class_name,
+                        len(chunk),
+                        executor.submit(encode_chunk, chunk, compression),
+                    )
+                )
+                # Keep output ordered and memory bounded
+                if len(pending) >= workers * 2:
+                    write_next()
+        while pending:
+            write_next()
+
+
+def read_container(fp, compression, workers=None):
+    """
+    Read the chunks of a container, yielding lists of objects.
+
+    The header line must already have been read and parsed with
+    :func:`read_header`. Chunks are decoded concurrently, and yielded in
+    file order.
+
+    :param fp: file opened for binary reading, positioned after the header
+    :param compression: compression named in the header
+    :param workers: number of worker processes, default CPU count
+    """
+    workers = workers or os.cpu_count() or 1
+    pending = deque()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for line in iter(fp.readline, b""):
+            if not line.strip():
+                continue
+            index = json.loads(line)
+            payload = fp.read(index["size"])
+            pending.append(executor.submit(decode_chunk, payload, compression))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def read_header(first_line):
+    """
+    Parse and check a container header line.
+    """
+    header = json.loads(first_line)
+    if header.get("version", 0) > FORMAT_VERSION:
+        raise ValueError("Unsupported container version %s" % header["version"])
+    return header
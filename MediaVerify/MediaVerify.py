@@ -28,6 +28,9 @@
 #-------------------------------------------------------------------------
 import os
 import io
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 
 #-------------------------------------------------------------------------
 #
@@ -47,10 +50,11 @@ from gramps.gui.managedwindow import ManagedWindow
 from gramps.gui.utils import ProgressMeter, open_file_with_default_application
 from gramps.gen.db import DbTxn
 from gramps.gen.utils.file import (media_path_full, relative_path,
-                                   create_checksum, expand_media_path)
+                                   expand_media_path)
 from gramps.gui.dialog import WarningDialog
 from gramps.gui.editors import EditMedia
 from gramps.gen.errors import WindowActiveError
+from gramps.gen.const import USER_CACHE
 
 #------------------------------------------------------------------------
 #
@@ -64,6 +68,84 @@ except ValueError:
     _trans = glocale.translation
 _ = _trans.gettext
 
+#-------------------------------------------------------------------------
+#
+# Constants
+#
+#-------------------------------------------------------------------------
+CACHE_FILE = os.path.join(USER_CACHE, 'media_verify_md5.json')
+HASH_BUFFER_SIZE = 1024 * 1024
+HASH_CHUNK_SIZE = 16
+
+def hash_file(full_path):
+    """
+    Return the md5 hash of a file, or an empty string if it cannot be read.
+    Runs in a worker process.
+    """
+    md5 = hashlib.md5()
+    try:
+        with io.open(full_path, 'rb') as media_file:
+            while True:
+                buf = media_file.read(HASH_BUFFER_SIZE)
+                if not buf:
+                    break
+                md5.update(buf)
+    except (IOError, UnicodeEncodeError):
+        return ''
+    return md5.hexdigest()
+
+#-------------------------------------------------------------------------
+#
+# Hash cache
+#
+#-------------------------------------------------------------------------
+class HashCache:
+    """
+    Persistent cache of md5 hashes by file path. An entry is only used
+    while the size and modification time of the file are unchanged.
+    """
+    def __init__(self, filename=CACHE_FILE):
+        self.filename = filename
+        self.entries = {}
+        self.changed = False
+        try:
+            with io.open(filename, 'r', encoding='utf-8') as cache_file:
+                self.entries = json.load(cache_file)
+        except (IOError, ValueError):
+            pass
+
+    def lookup(self, full_path, stat):
+        """
+        Return the cached hash of a file, or None.
+        """
+        entry = self.entries.get(full_path)
+        if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            return entry[2]
+        return None
+
+    def store(self, full_path, stat, md5sum):
+        """
+        Store the hash of a file.
+        """
+        self.entries[full_path] = [stat.st_size, stat.st_mtime_ns, md5sum]
+        self.changed = True
+
+    def save(self):
+        """
+        Write the cache to disk, if it has changed.
+        """
+        if not self.changed:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+            temp_name = self.filename + '.tmp'
+            with io.open(temp_name, 'w', encoding='utf-8') as cache_file:
+                json.dump(self.entries, cache_file)
+            os.replace(temp_name, self.filename)
+            self.changed = False
+        except IOError:
+            pass
+
 #-------------------------------------------------------------------------
 #
 # Media Verify
@@ -258,29 +340,75 @@ class MediaVerify(tool.Tool, ManagedWindow):
         length = self.db.get_number_of_media()
         progress.set_pass(_('Generating media hashes'), length)
 
-        with DbTxn(_("Set media hashes"), self.db, batch=True) as trans:
+        paths = {}
+        for handle in self.db.get_media_handles():
+            media = self.db.get_media_from_handle(handle)
+            paths[handle] = media_path_full(self.db, media.get_path())
+        checksums = self.get_checksums(paths.values(), progress)
 
-            for handle in self.db.get_media_handles():
-                media = self.db.get_media_from_handle(handle)
+        with DbTxn(_("Set media hashes"), self.db, batch=True) as trans:
 
-                full_path = media_path_full(self.db, media.get_path())
-                md5sum = create_checksum(full_path)
+            for handle, full_path in paths.items():
+                if full_path not in checksums:
+                    continue    # cancelled
+                md5sum = checksums[full_path]
                 if not md5sum:
                     error_msg = 'IOError: %s' % full_path
                     self.models[5].append((error_msg, None))
-                    progress.step()
                     continue
 
-                media.set_checksum(md5sum)
-                self.db.commit_media(media, trans)
-
-                progress.step()
-                if progress.get_cancelled():
-                    break
+                media = self.db.get_media_from_handle(handle)
+                if media.get_checksum() != md5sum:
+                    media.set_checksum(md5sum)
+                    self.db.commit_media(media, trans)
 
         self.show_tabs()
         progress.close()
 
+    def get_checksums(self, paths, progress):
+        """
+        Return a dictionary of md5 hashes by full path, with an empty
+        string for files that cannot be read. Only files that are new or
+        changed since they were last hashed are read, in worker processes.
+        If the progress meter is cancelled, the result is incomplete.
+        """
+        cache = HashCache()
+        checksums = {}
+        to_hash = []
+        for full_path in set(paths):
+            try:
+                stat = os.stat(full_path)
+            except OSError:
+                checksums[full_path] = ''
+                progress.step()
+                continue
+            md5sum = cache.lookup(full_path, stat)
+            if md5sum:
+                checksums[full_path] = md5sum
+                progress.step()
+            else:
+                to_hash.append((full_path, stat))
+
+        if to_hash and not progress.get_cancelled():
+            executor = ProcessPoolExecutor()
+            try:
+                results = executor.map(hash_file,
+                                       [full_path for full_path, _stat
+                                        in to_hash],
+                                       chunksize=HASH_CHUNK_SIZE)
+                for (full_path, stat), md5sum in zip(to_hash, results):
+                    checksums[full_path] = md5sum
+                    if md5sum:
+                        cache.store(full_path, stat, md5sum)
+                    progress.step()
+                    if progress.get_cancelled():
+                        break
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+        cache.save()
+        return checksums
+
     def verify_media(self, button):
         """
         Verify media objects have the correct path to files in the media
@@ -301,45 +429,38 @@ class MediaVerify(tool.Tool, ManagedWindow):
         progress = ProgressMeter(self.window_name, can_cancel=True,
                                  parent=self.window)
 
-        length = 0
+        full_paths = []
         for root, dirs, files in os.walk(media_path):
-            length += len(files)
-        progress.set_pass(_('Finding files'), length)
+            full_paths.extend(os.path.join(root, file_name)
+                              for file_name in files)
+        progress.set_pass(_('Finding files'), len(full_paths))
+        checksums = self.get_checksums(full_paths, progress)
 
         all_files = {}
-        for root, dirs, files in os.walk(media_path):
-            for file_name in files:
-                full_path = os.path.join(root, file_name)
-                md5sum = create_checksum(full_path)
-                if not md5sum:
-                    error_msg = 'IOError: %s' % full_path
-                    self.models[5].append((error_msg, None))
-                    progress.step()
-                    continue
-
-                rel_path = relative_path(full_path, media_path)
-                if md5sum in all_files:
-                    all_files[md5sum].append(rel_path)
-                else:
-                    all_files[md5sum] = [rel_path]
-
-                progress.step()
-                if progress.get_cancelled():
-                    break
-            # the following allows cancelling with subdirectries
-            else:           # normal exit of for file_name loop
-                continue    # just continue with outer loop
-            break           # inner loop had break, so break outer as well.
+        for full_path in full_paths:
+            if full_path not in checksums:
+                continue    # cancelled
+            md5sum = checksums[full_path]
+            if not md5sum:
+                error_msg = 'IOError: %s' % full_path
+                self.models[5].append((error_msg, None))
+                continue
+
+            rel_path = relative_path(full_path, media_path)
+            if md5sum in all_files:
+                all_files[md5sum].append(rel_path)
+            else:
+                all_files[md5sum] = [rel_path]
 
         length = self.db.get_number_of_media()
         progress.set_pass(_('Checking paths'), length)
 
-        in_gramps = []
+        in_gramps = set()
         for handle in self.db.get_media_handles():
             media = self.db.get_media_from_handle(handle)
 
             md5sum = media.get_checksum()
-            in_gramps.append(md5sum)
+            in_gramps.add(md5sum)
 
             # Moved files
             gramps_path = media.get_path()
@@ -28,7 +28,10 @@ import os
 import time
 import logging
 import json
-from pymongo import MongoClient, version, ASCENDING
+from pymongo import (MongoClient, version, ASCENDING, ReturnDocument,
+                     ReplaceOne, InsertOne, DeleteMany)
+from pymongo.collation import Collation
+from pymongo.errors import OperationFailure
 
 #------------------------------------------------------------------------
 #
@@ -53,6 +56,11 @@ from gramps.gen.const import GRAMPS_LOCALE as glocale
 LOG = logging.getLogger(".mongodb")
 _LOG = logging.getLogger(DBLOGNAME)
 
+# Number of documents sent in one bulk write
+BULK_SIZE = 1000
+# Number of documents fetched per round trip by cursors
+CURSOR_BATCH_SIZE = 1000
+
 def obj_to_doc(obj):
     """
     Convert a Gramps object into a MongoDB document.
@@ -71,6 +79,19 @@ def doc_to_obj(doc):
     obj = from_json(json.dumps(doc))
     return obj
 
+# Languages the server has no collation for, sorted with 'simple' instead
+UNSUPPORTED_COLLATIONS = set()
+
+def locale_collation(locale):
+    """
+    Return the MongoDB collation for a GrampsLocale.
+    """
+    lang = locale.lang.split('.')[0]
+    name = lang.split('_')[0]
+    if lang in ('', 'C', 'POSIX') or name in UNSUPPORTED_COLLATIONS:
+        return Collation('simple')
+    return Collation(name)
+
 class MongoDB(DbGeneric):
     """
     Backend for MongoDB database
@@ -118,6 +139,13 @@ class MongoDB(DbGeneric):
 
         self.client = MongoClient(**dbkwargs)
         self.db = self.client[dbname]
+        self.batch_size = CURSOR_BATCH_SIZE
+        # Documents written in batch transactions, not yet sent:
+        # {collection: {handle: document}}
+        self._pending = {}
+        self._pending_count = 0
+        if self._schema_exists():
+            self._create_indexes()
 
     def _schema_exists(self):
         """
@@ -148,6 +176,13 @@ class MongoDB(DbGeneric):
         self.db.create_collection("name_group")
         self.db.create_collection("gender_stats")
 
+        self._create_indexes()
+
+    def _create_indexes(self):
+        """
+        Create the indexes. Existing indexes are left alone, so this is
+        also used to add new indexes to older databases.
+        """
         self.db.person.create_index("gramps_id")
         self.db.person.create_index("primary_name.first_name")
         self.db.person.create_index("primary_name.surname_list.surname")
@@ -168,6 +203,12 @@ class MongoDB(DbGeneric):
 
         self.db.reference.create_index("obj_handle")
         self.db.reference.create_index("ref_handle")
+        # Reference diffs and undo match on both handles, backlink
+        # searches are often restricted to some classes
+        self.db.reference.create_index([("obj_handle", ASCENDING),
+                                        ("ref_handle", ASCENDING)])
+        self.db.reference.create_index([("ref_handle", ASCENDING),
+                                        ("obj_class", ASCENDING)])
         self.db.metadata.create_index("setting")
         self.db.name_group.create_index("name")
         self.db.gender_stats.create_index("given_name")
@@ -251,6 +292,8 @@ class MongoDB(DbGeneric):
         """
         Executed after a batch operation abort.
         """
+        self._pending = {}
+        self._pending_count = 0
         self.transaction = None
         txn.clear()
         txn.first = None
@@ -325,10 +368,11 @@ class MongoDB(DbGeneric):
         :param locale: The locale to use for collation.
         :type locale: A GrampsLocale object.
         """
-        cursor = self.db.person.find({}, {"_id": 1})
         if sort_handles:
-            cursor.sort("primary_name.surname_list.surname", ASCENDING)
-        return [doc["_id"] for doc in cursor]
+            return self._get_sorted_handles(
+                "person", ["primary_name.surname_list.0.surname",
+                           "primary_name.first_name"], locale)
+        return self._get_handles("person")
 
     def get_family_handles(self, sort_handles=False, locale=glocale):
         """
@@ -340,19 +384,39 @@ class MongoDB(DbGeneric):
         :param locale: The locale to use for collation.
         :type locale: A GrampsLocale object.
         """
-        cursor = self.db.family.find({}, {"_id": 1})
         if sort_handles:
-            # FIXME: Need to order by father and mother surname
-            pass
-        return [doc["_id"] for doc in cursor]
+            self._flush()
+            # Sort by the surnames of the father and the mother, looked up
+            # on the server
+            pipeline = [{"$project": {"father_handle": 1, "mother_handle": 1}}]
+            for parent in ("father", "mother"):
+                pipeline.append({"$lookup": {
+                    "from": "person",
+                    "let": {"handle": "$%s_handle" % parent},
+                    "pipeline": [
+                        {"$match": {"$expr": {"$eq": ["$_id", "$$handle"]}}},
+                        {"$project": {"_id": 0, "surname": {"$arrayElemAt": [
+                            "$primary_name.surname_list.surname", 0]}}}],
+                    "as": parent}})
+            pipeline += [
+                {"$project": {"father": {"$arrayElemAt": ["$father.surname", 0]},
+                              "mother": {"$arrayElemAt": ["$mother.surname", 0]}}},
+                {"$sort": {"father": ASCENDING, "mother": ASCENDING}},
+                {"$project": {"_id": 1}}]
+            def query(collation):
+                cursor = self.db.family.aggregate(
+                    pipeline, collation=collation,
+                    allowDiskUse=True, batchSize=self.batch_size)
+                return [doc["_id"] for doc in cursor]
+            return self._collated(query, locale)
+        return self._get_handles("family")
 
     def get_event_handles(self):
         """
         Return a list of database handles, one handle for each Event in the
         database.
         """
-        cursor = self.db.event.find({})
-        return [doc["_id"] for doc in cursor]
+        return self._get_handles("event")
 
     def get_citation_handles(self, sort_handles=False, locale=glocale):
         """
@@ -364,10 +428,9 @@ class MongoDB(DbGeneric):
         :param locale: The locale to use for collation.
         :type locale: A GrampsLocale object.
         """
-        cursor = self.db.citation.find({}, {"_id": 1})
         if sort_handles:
-            cursor.sort("page", ASCENDING)
-        return [doc["_id"] for doc in cursor]
+            return self._get_sorted_handles("citation", ["page"], locale)
+        return self._get_handles("citation")
 
     def get_source_handles(self, sort_handles=False, locale=glocale):
         """
@@ -379,10 +442,9 @@ class MongoDB(DbGeneric):
         :param locale: The locale to use for collation.
         :type locale: A GrampsLocale object.
         """
-        cursor = self.db.source.find({}, {"_id": 1})
         if sort_handles:
-            cursor.sort("title", ASCENDING)
-        return [doc["_id"] for doc in cursor]
+            return self._get_sorted_handles("source", ["title"], locale)
+        return self._get_handles("source")
 
     def get_place_handles(self, sort_handles=False, locale=glocale):
         """
@@ -394,18 +456,16 @@ class MongoDB(DbGeneric):
         :param locale: The locale to use for collation.
         :type locale: A GrampsLocale object.
         """
-        cursor = self.db.place.find({}, {"_id": 1})
         if sort_handles:
-            cursor.sort("title", ASCENDING)
-        return [doc["_id"] for doc in cursor]
+            return self._get_sorted_handles("place", ["title"], locale)
+        return self._get_handles("place")
 
     def get_repository_handles(self):
         """
         Return a list of database handles, one handle for each Repository in
         the database.
         """
-        cursor = self.db.repository.find({})
-        return [doc["_id"] for doc in cursor]
+        return self._get_handles("repository")
 
     def get_media_handles(self, sort_handles=False, locale=glocale):
         """
@@ -417,18 +477,16 @@ class MongoDB(DbGeneric):
         :param locale: The locale to use for collation.
         :type locale: A GrampsLocale object.
         """
-        cursor = self.db.media.find({}, {"_id": 1})
         if sort_handles:
-            cursor.sort("desc", ASCENDING)
-        return [doc["_id"] for doc in cursor]
+            return self._get_sorted_handles("media", ["desc"], locale)
+        return self._get_handles("media")
 
     def get_note_handles(self):
         """
         Return a list of database handles, one handle for each Note in the
         database.
         """
-        cursor = self.db.note.find({})
-        return [doc["_id"] for doc in cursor]
+        return self._get_handles("note")
 
     def get_tag_handles(self, sort_handles=False, locale=glocale):
         """
@@ -440,23 +498,65 @@ class MongoDB(DbGeneric):
         :param locale: The locale to use for collation.
         :type locale: A GrampsLocale object.
         """
-        cursor = self.db.tag.find({}, {"_id": 1})
         if sort_handles:
-            cursor.sort("name", ASCENDING)
+            return self._get_sorted_handles("tag", ["name"], locale)
+        return self._get_handles("tag")
+
+    def _get_handles(self, table):
+        """
+        Return all the handles of a collection.
+        """
+        self._flush()
+        cursor = self.db[table].find({}, {"_id": 1},
+                                     batch_size=self.batch_size)
         return [doc["_id"] for doc in cursor]
 
+    def _get_sorted_handles(self, table, keys, locale):
+        """
+        Return the handles of a collection, sorted on the server by the
+        given keys with the collation of the locale.
+        """
+        self._flush()
+        def query(collation):
+            cursor = self.db[table].find({}, {"_id": 1},
+                                         collation=collation,
+                                         batch_size=self.batch_size,
+                                         allow_disk_use=True)
+            cursor.sort([(key, ASCENDING) for key in keys])
+            return [doc["_id"] for doc in cursor]
+        return self._collated(query, locale)
+
+    def _collated(self, query, locale):
+        """
+        Run a sorted query with the collation of the locale. If the server
+        does not support that language, remember it and sort with the
+        simple collation instead.
+        """
+        collation = locale_collation(locale)
+        try:
+            return query(collation)
+        except OperationFailure:
+            name = collation.document['locale']
+            if name == 'simple':
+                raise
+            LOG.warning("No MongoDB collation for '%s', using 'simple'", name)
+            UNSUPPORTED_COLLATIONS.add(name)
+            return query(Collation('simple'))
+
     def get_tag_from_name(self, name):
         """
         Find a Tag in the database from the passed Tag name.
 
         If no such Tag exists, None is returned.
         """
+        self._flush()
         doc = self.db.tag.find_one({"name": name})
         if doc:
             return doc_to_obj(doc)
         return None
 
     def _get_number_of(self, obj_key):
+        self._flush()
         table = KEY_TO_NAME_MAP[obj_key]
         total = self.db[table].find().count()
         return total
@@ -486,11 +586,17 @@ class MongoDB(DbGeneric):
         obj.change = int(change_time or time.time())
         table = KEY_TO_NAME_MAP[obj_key]
 
-        if self._has_handle(obj_key, obj.handle):
-            old_data = self._get_raw_data(obj_key, obj.handle)
-
         doc = obj_to_doc(obj)
-        self.db[table].replace_one({"_id": obj.handle}, doc, upsert=True)
+        if trans.batch and obj_key != PERSON_KEY:
+            # Nobody needs the old data, send it later in bulk
+            self._queue(table, obj.handle, doc)
+        else:
+            # commit_person needs the old data even in batch mode
+            old_doc = self.db[table].find_one_and_replace(
+                {"_id": obj.handle}, doc, upsert=True,
+                return_document=ReturnDocument.BEFORE)
+            if old_doc:
+                old_data = doc_to_obj(old_doc).serialize()
 
         if not trans.batch:
             self._update_backlinks(obj, trans)
@@ -505,6 +611,33 @@ class MongoDB(DbGeneric):
 
         return old_data
 
+    def _queue(self, table, handle, doc):
+        """
+        Queue a document to be written with the next bulk write. Only the
+        last version of a document is kept, so the writes can be unordered.
+        """
+        documents = self._pending.setdefault(table, {})
+        if handle not in documents:
+            self._pending_count += 1
+        documents[handle] = doc
+        if self._pending_count >= BULK_SIZE:
+            self._flush()
+
+    def _flush(self):
+        """
+        Write the queued documents, one unordered bulk write per collection.
+        Called before reading, so that reads see them.
+        """
+        if not self._pending_count:
+            return
+        pending, self._pending = self._pending, {}
+        self._pending_count = 0
+        for table, documents in pending.items():
+            self.db[table].bulk_write(
+                [ReplaceOne({"_id": handle}, doc, upsert=True)
+                 for handle, doc in documents.items()],
+                ordered=False)
+
     def _update_backlinks(self, obj, transaction):
 
         # Find existing references
@@ -520,15 +653,19 @@ class MongoDB(DbGeneric):
                                                             current_references)
         new_references = current_references.difference(existing_references)
 
-        # Delete the existing references
-        self.db.reference.delete_one({"obj_handle": obj.handle})
-
-        # Now, add the current ones
-        for (ref_class_name, ref_handle) in current_references:
-            self.db.reference.insert_one({"obj_handle": obj.handle,
-                                          "obj_class": obj.__class__.__name__,
-                                          "ref_handle": ref_handle,
-                                          "ref_class": ref_class_name})
+        # Write only the difference, in one round trip
+        requests = [DeleteMany({"obj_handle": obj.handle,
+                                "ref_handle": ref_handle,
+                                "ref_class": ref_class_name})
+                    for (ref_class_name, ref_handle)
+                    in no_longer_required_references]
+        requests += [InsertOne({"obj_handle": obj.handle,
+                                "obj_class": obj.__class__.__name__,
+                                "ref_handle": ref_handle,
+                                "ref_class": ref_class_name})
+                     for (ref_class_name, ref_handle) in new_references]
+        if requests:
+            self.db.reference.bulk_write(requests, ordered=False)
 
         if not transaction.batch:
             # Add new references to the transaction
@@ -562,15 +699,15 @@ class MongoDB(DbGeneric):
         Removes all references from this object (backlinks).
         """
         # collect backlinks from this object for undo
-        cursor = self.db.reference.find({"obj_handle": obj_handle})
+        docs = list(self.db.reference.find({"obj_handle": obj_handle}))
 
         # Now, delete backlinks from this object:
         self.db.reference.delete_many({"obj_handle": obj_handle})
 
         # Add old references to the transaction
         if not transaction.batch:
-            for doc in cursor:
-                ref_class_name = doc["ref_class_name"]
+            for doc in docs:
+                ref_class_name = doc["ref_class"]
                 ref_handle = doc["ref_handle"]
                 key = (obj_handle, ref_handle)
                 old_data = (obj_handle, obj_class, ref_handle, ref_class_name)
@@ -603,6 +740,7 @@ class MongoDB(DbGeneric):
         """
         Returns first person in the database
         """
+        self._flush()
         handle = self.get_default_handle()
         person = None
         if handle:
@@ -617,8 +755,10 @@ class MongoDB(DbGeneric):
         """
         Return an iterator over handles in the database
         """
+        self._flush()
         table = KEY_TO_NAME_MAP[obj_key]
-        cursor = self.db[table].find()
+        cursor = self.db[table].find({}, {"_id": 1},
+                                     batch_size=self.batch_size)
         for doc in cursor:
             yield doc["_id"]
 
@@ -626,8 +766,9 @@ class MongoDB(DbGeneric):
         """
         Return an iterator over raw data in the database.
         """
+        self._flush()
         table = KEY_TO_NAME_MAP[obj_key]
-        cursor = self.db[table].find()
+        cursor = self.db[table].find(batch_size=self.batch_size)
         for doc in cursor:
             obj = doc_to_obj(doc)
             yield (obj.handle, obj.serialize())
@@ -636,23 +777,37 @@ class MongoDB(DbGeneric):
         """
         Return an iterator over raw data in the place hierarchy.
         """
-        to_do = ['']
-        while to_do:
-            handle = to_do.pop()
-            if handle == '':
-                cursor = self.db.place.find({"placeref_list": {"$size": 0}})
-            else:
-                cursor = self.db.place.find({"placeref_list.0.ref": handle})
-            for doc in cursor:
-                to_do.append(doc["_id"])
-                obj = doc_to_obj(doc)
-                yield (obj.handle, obj.serialize())
+        self._flush()
+        # One aggregation: collect the ancestors of every place, keep the
+        # places that hang from a top level place, and sort them by depth
+        # so that every place comes after the place enclosing it.
+        pipeline = [
+            {"$graphLookup": {
+                "from": "place",
+                "startWith": "$placeref_list.ref",
+                "connectFromField": "placeref_list.ref",
+                "connectToField": "_id",
+                "as": "ancestors"}},
+            {"$match": {"$expr": {"$or": [
+                {"$eq": [{"$size": "$placeref_list"}, 0]},
+                {"$in": [[], "$ancestors.placeref_list"]}]}}},
+            {"$addFields": {"_depth": {"$size": "$ancestors"}}},
+            {"$project": {"ancestors": 0}},
+            {"$sort": {"_depth": ASCENDING}},
+        ]
+        cursor = self.db.place.aggregate(pipeline, allowDiskUse=True,
+                                         batchSize=self.batch_size)
+        for doc in cursor:
+            del doc["_depth"]
+            obj = doc_to_obj(doc)
+            yield (obj.handle, obj.serialize())
 
     def reindex_reference_map(self, callback):
         """
         Reindex all primary records in the database.
         """
         callback(4)
+        self._flush()
         self.db.reference.delete_many({})
         primary_table = (
             (self.get_person_cursor, Person),
@@ -668,6 +823,7 @@ class MongoDB(DbGeneric):
         )
         # Now we use the functions and classes defined above
         # to loop through each of the primary object tables.
+        docs = []
         for cursor_func, class_func in primary_table:
             logging.info("Rebuilding %s reference map", class_func.__name__)
             with cursor_func() as cursor:
@@ -675,12 +831,16 @@ class MongoDB(DbGeneric):
                     obj = class_func.create(val)
                     references = set(obj.get_referenced_handles_recursively())
                     # handle addition of new references
-                    for (ref_class_name, ref_handle) in references:
-                        self.db.reference.insert_one(
-                            {"obj_handle": obj.handle,
-                             "obj_class": obj.__class__.__name__,
-                             "ref_handle": ref_handle,
-                             "ref_class": ref_class_name})
+                    docs.extend({"obj_handle": obj.handle,
+                                 "obj_class": obj.__class__.__name__,
+                                 "ref_handle": ref_handle,
+                                 "ref_class": ref_class_name}
+                                for (ref_class_name, ref_handle) in references)
+                    if len(docs) >= BULK_SIZE:
+                        self.db.reference.insert_many(docs, ordered=False)
+                        docs = []
+        if docs:
+            self.db.reference.insert_many(docs, ordered=False)
         callback(5)
 
     def rebuild_secondary(self, update):
@@ -704,21 +864,25 @@ class MongoDB(DbGeneric):
         self.db.gender_stats.reindex()
 
     def _has_handle(self, obj_key, handle):
+        self._flush()
         table = KEY_TO_NAME_MAP[obj_key]
         doc = self.db[table].find_one({"_id": handle})
         return doc is not None
 
     def _has_gramps_id(self, obj_key, gramps_id):
+        self._flush()
         table = KEY_TO_NAME_MAP[obj_key]
         doc = self.db[table].find_one({"gramps_id": gramps_id})
         return doc is not None
 
     def _get_gramps_ids(self, obj_key):
+        self._flush()
         table = KEY_TO_NAME_MAP[obj_key]
         cursor = self.db[table].find()
         return [doc["gramps_id"] for doc in cursor]
 
     def _get_raw_data(self, obj_key, handle):
+        self._flush()
         table = KEY_TO_NAME_MAP[obj_key]
         doc = self.db[table].find_one({"_id": handle})
         if doc:
@@ -726,6 +890,7 @@ class MongoDB(DbGeneric):
             return obj.serialize()
 
     def _get_raw_from_id_data(self, obj_key, gramps_id):
+        self._flush()
         table = KEY_TO_NAME_MAP[obj_key]
         doc = self.db[table].find_one({"gramps_id": gramps_id})
         if doc:
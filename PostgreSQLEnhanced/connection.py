@@ -27,6 +27,7 @@ Provides advanced connection management including:
 import logging
 import os
 import re
+from collections import OrderedDict
 from urllib.parse import urlparse, parse_qs
 from contextlib import contextmanager
 
@@ -46,6 +47,112 @@ from psycopg import sql
 from gramps.gen.const import GRAMPS_LOCALE as glocale
 from gramps.gen.db.dbconst import ARRAYSIZE
 
+# -------------------------------------------------------------------------
+#
+# Constants
+#
+# -------------------------------------------------------------------------
+# Number of distinct statements whose translation is cached
+TRANSLATION_CACHE_SIZE = 1024
+
+# Executions after which a statement is prepared on the server
+PREPARE_THRESHOLD = 5
+
+# Number of prepared statements kept per server connection
+PREPARED_MAX = 256
+
+
+# -------------------------------------------------------------------------
+#
+# LRUCache class
+#
+# -------------------------------------------------------------------------
+class LRUCache:
+    """
+    Small bounded least-recently-used cache with hit/miss counters.
+    """
+
+    def __init__(self, maxsize):
+        """
+        Initialize the cache.
+
+        :param maxsize: Maximum number of entries kept
+        :type maxsize: int
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key):
+        """
+        Return the cached value for key, or None.
+
+        :param key: Cache key
+        :type key: hashable
+        :returns: Cached value or None
+        :rtype: object
+        """
+        value = self._data.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._data.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        """
+        Store a value, evicting the least recently used entry when full.
+
+        :param key: Cache key
+        :type key: hashable
+        :param value: Value to store
+        :type value: object
+        """
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def get_statistics(self):
+        """
+        Return the cache counters.
+
+        :returns: Dictionary with size, hits, misses and hit rate
+        :rtype: dict
+        """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+# -------------------------------------------------------------------------
+#
+# TranslatedQuery class
+#
+# -------------------------------------------------------------------------
+class TranslatedQuery:
+    """
+    Cached translation of one SQL statement.
+
+    Holds the PostgreSQL text of the statement, the positions of
+    arguments that must be converted to booleans, and how often the
+    statement has been executed.
+    """
+
+    __slots__ = ("sql", "bool_args", "executions")
+
+    def __init__(self, sql_text, bool_args):
+        self.sql = sql_text
+        self.bool_args = bool_args
+        self.executions = 0
+
 
 # -------------------------------------------------------------------------
 #
@@ -106,8 +213,14 @@ class PostgreSQLConnection:
         # Configure JSONB handling for Gramps compatibility
         self._setup_jsonb_handling()
 
-        # Track prepared statements
-        self._prepared_statements = {}
+        # Translation cache and server-side prepared statements
+        self._translations = LRUCache(TRANSLATION_CACHE_SIZE)
+        self._prepare_threshold = options.get("prepare_threshold", PREPARE_THRESHOLD)
+        self._prepared_executions = 0
+        if self._connection is not None:
+            # Preparation is driven by execute(), not by psycopg's own counter
+            self._connection.prepare_threshold = None
+            self._connection.prepared_max = PREPARED_MAX
 
         # Setup collation support
         self._collations = []
@@ -173,6 +286,18 @@ class PostgreSQLConnection:
                 conninfo += " password=%s" % password
             options["schema"] = "public"
 
+        # Numeric options arrive as strings from the URL query
+        for key in ("pool_size", "prepare_threshold"):
+            if isinstance(options.get(key), str):
+                value = options[key]
+                if value.isdigit():
+                    options[key] = int(value)
+                else:
+                    self.log.warning(
+                        "Ignoring non-numeric %s %r, using the default", key, value
+                    )
+                    del options[key]
+
         # Add any environment variables not already in conninfo
         self._add_environment_variables(conninfo)
 
@@ -315,38 +440,87 @@ class PostgreSQLConnection:
 
         return pg_collation
 
-    def _convert_args_for_postgres(self, query, args):
+    def _bool_arg_positions(self, query):
+        """
+        Find the arguments of an UPDATE that set the 'private' column.
+
+        SQLite stores booleans as integers, PostgreSQL needs real booleans
+        for the 'private' column.
+
+        :param query: Translated SQL statement
+        :type query: str
+        :returns: Positions of arguments to convert, or None
+        :rtype: tuple or None
+        """
+        lowered = query.lower()
+        if "private = " not in lowered:
+            return None
+
+        # Find position of 'private' in the SET clause
+        sets_part = lowered.split("set")[1].split("where")[0]
+        columns = [col.strip().split("=")[0].strip() for col in sets_part.split(",")]
+        positions = tuple(i for i, col in enumerate(columns) if col == "private")
+        return positions or None
+
+    def _convert_args_for_postgres(self, query, args, bool_args=None):
         """
         Convert SQLite-style arguments to PostgreSQL-compatible types.
 
         Specifically handles:
         - Integer to boolean conversion for 'private' column
         - Other type conversions as needed
+
+        :param query: Translated SQL statement
+        :type query: str
+        :param args: Statement arguments
+        :type args: list or tuple or None
+        :param bool_args: Precomputed positions of boolean arguments
+        :type bool_args: tuple or None
         """
         if not args:
             return args
 
-        # Check if this is an UPDATE statement with 'private' column
-        if "private = " in query.lower():
-            # Convert args to list for modification
-            converted_args = list(args)
+        if bool_args is None:
+            bool_args = self._bool_arg_positions(query)
+            if bool_args is None:
+                return args
 
-            # Find position of 'private' in the SET clause
-            sets_part = query.lower().split("set")[1].split("where")[0]
-            columns = [
-                col.strip().split("=")[0].strip() for col in sets_part.split(",")
-            ]
+        # Convert integer to boolean for 'private' column
+        converted_args = list(args)
+        for i in bool_args:
+            if i < len(converted_args) and isinstance(converted_args[i], int):
+                converted_args[i] = bool(converted_args[i])
+        return converted_args
+
+    def _get_translation(self, query):
+        """
+        Return the cached translation of a statement.
 
-            # Convert integer to boolean for 'private' column
-            for i, col in enumerate(columns):
-                if col == "private" and i < len(converted_args):
-                    val = converted_args[i]
-                    if isinstance(val, int):
-                        converted_args[i] = bool(val)
+        :param query: SQL statement as issued by DBAPI
+        :type query: str
+        :returns: Cached translation
+        :rtype: TranslatedQuery
+        """
+        entry = self._translations.get(query)
+        if entry is None:
+            pg_query = self._translate_query(query)
+            entry = TranslatedQuery(pg_query, self._bool_arg_positions(pg_query))
+            self._translations.put(query, entry)
+        return entry
 
-            return converted_args
+    def get_statistics(self):
+        """
+        Return statement cache and prepared statement counters.
 
-        return args
+        :returns: Dictionary of counters
+        :rtype: dict
+        """
+        stats = {"translation_cache": self._translations.get_statistics()}
+        stats["prepare_threshold"] = self._prepare_threshold
+        stats["prepared_executions"] = self._prepared_executions
+        if self._connection is not None:
+            stats["prepared_max"] = self._connection.prepared_max
+        return stats
 
     def execute(self, query, args=None):
         """
@@ -358,22 +532,44 @@ class PostgreSQLConnection:
         - Optimizing common queries
         - Converting data types for PostgreSQL
         - Handling GENERATED column UPDATE errors
-        """
-        # Translate query for PostgreSQL
-        pg_query = self._translate_query(query)
 
-        # Convert arguments for PostgreSQL compatibility
-        pg_args = self._convert_args_for_postgres(pg_query, args)
+        Translations are cached per statement text, and statements with
+        arguments that run often are prepared on the server.
+        """
+        prepare = None
+        if isinstance(query, str):
+            entry = self._get_translation(query)
+            entry.executions += 1
+            pg_query = entry.sql
+            pg_args = (
+                self._convert_args_for_postgres(pg_query, args, entry.bool_args)
+                if entry.bool_args
+                else args
+            )
+            if (
+                pg_args
+                and self._prepare_threshold
+                and entry.executions >= self._prepare_threshold
+            ):
+                prepare = True
+                self._prepared_executions += 1
+        else:
+            # Composed statements are built by callers and rarely repeated
+            pg_query = query
+            pg_args = args
 
-        self.log.debug("SQL: %s", pg_query)
-        if pg_args:
-            self.log.debug("Args: %s", pg_args)
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug("SQL: %s", pg_query)
+            if pg_args:
+                self.log.debug("Args: %s", pg_args)
 
         # Get a persistent cursor for DBAPI compatibility
         if not hasattr(self, "_persistent_cursor") or self._persistent_cursor is None or self._persistent_cursor.closed:
             if self._pool:
                 # For pools, get a connection from the pool
                 self._persistent_conn = self._pool.getconn()
+                self._persistent_conn.prepare_threshold = None
+                self._persistent_conn.prepared_max = PREPARED_MAX
                 self._persistent_cursor = self._persistent_conn.cursor()
             else:
                 self._persistent_cursor = self._connection.cursor()
@@ -382,7 +578,7 @@ class PostgreSQLConnection:
         cur = self._persistent_cursor
         try:
             if pg_args:
-                cur.execute(pg_query, pg_args)
+                cur.execute(pg_query, pg_args, prepare=prepare)
             else:
                 cur.execute(pg_query)
         except Exception as e:
@@ -422,7 +618,7 @@ class PostgreSQLConnection:
                 count = "ALL"
             query = re.sub(
                 r"LIMIT\s+\d+\s*,\s*-?\d+",
-                "LIMIT %s OFFSET {offset}" % count,
+                "LIMIT %s OFFSET %s" % (count, offset),
                 query,
                 flags=re.IGNORECASE,
             )
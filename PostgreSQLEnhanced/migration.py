@@ -23,9 +23,13 @@ Supports migration from:
 # Standard python modules
 #
 # -------------------------------------------------------------------------
+import json
 import logging
+import os
 import pickle
 import sqlite3
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
 # -------------------------------------------------------------------------
@@ -67,6 +71,81 @@ OBJECT_TYPES = [
 ]
 
 
+# Objects read from SQLite and converted per worker task
+CHUNK_SIZE = 2000
+
+# Metadata setting holding the progress of an interrupted migration
+CHECKPOINT_SETTING = "sqlite_migration_checkpoint"
+
+
+# -------------------------------------------------------------------------
+#
+# Conversion functions
+#
+# -------------------------------------------------------------------------
+def object_to_json(obj, obj_type):
+    """
+    Convert a Gramps object to JSON representation.
+
+    This is a simplified version - the real implementation
+    would use Gramps' built-in serialization.
+
+    :param obj: Gramps object to convert
+    :type obj: object
+    :param obj_type: Type of object
+    :type obj_type: str
+    :returns: JSON-compatible dictionary
+    :rtype: dict
+    """
+    # Get the serialized form
+    if hasattr(obj, "serialize"):
+        data = obj.serialize()
+    else:
+        data = obj
+
+    # Convert to dictionary
+    # This would need proper mapping for each object type
+    json_data = {
+        "handle": (data[0] if isinstance(data, (list, tuple)) else data.get("handle")),
+        "gramps_id": (
+            data[1]
+            if isinstance(data, (list, tuple)) and len(data) > 1
+            else data.get("gramps_id")
+        ),
+        "_class": obj_type,
+    }
+
+    # Add raw data for now
+    json_data["_raw"] = data
+
+    return json_data
+
+
+def _convert_chunk(obj_type, rows):
+    """
+    Unpickle a chunk of SQLite rows and convert them to JSON text.
+
+    Runs in a worker process, so it must stay a module level function.
+
+    :param obj_type: Type of the objects
+    :type obj_type: str
+    :param rows: List of (handle, blob_data) tuples
+    :type rows: list
+    :returns: Tuple of rows ready for COPY and (handle, error) failures
+    :rtype: tuple
+    """
+    converted = []
+    failures = []
+    for handle, blob_data in rows:
+        try:
+            obj = pickle.loads(blob_data)
+            json_data = json.dumps(object_to_json(obj, obj_type))
+            converted.append((handle, blob_data, json_data))
+        except Exception as e:  # pylint: disable=broad-except
+            failures.append((handle, str(e)))
+    return converted, failures
+
+
 # -------------------------------------------------------------------------
 #
 # MigrationManager class
@@ -131,14 +210,23 @@ class MigrationManager:
 
         return None
 
-    def migrate_from_sqlite(self, sqlite_path, callback=None):
+    def migrate_from_sqlite(self, sqlite_path, callback=None, workers=None):
         """
         Migrate data from a SQLite database.
 
+        Objects are streamed from SQLite in chunks, converted to JSON in a
+        pool of worker processes and loaded with COPY into a staging
+        table, which is then merged into the target table. Each object
+        type is committed on its own and recorded as a checkpoint, so an
+        interrupted migration of the same file resumes with the first
+        unfinished type.
+
         :param sqlite_path: Path to SQLite database file
         :type sqlite_path: str
         :param callback: Progress callback function(current, total, message)
         :type callback: callable or None
+        :param workers: Number of conversion processes, default CPU count
+        :type workers: int or None
         :returns: Dictionary with migration statistics
         :rtype: dict
         """
@@ -147,6 +235,7 @@ class MigrationManager:
         stats = {
             "start_time": datetime.now(),
             "objects_migrated": {},
+            "resumed": [],
             "errors": [],
             "warnings": [],
         }
@@ -158,64 +247,94 @@ class MigrationManager:
 
             # Calculate total objects
             total_objects = 0
+            counts = {}
             for obj_type in OBJECT_TYPES:
                 cursor = source.execute("SELECT COUNT(*) FROM %s" % obj_type)
-                count = cursor.fetchone()[0]
-                total_objects += count
+                counts[obj_type] = cursor.fetchone()[0]
+                total_objects += counts[obj_type]
                 stats["objects_migrated"][obj_type] = 0
 
+            completed = self._get_checkpoint(sqlite_path)
+
             if callback:
                 callback(0, total_objects, _("Starting migration..."))
 
-            # Begin transaction
-            self.conn.execute("BEGIN")
+            self.conn.execute(
+                """
+                CREATE TEMP TABLE IF NOT EXISTS migration_stage (
+                    handle VARCHAR(50),
+                    blob_data BYTEA,
+                    json_data JSONB
+                )
+            """
+            )
 
+            workers = workers or os.cpu_count() or 1
+            executor = ProcessPoolExecutor(max_workers=workers)
             try:
                 current = 0
 
                 # Migrate each object type
                 for obj_type in OBJECT_TYPES:
+                    if obj_type in completed:
+                        stats["resumed"].append(obj_type)
+                        current += counts[obj_type]
+                        continue
+
                     if callback:
                         callback(
                             current,
                             total_objects,
-                            _("Migrating %s objects..." % obj_type),
+                            _("Migrating %s objects...") % obj_type,
                         )
 
-                    count = self._migrate_object_type(source, obj_type)
+                    count = self._migrate_object_type(
+                        source,
+                        obj_type,
+                        executor,
+                        max_pending=workers * 2,
+                        current=current,
+                        total=total_objects,
+                        callback=callback,
+                    )
                     stats["objects_migrated"][obj_type] = count
-                    current += count
+                    current += counts[obj_type]
+
+                    completed.append(obj_type)
+                    self._set_checkpoint(sqlite_path, completed)
+                    self.conn.commit()
 
                     if callback:
                         callback(
                             current,
                             total_objects,
-                            _("Migrated %s {obj_type} objects" % count),
+                            _("Migrated %(count)s %(obj_type)s objects")
+                            % {"count": count, "obj_type": obj_type},
                         )
 
-                # Migrate metadata
-                self._migrate_metadata(source)
-
-                # Migrate references
-                self._migrate_references(source)
-
-                # Migrate additional tables
-                self._migrate_additional_tables(source)
+                # Migrate metadata, references and additional tables
+                if "reference" not in completed:
+                    self._migrate_metadata(source)
+                    self._migrate_references(source)
+                    self._migrate_additional_tables(source)
+                    completed.append("reference")
 
-                # Commit transaction
+                # Migration is complete, a rerun starts from scratch
+                self._set_checkpoint(sqlite_path, None)
                 self.conn.commit()
 
                 if callback:
                     callback(total_objects, total_objects, _("Migration completed!"))
 
             except Exception as e:
-                # Rollback on error
+                # Roll back the unfinished object type only
                 self.conn.rollback()
                 stats["errors"].append(str(e))
                 self.log.error("Migration failed: %s", e)
                 raise
 
             finally:
+                executor.shutdown(cancel_futures=True)
                 source.close()
 
         except Exception as e:
@@ -228,51 +347,156 @@ class MigrationManager:
 
         return stats
 
-    def _migrate_object_type(self, source, obj_type):
+    def _get_checkpoint(self, sqlite_path):
+        """
+        Get the object types already migrated from a SQLite database.
+
+        :param sqlite_path: Path to SQLite database file
+        :type sqlite_path: str
+        :returns: Names of completed object types
+        :rtype: list
+        """
+        self.conn.execute(
+            "SELECT value FROM metadata WHERE setting = %s", [CHECKPOINT_SETTING]
+        )
+        row = self.conn.fetchone()
+        if row and row[0]:
+            checkpoint = pickle.loads(row[0])
+            if checkpoint and checkpoint.get("source") == sqlite_path:
+                self.log.info(
+                    "Resuming migration, already done: %s",
+                    ", ".join(checkpoint["completed"]),
+                )
+                return list(checkpoint["completed"])
+        return []
+
+    def _set_checkpoint(self, sqlite_path, completed):
+        """
+        Record the object types migrated so far.
+
+        :param sqlite_path: Path to SQLite database file
+        :type sqlite_path: str
+        :param completed: Completed object types, or None to clear
+        :type completed: list or None
+        """
+        if completed is None:
+            self.conn.execute(
+                "DELETE FROM metadata WHERE setting = %s", [CHECKPOINT_SETTING]
+            )
+            return
+        self.conn.execute(
+            """
+            INSERT INTO metadata (setting, value)
+            VALUES (%s, %s)
+            ON CONFLICT (setting) DO UPDATE
+            SET value = EXCLUDED.value
+        """,
+            [
+                CHECKPOINT_SETTING,
+                pickle.dumps({"source": sqlite_path, "completed": completed}),
+            ],
+        )
+
+    def _read_chunks(self, source, obj_type):
+        """
+        Read all objects of a type from SQLite in chunks.
+
+        :param source: SQLite database connection
+        :type source: sqlite3.Connection
+        :param obj_type: Type of object to read
+        :type obj_type: str
+        :returns: Iterator over lists of (handle, blob_data) tuples
+        :rtype: iterator
+        """
+        cursor = source.execute("SELECT handle, blob_data FROM %s" % obj_type)
+        while True:
+            rows = cursor.fetchmany(CHUNK_SIZE)
+            if not rows:
+                return
+            yield [(row["handle"], row["blob_data"]) for row in rows]
+
+    def _migrate_object_type(
+        self,
+        source,
+        obj_type,
+        executor,
+        max_pending=2,
+        current=0,
+        total=0,
+        callback=None,
+    ):
         """
         Migrate all objects of a specific type.
 
+        Chunks are converted in the worker pool while earlier chunks are
+        copied into the staging table; at most ``max_pending`` chunks are
+        in flight at any time.
+
         :param source: SQLite database connection
         :type source: sqlite3.Connection
         :param obj_type: Type of object to migrate
         :type obj_type: str
+        :param executor: Pool running the conversion
+        :type executor: concurrent.futures.Executor
+        :param max_pending: Maximum number of chunks being converted
+        :type max_pending: int
+        :param current: Objects migrated before this type, for progress
+        :type current: int
+        :param total: Total number of objects, for progress
+        :type total: int
+        :param callback: Progress callback function(current, total, message)
+        :type callback: callable or None
         :returns: Number of objects migrated
         :rtype: int
         """
         count = 0
+        self.conn.execute("TRUNCATE migration_stage")
+
+        pending = deque()
+        chunks = self._read_chunks(source, obj_type)
+
+        with self.conn.cursor() as cur:
+            with cur.copy(
+                "COPY migration_stage (handle, blob_data, json_data) FROM STDIN"
+            ) as copy:
+                while True:
+                    while len(pending) < max_pending:
+                        chunk = next(chunks, None)
+                        if chunk is None:
+                            break
+                        pending.append(
+                            executor.submit(_convert_chunk, obj_type, chunk)
+                        )
+                    if not pending:
+                        break
 
-        # Get all objects from SQLite
-        cursor = source.execute("SELECT handle, blob_data FROM %s" % obj_type)
-
-        for row in cursor:
-            handle = row["handle"]
-            blob_data = row["blob_data"]
-
-            try:
-                # Deserialize to get JSON representation
-                obj = pickle.loads(blob_data)
-
-                # Convert to JSON
-                # Note: This is simplified - real implementation would
-                # need proper object-to-dict conversion
-                json_data = self._object_to_json(obj, obj_type)
-
-                # Insert into PostgreSQL
-                self.conn.execute(
-                    f"""
-                    INSERT INTO {obj_type} (handle, blob_data, json_data)
-                    VALUES (%s, %s, %s)
-                    ON CONFLICT (handle) DO UPDATE
-                    SET blob_data = EXCLUDED.blob_data,
-                        json_data = EXCLUDED.json_data
-                """,
-                    [handle, blob_data, Jsonb(json_data)],
-                )
+                    rows, failures = pending.popleft().result()
+                    for handle, error in failures:
+                        self.log.warning(
+                            "Error migrating %s %s: %s", obj_type, handle, error
+                        )
+                    for row in rows:
+                        copy.write_row(row)
+                    count += len(rows)
 
-                count += 1
+                    if callback:
+                        callback(
+                            current + count,
+                            total,
+                            _("Migrating %s objects...") % obj_type,
+                        )
 
-            except Exception as e:
-                self.log.warning("Error migrating %s %s: %s", obj_type, handle, e)
+        # Merge the staged rows into the real table
+        self.conn.execute(
+            f"""
+            INSERT INTO {obj_type} (handle, blob_data, json_data)
+            SELECT handle, blob_data, json_data FROM migration_stage
+            ON CONFLICT (handle) DO UPDATE
+            SET blob_data = EXCLUDED.blob_data,
+                json_data = EXCLUDED.json_data
+        """
+        )
+        self.conn.execute("TRUNCATE migration_stage")
 
         return count
 
@@ -280,9 +504,6 @@ class MigrationManager:
         """
         Convert a Gramps object to JSON representation.
 
-        This is a simplified version - the real implementation
-        would use Gramps' built-in serialization.
-
         :param obj: Gramps object to convert
         :type obj: object
         :param obj_type: Type of object
@@ -290,30 +511,7 @@ class MigrationManager:
         :returns: JSON-compatible dictionary
         :rtype: dict
         """
-        # Get the serialized form
-        if hasattr(obj, "serialize"):
-            data = obj.serialize()
-        else:
-            data = obj
-
-        # Convert to dictionary
-        # This would need proper mapping for each object type
-        json_data = {
-            "handle": (
-                data[0] if isinstance(data, (list, tuple)) else data.get("handle")
-            ),
-            "gramps_id": (
-                data[1]
-                if isinstance(data, (list, tuple)) and len(data) > 1
-                else data.get("gramps_id")
-            ),
-            "_class": obj_type,
-        }
-
-        # Add raw data for now
-        json_data["_raw"] = data
-
-        return json_data
+        return object_to_json(obj, obj_type)
 
     def _migrate_metadata(self, source):
         """Migrate metadata table."""
@@ -346,21 +544,40 @@ class MigrationManager:
         """
         )
 
-        for row in cursor:
-            self.conn.execute(
-                """
-                INSERT INTO reference
-                (obj_handle, obj_class, ref_handle, ref_class)
-                VALUES (%s, %s, %s, %s)
-                ON CONFLICT DO NOTHING
-            """,
-                [
-                    row["obj_handle"],
-                    row["obj_class"],
-                    row["ref_handle"],
-                    row["ref_class"],
-                ],
+        self.conn.execute(
+            """
+            CREATE TEMP TABLE IF NOT EXISTS migration_reference_stage (
+                obj_handle VARCHAR(50),
+                obj_class VARCHAR(50),
+                ref_handle VARCHAR(50),
+                ref_class VARCHAR(50)
             )
+        """
+        )
+        self.conn.execute("TRUNCATE migration_reference_stage")
+
+        with self.conn.cursor() as cur:
+            with cur.copy(
+                "COPY migration_reference_stage "
+                "(obj_handle, obj_class, ref_handle, ref_class) FROM STDIN"
+            ) as copy:
+                while True:
+                    rows = cursor.fetchmany(CHUNK_SIZE)
+                    if not rows:
+                        break
+                    for row in rows:
+                        copy.write_row(tuple(row))
+
+        self.conn.execute(
+            """
+            INSERT INTO reference
+            (obj_handle, obj_class, ref_handle, ref_class)
+            SELECT obj_handle, obj_class, ref_handle, ref_class
+            FROM migration_reference_stage
+            ON CONFLICT DO NOTHING
+        """
+        )
+        self.conn.execute("TRUNCATE migration_reference_stage")
 
     def _migrate_additional_tables(self, source):
         """Migrate additional tables like gender_stats, surname, etc."""
@@ -69,6 +69,20 @@ from gramps.gen.const import GRAMPS_LOCALE as glocale
 
 # from gramps.gen.db.dbconst import ARRAYSIZE  # Currently unused
 from gramps.plugins.db.dbapi.dbapi import DBAPI
+from gramps.gen.db.dbconst import (
+    CLASS_TO_KEY_MAP,
+    KEY_TO_NAME_MAP,
+    PERSON_KEY,
+    FAMILY_KEY,
+    EVENT_KEY,
+    PLACE_KEY,
+    SOURCE_KEY,
+    CITATION_KEY,
+    MEDIA_KEY,
+    REPOSITORY_KEY,
+    NOTE_KEY,
+    TAG_KEY,
+)
 from gramps.gen.db.exceptions import DbConnectionError
 from gramps.gen.lib.serialize import JSONSerializer
 
@@ -80,7 +94,7 @@ except ValueError:
 _ = _trans.gettext
 
 # Import local modules - use relative imports for addon modules
-from connection import PostgreSQLConnection
+from connection import PostgreSQLConnection, LRUCache, TRANSLATION_CACHE_SIZE
 from schema import PostgreSQLSchema
 from migration import MigrationManager
 from queries import EnhancedQueries
@@ -94,6 +108,12 @@ from schema_columns import REQUIRED_COLUMNS
 MIN_PSYCOPG_VERSION = (3, 1)
 MIN_POSTGRESQL_VERSION = 15
 
+# Rows kept in the identity map before it is flushed
+IDENTITY_MAP_SIZE = 100000
+
+# Handles fetched per round trip by the bulk getters
+BULK_FETCH_SIZE = 1000
+
 # Import debugging utilities
 try:
     from debug_utils import DebugContext
@@ -167,6 +187,7 @@ class PostgreSQLEnhanced(DBAPI):
         # Initialize components
         self.migration_manager = None
         self.enhanced_queries = None
+        self.schema_manager = None
         self._use_jsonb = True  # Default to using JSONB
 
         # Initialize attributes that are set in _initialize
@@ -181,6 +202,10 @@ class PostgreSQLEnhanced(DBAPI):
         self.undolog = None
         self.undodb = None
 
+        # JSON rows read in the open transaction or bulk fetch, keyed by
+        # (obj_key, handle); None when neither is in progress
+        self._identity_map = None
+
         # Initialize debug context if available
         self._debug_context = None
         if DEBUG_ENABLED and DEBUG_AVAILABLE:
@@ -394,6 +419,7 @@ class PostgreSQLEnhanced(DBAPI):
             table_prefix=getattr(self, "table_prefix", ""),
         )
         schema.check_and_init_schema()
+        self.schema_manager = schema
 
         # Initialize migration manager
         self.migration_manager = MigrationManager(self.dbapi)
@@ -662,6 +688,10 @@ class PostgreSQLEnhanced(DBAPI):
         :type obj: gramps.gen.lib.PrimaryObject
         """
         table = obj.__class__.__name__.lower()
+
+        # The row just changed, drop it from the identity map
+        self._forget((CLASS_TO_KEY_MAP[obj.__class__.__name__], obj.handle))
+
         # Use table prefix if in shared mode
         table_name = (
             f"{self.table_prefix}{table}" if hasattr(self, "table_prefix") else table
@@ -698,6 +728,10 @@ class PostgreSQLEnhanced(DBAPI):
                 """,
                     [obj.handle],
                 )
+        elif table == "family":
+            # Keep the materialized parent/child edges in step with the family
+            if self._use_jsonb and self.schema_manager:
+                self.schema_manager.refresh_family_edges(obj.handle)
         elif table == "place":
             # Handle enclosed_by if not in REQUIRED_COLUMNS
             if "enclosed_by" not in REQUIRED_COLUMNS.get("place", {}):
@@ -742,14 +776,21 @@ class PostgreSQLEnhanced(DBAPI):
         :type sqlite_path: str
         :param callback: Progress callback function
         :type callback: callable
-        :returns: True if migration successful
-        :rtype: bool
+        :returns: Dictionary with migration statistics
+        :rtype: dict
         :raises RuntimeError: If migration manager not initialized
         """
         if not self.migration_manager:
             raise RuntimeError(_("Migration manager not initialized"))
 
-        return self.migration_manager.migrate_from_sqlite(sqlite_path, callback)
+        stats = self.migration_manager.migrate_from_sqlite(sqlite_path, callback)
+
+        # Families were copied without going through the commit path
+        if self._use_jsonb and self.schema_manager:
+            self.schema_manager.refresh_family_edges()
+            self.dbapi.commit()
+
+        return stats
 
     def migrate_from_postgresql(self, callback=None):
         """
@@ -801,19 +842,40 @@ class PostgreSQLEnhanced(DBAPI):
             raise RuntimeError(_("Enhanced queries require JSONB support"))
         return self.enhanced_queries.find_relationship_path(handle1, handle2, max_depth)
 
-    def search_all_text(self, search_term):
+    def search_all_text(self, search_term, limit=100, after=None):
         """
         Full-text search across all text fields.
 
         :param search_term: Text to search for
         :type search_term: str
-        :returns: Dictionary of search results by object type
-        :rtype: dict
+        :param limit: Maximum results to return
+        :type limit: int
+        :param after: Last row of the previous page, for keyset pagination
+        :type after: tuple or None
+        :returns: List of (object_type, handle, gramps_id, context, rank)
+                  tuples, best match first
+        :rtype: list
+        :raises RuntimeError: If enhanced queries not available
+        """
+        if not self.enhanced_queries:
+            raise RuntimeError(_("Enhanced queries require JSONB support"))
+        return self.enhanced_queries.search_all_text(search_term, limit, after)
+
+    def iter_potential_duplicates(self, threshold=0.8, year_range=10):
+        """
+        Find potential duplicate persons, yielding batches of pairs.
+
+        :param threshold: Name similarity threshold (0.0 to 1.0)
+        :type threshold: float
+        :param year_range: Maximum difference between known birth years
+        :type year_range: int
+        :returns: Iterator over lists of candidate pairs
+        :rtype: iterator
         :raises RuntimeError: If enhanced queries not available
         """
         if not self.enhanced_queries:
             raise RuntimeError(_("Enhanced queries require JSONB support"))
-        return self.enhanced_queries.search_all_text(search_term)
+        return self.enhanced_queries.iter_potential_duplicates(threshold, year_range)
 
     def get_statistics(self):
         """
@@ -831,6 +893,9 @@ class PostgreSQLEnhanced(DBAPI):
         if self.enhanced_queries:
             stats.update(self.enhanced_queries.get_statistics())
 
+        if self.dbapi:
+            stats["statement_cache"] = self.dbapi.get_statistics()
+
         return stats
 
     def commit_person(self, person, trans, change_time=None):
@@ -1048,6 +1113,329 @@ class PostgreSQLEnhanced(DBAPI):
         except Exception:
             return None
 
+    def _get_raw_data(self, obj_key, handle):
+        """
+        Return raw data for a handle, using the identity map.
+
+        Inside a transaction or a bulk fetch, the JSON text of every row
+        read is kept until it ends, so repeated lookups of the same object
+        do not go back to the server. Other reads always query the server,
+        so changes made by other clients are seen. Fresh data is decoded
+        on every call, so callers may modify the result freely.
+
+        :param obj_key: Object type key (PERSON_KEY, FAMILY_KEY, ...)
+        :type obj_key: int
+        :param handle: Handle of the object
+        :type handle: str
+        :returns: Raw object data or None if not found
+        :rtype: dict or None
+        """
+        if not self._use_jsonb:
+            return super()._get_raw_data(obj_key, handle)
+
+        key = (obj_key, handle)
+        if self._identity_map is not None and key in self._identity_map:
+            json_data = self._identity_map[key]
+        else:
+            table = KEY_TO_NAME_MAP[obj_key]
+            self.dbapi.execute(
+                f"SELECT json_data FROM {table} WHERE handle = %s", [handle]
+            )
+            row = self.dbapi.fetchone()
+            if not row:
+                # Misses are not remembered, another client may add it
+                return None
+            json_data = row[0]
+            self._remember(key, json_data)
+        return self.serializer.string_to_data(json_data)
+
+    def _remember(self, key, json_data):
+        """
+        Add a row to the identity map, if one is in use, flushing it when
+        it is full.
+
+        :param key: (obj_key, handle) tuple
+        :type key: tuple
+        :param json_data: JSON text of the row
+        :type json_data: str
+        """
+        if self._identity_map is None:
+            return
+        if len(self._identity_map) >= IDENTITY_MAP_SIZE:
+            self._identity_map.clear()
+        self._identity_map[key] = json_data
+
+    def _forget(self, key):
+        """
+        Drop a row from the identity map, if one is in use.
+
+        :param key: (obj_key, handle) tuple
+        :type key: tuple
+        """
+        if self._identity_map is not None:
+            self._identity_map.pop(key, None)
+
+    def _prefetch(self, obj_key, handles):
+        """
+        Load the rows of several handles into the identity map.
+
+        Handles not in the map yet are fetched with ``handle = ANY(...)``,
+        ``BULK_FETCH_SIZE`` at a time. Handles that are not found are left
+        out of the map.
+
+        :param obj_key: Object type key (PERSON_KEY, FAMILY_KEY, ...)
+        :type obj_key: int
+        :param handles: Handles to load
+        :type handles: iterable
+        """
+        if not self._use_jsonb:
+            return
+
+        missing = list(
+            dict.fromkeys(
+                handle
+                for handle in handles
+                if handle and (obj_key, handle) not in self._identity_map
+            )
+        )
+        table = KEY_TO_NAME_MAP[obj_key]
+        for start in range(0, len(missing), BULK_FETCH_SIZE):
+            chunk = missing[start : start + BULK_FETCH_SIZE]
+            self.dbapi.execute(
+                f"SELECT handle, json_data FROM {table} WHERE handle = ANY(%s)",
+                [chunk],
+            )
+            for handle, json_data in self.dbapi.fetchall():
+                self._remember((obj_key, handle), json_data)
+
+    def _get_from_handles(self, obj_key, get_from_handle, handles):
+        """
+        Return the objects for a list of handles in a few round trips.
+
+        Outside a transaction, an identity map is used for the duration
+        of the call only.
+
+        :param obj_key: Object type key (PERSON_KEY, FAMILY_KEY, ...)
+        :type obj_key: int
+        :param get_from_handle: Single object getter for this type
+        :type get_from_handle: callable
+        :param handles: Handles of the objects
+        :type handles: list
+        :returns: Objects in the order of handles, None where not found
+        :rtype: list
+        """
+        handles = list(handles)
+        if self._identity_map is not None:
+            self._prefetch(obj_key, handles)
+            return [get_from_handle(handle) for handle in handles]
+        self._identity_map = {}
+        try:
+            self._prefetch(obj_key, handles)
+            return [get_from_handle(handle) for handle in handles]
+        finally:
+            self._identity_map = None
+
+    def get_people_from_handles(self, handles):
+        """
+        Return the people with the given handles.
+
+        :param handles: Handles of the people
+        :type handles: list
+        :returns: Person objects in order, None where not found
+        :rtype: list
+        """
+        return self._get_from_handles(
+            PERSON_KEY, self.get_person_from_handle, handles
+        )
+
+    def get_families_from_handles(self, handles):
+        """
+        Return the families with the given handles.
+
+        :param handles: Handles of the families
+        :type handles: list
+        :returns: Family objects in order, None where not found
+        :rtype: list
+        """
+        return self._get_from_handles(
+            FAMILY_KEY, self.get_family_from_handle, handles
+        )
+
+    def get_events_from_handles(self, handles):
+        """
+        Return the events with the given handles.
+
+        :param handles: Handles of the events
+        :type handles: list
+        :returns: Event objects in order, None where not found
+        :rtype: list
+        """
+        return self._get_from_handles(EVENT_KEY, self.get_event_from_handle, handles)
+
+    def get_places_from_handles(self, handles):
+        """
+        Return the places with the given handles.
+
+        :param handles: Handles of the places
+        :type handles: list
+        :returns: Place objects in order, None where not found
+        :rtype: list
+        """
+        return self._get_from_handles(PLACE_KEY, self.get_place_from_handle, handles)
+
+    def get_sources_from_handles(self, handles):
+        """
+        Return the sources with the given handles.
+
+        :param handles: Handles of the sources
+        :type handles: list
+        :returns: Source objects in order, None where not found
+        :rtype: list
+        """
+        return self._get_from_handles(
+            SOURCE_KEY, self.get_source_from_handle, handles
+        )
+
+    def get_citations_from_handles(self, handles):
+        """
+        Return the citations with the given handles.
+
+        :param handles: Handles of the citations
+        :type handles: list
+        :returns: Citation objects in order, None where not found
+        :rtype: list
+        """
+        return self._get_from_handles(
+            CITATION_KEY, self.get_citation_from_handle, handles
+        )
+
+    def get_media_from_handles(self, handles):
+        """
+        Return the media objects with the given handles.
+
+        :param handles: Handles of the media objects
+        :type handles: list
+        :returns: Media objects in order, None where not found
+        :rtype: list
+        """
+        return self._get_from_handles(MEDIA_KEY, self.get_media_from_handle, handles)
+
+    def get_repositories_from_handles(self, handles):
+        """
+        Return the repositories with the given handles.
+
+        :param handles: Handles of the repositories
+        :type handles: list
+        :returns: Repository objects in order, None where not found
+        :rtype: list
+        """
+        return self._get_from_handles(
+            REPOSITORY_KEY, self.get_repository_from_handle, handles
+        )
+
+    def get_notes_from_handles(self, handles):
+        """
+        Return the notes with the given handles.
+
+        :param handles: Handles of the notes
+        :type handles: list
+        :returns: Note objects in order, None where not found
+        :rtype: list
+        """
+        return self._get_from_handles(NOTE_KEY, self.get_note_from_handle, handles)
+
+    def get_tags_from_handles(self, handles):
+        """
+        Return the tags with the given handles.
+
+        :param handles: Handles of the tags
+        :type handles: list
+        :returns: Tag objects in order, None where not found
+        :rtype: list
+        """
+        return self._get_from_handles(TAG_KEY, self.get_tag_from_handle, handles)
+
+    def clear_cache(self):
+        """Forget all rows held in the identity map."""
+        if self._identity_map is not None:
+            self._identity_map.clear()
+
+    def _do_remove(self, handle, transaction, obj_key):
+        """
+        Remove an object, dropping it from the identity map.
+
+        :param handle: Handle of the object to remove
+        :type handle: str
+        :param transaction: Transaction object
+        :type transaction: DbTxn
+        :param obj_key: Object type key (PERSON_KEY, FAMILY_KEY, ...)
+        :type obj_key: int
+        """
+        self._forget((obj_key, handle))
+        super()._do_remove(handle, transaction, obj_key)
+
+    def transaction_begin(self, txn):
+        """
+        Begin a transaction with an empty identity map.
+
+        :param txn: Transaction object
+        :type txn: DbTxn
+        """
+        self._identity_map = {}
+        super().transaction_begin(txn)
+
+    def transaction_commit(self, txn):
+        """
+        Commit a transaction and drop the identity map.
+
+        :param txn: Transaction object
+        :type txn: DbTxn
+        """
+        try:
+            super().transaction_commit(txn)
+        finally:
+            self._identity_map = None
+
+    def transaction_abort(self, txn):
+        """
+        Abort a transaction and drop the identity map.
+
+        :param txn: Transaction object
+        :type txn: DbTxn
+        """
+        try:
+            super().transaction_abort(txn)
+        finally:
+            self._identity_map = None
+
+    def undo(self, update_history=True):
+        """
+        Undo the last transaction and invalidate the identity map.
+
+        :param update_history: Whether to update the history
+        :type update_history: bool
+        :returns: Whether the undo succeeded
+        :rtype: bool
+        """
+        try:
+            return super().undo(update_history)
+        finally:
+            self.clear_cache()
+
+    def redo(self, update_history=True):
+        """
+        Redo the last undone transaction and invalidate the identity map.
+
+        :param update_history: Whether to update the history
+        :type update_history: bool
+        :returns: Whether the redo succeeded
+        :rtype: bool
+        """
+        try:
+            return super().redo(update_history)
+        finally:
+            self.clear_cache()
+
     def _order_by_person_key(self, person):
         """
         Override to handle NULL names properly.
@@ -1196,6 +1584,7 @@ class TablePrefixWrapper:
         "metadata",
         "reference",
         "gender_stats",
+        "family_edge",
     }
 
     # Tables that are shared (no prefix)
@@ -1205,11 +1594,18 @@ class TablePrefixWrapper:
         """Initialize wrapper with connection and prefix."""
         self._connection = connection
         self._prefix = table_prefix
+        self._prefixed = LRUCache(TRANSLATION_CACHE_SIZE)
 
     def execute(self, query, params=None):
         """Execute query with table prefixes added."""
         # Add prefixes to table names in the query
-        modified_query = self._add_table_prefixes(query)
+        if isinstance(query, str):
+            modified_query = self._prefixed.get(query)
+            if modified_query is None:
+                modified_query = self._add_table_prefixes(query)
+                self._prefixed.put(query, modified_query)
+        else:
+            modified_query = query
 
         # Log for debugging
         if query != modified_query:
@@ -1217,6 +1613,12 @@ class TablePrefixWrapper:
 
         return self._connection.execute(modified_query, params)
 
+    def get_statistics(self):
+        """Return statement cache counters, including table prefixing."""
+        stats = self._connection.get_statistics()
+        stats["prefix_cache"] = self._prefixed.get_statistics()
+        return stats
+
     def cursor(self):
         """Return a wrapped cursor that prefixes queries."""
         # NO FALLBACK: Must wrap cursor to catch ALL queries
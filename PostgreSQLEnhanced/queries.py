@@ -22,6 +22,7 @@ with blob-only storage.
 #
 # -------------------------------------------------------------------------
 import logging
+import re
 from collections import defaultdict
 
 # -------------------------------------------------------------------------
@@ -45,6 +46,40 @@ except ValueError:
     _trans = glocale.translation
 _ = _trans.gettext
 
+# -------------------------------------------------------------------------
+#
+# Local modules
+#
+# -------------------------------------------------------------------------
+from schema import SEARCH_CONFIG
+
+# -------------------------------------------------------------------------
+#
+# Constants
+#
+# -------------------------------------------------------------------------
+# People scanned per duplicate detection batch
+DUPLICATE_BATCH_SIZE = 500
+
+# Year of a person's birth event, or NULL when unknown
+BIRTH_YEAR_SQL = """
+    SELECT NULLIF((e.json_data->'date'->'dateval'->>2)::INTEGER, 0)
+           as birth_year
+    FROM event e
+    WHERE %(p)s.birth_ref_index >= 0
+    AND e.handle = %(p)s.json_data->'event_ref_list'
+                   ->%(p)s.birth_ref_index->>'ref'
+"""
+
+# Short description shown with each search hit, per object type
+SEARCH_CONTEXTS = {
+    "person": "COALESCE(given_name, '') || ' ' || COALESCE(surname, '')",
+    "event": "description",
+    "place": "title",
+    "source": "title",
+    "note": "substring(json_data->'text'->>'string', 1, 200)",
+}
+
 
 # -------------------------------------------------------------------------
 #
@@ -68,12 +103,14 @@ class EnhancedQueries:
         """
         self.conn = connection
         self.log = logging.getLogger(".PostgreSQLEnhanced.Queries")
+        self._trgm_available = None
 
     def find_common_ancestors(self, handle1, handle2, max_generations=20):
         """
         Find common ancestors between two people.
 
-        Uses recursive CTEs to traverse ancestry efficiently.
+        Walks the family_edge table upwards from both people with
+        recursive CTEs; every step is an index lookup on child_handle.
 
         :param handle1: First person's handle
         :type handle1: str
@@ -81,71 +118,90 @@ class EnhancedQueries:
         :type handle2: str
         :param max_generations: Maximum generations to search
         :type max_generations: int
-        :returns: List of (ancestor_handle, gen1, gen2) tuples
+        :returns: List of (ancestor_handle, gen1, gen2, gramps_id,
+                  first_name, surname) tuples
         :rtype: list
         """
         query = """
         WITH RECURSIVE
         -- Ancestors of person 1
-        ancestors1 AS (
-            SELECT handle, 0 as generation
-            FROM person WHERE handle = %s
+        ancestors1(handle, generation) AS (
+            SELECT %s::VARCHAR, 0
 
-            UNION ALL
+            UNION
 
-            SELECT DISTINCT p.handle, a.generation + 1
+            SELECT e.parent_handle, a.generation + 1
             FROM ancestors1 a
-            JOIN person p ON p.handle IN (
-                SELECT parent_handle
-                FROM family f, jsonb_array_elements_text(f.json_data->'child_ref_list') child
-                WHERE child = a.handle
-                AND parent_handle IN (
-                    SELECT jsonb_array_elements_text(f.json_data->'parent_handles')
-                )
-            )
+            JOIN family_edge e ON e.child_handle = a.handle
             WHERE a.generation < %s
         ),
         -- Ancestors of person 2
-        ancestors2 AS (
-            SELECT handle, 0 as generation
-            FROM person WHERE handle = %s
+        ancestors2(handle, generation) AS (
+            SELECT %s::VARCHAR, 0
 
-            UNION ALL
+            UNION
 
-            SELECT DISTINCT p.handle, a.generation + 1
+            SELECT e.parent_handle, a.generation + 1
             FROM ancestors2 a
-            JOIN person p ON p.handle IN (
-                SELECT parent_handle
-                FROM family f, jsonb_array_elements_text(f.json_data->'child_ref_list') child
-                WHERE child = a.handle
-                AND parent_handle IN (
-                    SELECT jsonb_array_elements_text(f.json_data->'parent_handles')
-                )
-            )
+            JOIN family_edge e ON e.child_handle = a.handle
             WHERE a.generation < %s
+        ),
+        -- Closest generation at which each ancestor is reached
+        common AS (
+            SELECT a1.handle,
+                   MIN(a1.generation) AS gen_from_person1,
+                   MIN(a2.generation) AS gen_from_person2
+            FROM ancestors1 a1
+            JOIN ancestors2 a2 ON a1.handle = a2.handle
+            GROUP BY a1.handle
         )
         -- Find common ancestors
         SELECT
-            a1.handle,
-            a1.generation as gen_from_person1,
-            a2.generation as gen_from_person2,
-            p.json_data->>'gramps_id' as gramps_id,
-            p.json_data->'names'->0->>'first_name' as first_name,
-            p.json_data->'names'->0->>'surname' as surname
-        FROM ancestors1 a1
-        JOIN ancestors2 a2 ON a1.handle = a2.handle
-        JOIN person p ON p.handle = a1.handle
-        ORDER BY a1.generation + a2.generation, a1.handle
+            c.handle,
+            c.gen_from_person1,
+            c.gen_from_person2,
+            p.gramps_id,
+            p.given_name as first_name,
+            p.surname
+        FROM common c
+        JOIN person p ON p.handle = c.handle
+        ORDER BY c.gen_from_person1 + c.gen_from_person2, c.handle
         """
 
         self.conn.execute(query, [handle1, max_generations, handle2, max_generations])
         return self.conn.fetchall()
 
+    def _get_neighbours(self, handles):
+        """
+        Get parents and children of a set of people in one query.
+
+        :param handles: Person handles to expand
+        :type handles: list
+        :returns: List of (handle, neighbour_handle) tuples
+        :rtype: list
+        """
+        self.conn.execute(
+            """
+            SELECT child_handle, parent_handle
+            FROM family_edge
+            WHERE child_handle = ANY(%s)
+            UNION
+            SELECT parent_handle, child_handle
+            FROM family_edge
+            WHERE parent_handle = ANY(%s)
+        """,
+            [handles, handles],
+        )
+        return self.conn.fetchall()
+
     def find_relationship_path(self, handle1, handle2, max_depth=15):
         """
         Find the shortest relationship path between two people.
 
-        Uses bidirectional search with PostgreSQL graph traversal.
+        Runs a level-synchronous bidirectional breadth-first search over
+        the family_edge table. Each level is expanded with a single
+        indexed query, and the side with the smaller frontier is
+        expanded first.
 
         :param handle1: Start person's handle
         :type handle1: str
@@ -156,120 +212,144 @@ class EnhancedQueries:
         :returns: List of handles forming the path, or None
         :rtype: list or None
         """
-        # This is a simplified version - a full implementation would
-        # use more sophisticated graph algorithms
-
-        query = """
-        WITH RECURSIVE relationship_graph AS (
-            -- Start from person 1
-            SELECT
-                handle,
-                ARRAY[handle] as path,
-                0 as depth,
-                false as found
-            FROM person
-            WHERE handle = %s
-
-            UNION ALL
-
-            SELECT DISTINCT
-                CASE
-                    WHEN f.json_data->'parent_handles' ? r.handle THEN child
-                    ELSE parent
-                END as handle,
-                r.path || CASE
-                    WHEN f.json_data->'parent_handles' ? r.handle THEN child
-                    ELSE parent
-                END as path,
-                r.depth + 1,
-                CASE
-                    WHEN f.json_data->'parent_handles' ? r.handle THEN child = %s
-                    ELSE parent = %s
-                END as found
-            FROM relationship_graph r
-            JOIN family f ON (
-                f.json_data->'parent_handles' ? r.handle OR
-                f.json_data->'child_ref_list' ? r.handle
-            ),
-            LATERAL (
-                SELECT jsonb_array_elements_text(f.json_data->'parent_handles') as parent
-            ) parents,
-            LATERAL (
-                SELECT jsonb_array_elements_text(f.json_data->'child_ref_list') as child
-            ) children
-            WHERE r.depth < %s
-            AND NOT r.found
-            AND NOT (r.path @> ARRAY[CASE
-                WHEN f.json_data->'parent_handles' ? r.handle THEN child
-                ELSE parent
-            END])
-        )
-        SELECT path
-        FROM relationship_graph
-        WHERE found = true
-        ORDER BY depth
-        LIMIT 1
-        """
-
-        self.conn.execute(query, [handle1, handle2, handle2, max_depth])
-        result = self.conn.fetchone()
-        return result[0] if result else None
-
-    def search_all_text(self, search_term, limit=100):
+        if handle1 == handle2:
+            return [handle1]
+
+        # Parent pointers towards handle1 and handle2 respectively
+        parents1 = {handle1: None}
+        parents2 = {handle2: None}
+        frontier1 = [handle1]
+        frontier2 = [handle2]
+        depth = 0
+        meet = None
+
+        while frontier1 and frontier2 and depth < max_depth and meet is None:
+            if len(frontier1) <= len(frontier2):
+                frontier, seen, other = frontier1, parents1, parents2
+            else:
+                frontier, seen, other = frontier2, parents2, parents1
+
+            next_frontier = []
+            for handle, neighbour in self._get_neighbours(frontier):
+                if neighbour in seen:
+                    continue
+                seen[neighbour] = handle
+                if neighbour in other:
+                    meet = neighbour
+                    break
+                next_frontier.append(neighbour)
+
+            if seen is parents1:
+                frontier1 = next_frontier
+            else:
+                frontier2 = next_frontier
+            depth += 1
+
+        if meet is None:
+            return None
+
+        path = []
+        handle = meet
+        while handle is not None:
+            path.append(handle)
+            handle = parents1[handle]
+        path.reverse()
+        handle = parents2[meet]
+        while handle is not None:
+            path.append(handle)
+            handle = parents2[handle]
+        return path
+
+    def search_all_text(self, search_term, limit=100, after=None):
         """
         Full-text search across all text fields in the database.
 
         Searches in:
         - Person names and attributes
         - Event descriptions
-        - Place names
-        - Source titles and text
+        - Place titles and names
+        - Source titles, authors and publication info
         - All notes
 
+        Every word of the search term is matched as a prefix against the
+        ``search_tsv`` columns. When the pg_trgm extension is available,
+        rows whose text contains the term as a substring also match.
+        Results from all object types are ranked together, best first.
+
+        For the next page, pass the last row of the previous page as
+        ``after``; only its rank, object type and handle are used.
+
         :param search_term: Text to search for
         :param limit: Maximum results to return
-        :return: List of (object_type, handle, context) tuples
-        """
-        results = []
-
-        # Search in person names
-        query = """
-        SELECT 'person' as obj_type, handle,
-               json_data->>'gramps_id' as gramps_id,
-               jsonb_pretty(json_data->'names') as context
-        FROM person
-        WHERE json_data::text ILIKE %s
-        LIMIT %s
+        :param after: Last row of the previous page, or None
+        :return: List of (object_type, handle, gramps_id, context, rank)
+                 tuples
         """
-        search_pattern = "%%s%" % search_term
-        self.conn.execute(query, [search_pattern, limit])
-        results.extend(self.conn.fetchall())
+        words = re.findall(r"\w+", search_term)
+        if not words:
+            return []
+        tsquery = " & ".join("%s:*" % word for word in words)
+        pattern = "%%%s%%" % (
+            search_term.replace("\\", "\\\\")
+            .replace("%", "\\%")
+            .replace("_", "\\_")
+        )
+        use_trgm = self._has_trigram()
+
+        # Results are ordered by (-rank, obj_type, handle) ascending, which
+        # doubles as the keyset for pagination. Sort keys are kept ascending
+        # because the connection rewrites most uses of the word DESC.
+        branches = []
+        args = []
+        for obj_type, context in SEARCH_CONTEXTS.items():
+            match = "search_tsv @@ q.query"
+            if use_trgm:
+                match = "(%s OR search_text ILIKE %%s)" % match
+                args.append(pattern)
+            keyset = ""
+            if after is not None:
+                keyset = (
+                    "AND (-ts_rank_cd(search_tsv, q.query)::FLOAT8, "
+                    "'%s'::TEXT, handle) > (-%%s::FLOAT8, %%s, %%s)" % obj_type
+                )
+                args.extend([after[4], after[0], after[1]])
+            branches.append(
+                f"""
+                (SELECT '{obj_type}'::TEXT as obj_type, handle,
+                        gramps_id,
+                        {context} as context,
+                        ts_rank_cd(search_tsv, q.query)::FLOAT8 as rank
+                 FROM {obj_type}, q
+                 WHERE {match}
+                 {keyset}
+                 ORDER BY -ts_rank_cd(search_tsv, q.query)::FLOAT8, handle
+                 LIMIT %s)
+                """
+            )
+            args.append(limit)
 
-        # Search in notes
         query = """
-        SELECT 'note' as obj_type, handle,
-               json_data->>'gramps_id' as gramps_id,
-               substring(json_data->>'text', 1, 200) as context
-        FROM note
-        WHERE json_data->>'text' ILIKE %s
-        LIMIT %s
-        """
-        self.conn.execute(query, [search_pattern, limit - len(results)])
-        results.extend(self.conn.fetchall())
+        WITH q AS (SELECT to_tsquery('%s', %%s) as query)
+        SELECT obj_type, handle, gramps_id, context, rank
+        FROM (%s) results
+        ORDER BY -rank, obj_type, handle
+        LIMIT %%s
+        """ % (
+            SEARCH_CONFIG,
+            " UNION ALL ".join(branches),
+        )
 
-        # Search in events
-        query = """
-        SELECT 'event' as obj_type, handle,
-               json_data->>'gramps_id' as gramps_id,
-               json_data->>'description' as context
-        FROM event
-        WHERE json_data->>'description' ILIKE %s
-        LIMIT %s
-        """
-        self.conn.execute(query, [search_pattern, limit - len(results)])
-        results.extend(self.conn.fetchall())
+        self.conn.execute(query, [tsquery] + args + [limit])
+        return self.conn.fetchall()
 
-        return results[:limit]
+    def _has_trigram(self):
+        """Check whether pg_trgm is installed, caching the answer."""
+        if self._trgm_available is None:
+            self.conn.execute(
+                "SELECT COUNT(*) FROM pg_extension WHERE extname = 'pg_trgm'"
+            )
+            self._trgm_available = self.conn.fetchone()[0] > 0
+        return self._trgm_available
 
     def get_descendants_tree(self, person_handle, max_depth=None):
         """
@@ -286,112 +366,161 @@ class EnhancedQueries:
         WITH RECURSIVE descendants AS (
             -- Root person
             SELECT
-                p.handle,
-                p.json_data,
+                %s::VARCHAR as handle,
+                NULL::VARCHAR as parent_handle,
                 0 as generation,
-                ARRAY[p.handle] as path
-            FROM person p
-            WHERE p.handle = %s
+                ARRAY[%s::VARCHAR] as path
 
             UNION ALL
 
             -- Children
             SELECT
-                p.handle,
-                p.json_data,
+                e.child_handle,
+                d.handle,
                 d.generation + 1,
-                d.path || p.handle
+                d.path || e.child_handle
             FROM descendants d
-            JOIN family f ON f.json_data->'parent_handles' ? d.handle
-            JOIN person p ON p.handle IN (
-                SELECT jsonb_array_elements_text(f.json_data->'child_ref_list')
-            )
+            JOIN family_edge e ON e.parent_handle = d.handle
             WHERE d.generation < %s
+            AND NOT e.child_handle = ANY(d.path)
         )
-        SELECT
-            handle,
-            generation,
-            path,
-            json_data->>'gramps_id' as gramps_id,
-            json_data->'names'->0->>'first_name' as first_name,
-            json_data->'names'->0->>'surname' as surname,
-            json_data->'birth_ref_index'->>'date' as birth_date,
-            json_data->'death_ref_index'->>'date' as death_date
-        FROM descendants
-        ORDER BY generation, path
+        SELECT DISTINCT ON (d.handle, d.parent_handle)
+            d.handle,
+            d.generation,
+            d.parent_handle,
+            p.gramps_id,
+            p.given_name as first_name,
+            p.surname
+        FROM descendants d
+        JOIN person p ON p.handle = d.handle
+        ORDER BY d.handle, d.parent_handle, d.generation
         """
 
-        self.conn.execute(query, [person_handle, max_depth])
+        self.conn.execute(query, [person_handle, person_handle, max_depth])
+        rows = sorted(self.conn.fetchall(), key=lambda row: row[1])
 
         # Build tree structure
         tree = {"handle": person_handle, "children": []}
         nodes = {person_handle: tree}
 
-        for row in self.conn.fetchall():
-            if row[0] != person_handle:  # Skip root
-                parent_handle = row[2][-2] if len(row[2]) > 1 else person_handle
+        for row in rows:
+            if row[0] == person_handle:  # Skip root
+                continue
+            node = nodes.get(row[0])
+            if node is None:
                 node = {
                     "handle": row[0],
                     "gramps_id": row[3],
-                    "name": "%s {row[5] or ''}" % row[4] or ''.strip(),
-                    "birth_date": row[6],
-                    "death_date": row[7],
+                    "name": ("%s %s" % (row[4] or "", row[5] or "")).strip(),
                     "generation": row[1],
                     "children": [],
                 }
                 nodes[row[0]] = node
-                if parent_handle in nodes:
-                    nodes[parent_handle]["children"].append(node)
+            if row[2] in nodes:
+                nodes[row[2]]["children"].append(node)
 
         return tree
 
-    def find_potential_duplicates(self, threshold=0.8):
+    def find_potential_duplicates(self, threshold=0.8, year_range=10):
         """
         Find potential duplicate persons using name similarity.
 
         Requires pg_trgm extension for trigram similarity.
 
         :param threshold: Similarity threshold (0.0 to 1.0)
-        :return: List of potential duplicate pairs
+        :param year_range: Maximum difference between known birth years
+        :return: List of potential duplicate pairs, most similar first
+        """
+        results = []
+        for batch in self.iter_potential_duplicates(threshold, year_range):
+            results.extend(batch)
+        results.sort(key=lambda row: -row[8])
+        return results
+
+    def iter_potential_duplicates(
+        self, threshold=0.8, year_range=10, batch_size=DUPLICATE_BATCH_SIZE
+    ):
+        """
+        Find potential duplicate persons, yielding results in batches.
+
+        People are scanned in handle order, ``batch_size`` at a time.
+        Candidates for each person come from the trigram index on
+        ``full_name`` through the ``%`` operator, and are then restricted
+        to the same block: the same phonetic surname code (soundex when
+        fuzzystrmatch is installed) and birth years no more than
+        ``year_range`` apart when both are known. Each pair is reported
+        once, so a review UI can show hits while the scan continues.
+
+        :param threshold: Similarity threshold (0.0 to 1.0)
+        :param year_range: Maximum difference between known birth years
+        :param batch_size: Number of people scanned per batch
+        :return: Iterator over lists of (handle1, handle2, id1, id2,
+                 first1, surname1, first2, surname2, name_similarity)
         """
         # Check if pg_trgm is available
+        if not self._has_trigram():
+            raise RuntimeError(_("pg_trgm extension required for duplicate detection"))
+
         self.conn.execute(
-            """
-            SELECT COUNT(*) FROM pg_extension WHERE extname = 'pg_trgm'
-        """
+            "SELECT COUNT(*) FROM pg_extension WHERE extname = 'fuzzystrmatch'"
         )
-        if self.conn.fetchone()[0] == 0:
-            raise RuntimeError(_("pg_trgm extension required for duplicate detection"))
+        if self.conn.fetchone()[0]:
+            block = "soundex(%s.surname)"
+        else:
+            block = "lower(left(%s.surname, 1))"
 
         query = """
+        WITH batch AS (
+            SELECT p.handle, p.gramps_id, p.given_name, p.surname,
+                   p.full_name, {block} as block, y.birth_year
+            FROM person p
+            LEFT JOIN LATERAL ({birth_year}) y ON true
+            WHERE p.handle > %s
+            AND p.full_name <> ' '
+            ORDER BY p.handle
+            LIMIT %s
+        )
         SELECT
-            p1.handle as handle1,
-            p2.handle as handle2,
-            p1.json_data->>'gramps_id' as id1,
-            p2.json_data->>'gramps_id' as id2,
-            p1.json_data->'names'->0->>'first_name' as first1,
-            p1.json_data->'names'->0->>'surname' as surname1,
-            p2.json_data->'names'->0->>'first_name' as first2,
-            p2.json_data->'names'->0->>'surname' as surname2,
-            similarity(
-                p1.json_data->'names'->0->>'first_name' || ' ' ||
-                p1.json_data->'names'->0->>'surname',
-                p2.json_data->'names'->0->>'first_name' || ' ' ||
-                p2.json_data->'names'->0->>'surname'
-            ) as name_similarity
-        FROM person p1
-        JOIN person p2 ON p1.handle < p2.handle
-        WHERE similarity(
-            p1.json_data->'names'->0->>'first_name' || ' ' ||
-            p1.json_data->'names'->0->>'surname',
-            p2.json_data->'names'->0->>'first_name' || ' ' ||
-            p2.json_data->'names'->0->>'surname'
-        ) > %s
-        ORDER BY name_similarity DESC
-        """
+            b.handle as handle1,
+            c.handle as handle2,
+            b.gramps_id as id1,
+            c.gramps_id as id2,
+            b.given_name as first1,
+            b.surname as surname1,
+            c.given_name as first2,
+            c.surname as surname2,
+            similarity(b.full_name, c.full_name) as name_similarity,
+            b.handle as last_handle
+        FROM batch b
+        LEFT JOIN LATERAL (
+            SELECT p.handle, p.gramps_id, p.given_name, p.surname, p.full_name
+            FROM person p
+            LEFT JOIN LATERAL ({birth_year}) y ON true
+            WHERE p.full_name %% b.full_name
+            AND p.handle > b.handle
+            AND {block} = b.block
+            AND (y.birth_year IS NULL OR b.birth_year IS NULL
+                 OR abs(y.birth_year - b.birth_year) <= %s)
+        ) c ON true
+        ORDER BY b.handle
+        """.format(
+            block=block % "p", birth_year=BIRTH_YEAR_SQL % {"p": "p"}
+        )
 
-        self.conn.execute(query, [threshold])
-        return self.conn.fetchall()
+        last_handle = ""
+        while True:
+            self.conn.execute(
+                "SELECT set_config('pg_trgm.similarity_threshold', %s, false)",
+                [str(threshold)],
+            )
+            self.conn.execute(query, [last_handle, batch_size, year_range])
+            rows = self.conn.fetchall()
+            if not rows:
+                return
+            last_handle = rows[-1][9]
+            batch = [row[:9] for row in rows if row[1] is not None]
+            if batch:
+                yield batch
 
     def get_statistics(self):
         """
@@ -68,6 +68,66 @@ OBJECT_TYPES = [
     "tag",
 ]
 
+# Text search configuration. 'simple' does no stemming, which suits
+# names and multilingual genealogical text.
+SEARCH_CONFIG = "simple"
+
+# Searchable text of each object type. These are used in generated columns,
+# so they must only use immutable functions.
+SEARCH_DOCUMENTS = {
+    "person": (
+        "COALESCE(json_data->'primary_name'->>'first_name', '') || ' ' || "
+        "jsonb_path_query_array(json_data, "
+        "'$.primary_name.surname_list[*].surname')::text || ' ' || "
+        "COALESCE(json_data->'primary_name'->>'call', '') || ' ' || "
+        "COALESCE(json_data->'primary_name'->>'nick', '') || ' ' || "
+        "jsonb_path_query_array(json_data, "
+        "'$.alternate_names[*].first_name')::text || ' ' || "
+        "jsonb_path_query_array(json_data, "
+        "'$.alternate_names[*].surname_list[*].surname')::text || ' ' || "
+        "jsonb_path_query_array(json_data, '$.attribute_list[*].value')::text"
+    ),
+    "event": "COALESCE(json_data->>'description', '')",
+    "place": (
+        "COALESCE(json_data->>'title', '') || ' ' || "
+        "COALESCE(json_data->'name'->>'value', '') || ' ' || "
+        "jsonb_path_query_array(json_data, '$.alt_names[*].value')::text"
+    ),
+    "source": (
+        "COALESCE(json_data->>'title', '') || ' ' || "
+        "COALESCE(json_data->>'author', '') || ' ' || "
+        "COALESCE(json_data->>'pubinfo', '') || ' ' || "
+        "COALESCE(json_data->>'abbrev', '')"
+    ),
+    "note": "COALESCE(json_data->'text'->>'string', '')",
+}
+
+# Lower-cased "first_name surname" of the primary name
+PERSON_FULL_NAME = (
+    "lower(COALESCE(json_data->'primary_name'->>'first_name', '') || ' ' || "
+    "COALESCE(json_data->'primary_name'->'surname_list'->0->>'surname', ''))"
+)
+
+# Parent/child edges derived from family JSON. Each family contributes one
+# row per (parent, child) pair so that genealogy graph queries can walk the
+# tree through plain B-tree lookups instead of unnesting JSON arrays.
+FAMILY_EDGE_SELECT = """
+    SELECT DISTINCT parents.parent_handle,
+           child->>'ref' AS child_handle,
+           f.handle AS family_handle
+    FROM {family} f
+    CROSS JOIN LATERAL (
+        VALUES (f.json_data->>'father_handle'),
+               (f.json_data->>'mother_handle')
+    ) AS parents(parent_handle)
+    CROSS JOIN LATERAL jsonb_array_elements(
+        COALESCE(f.json_data->'child_ref_list', '[]'::jsonb)
+    ) AS child
+    WHERE parents.parent_handle IS NOT NULL
+    AND parents.parent_handle <> ''
+    AND child->>'ref' IS NOT NULL
+"""
+
 
 # -------------------------------------------------------------------------
 #
@@ -126,6 +186,9 @@ class PostgreSQLSchema:
                     "Upgrading schema from v%s to v%s", current_version, SCHEMA_VERSION
                 )
                 self._upgrade_schema(current_version)
+            elif self.use_jsonb:
+                # Trees created by older versions of the addon
+                self._ensure_enhanced_features()
 
     def _create_schema(self):
         """
@@ -227,6 +290,7 @@ class PostgreSQLSchema:
         # Create PostgreSQL-specific features FIRST (includes extensions)
         if self.use_jsonb:
             self._create_enhanced_features()
+            self._create_family_edge_table()
 
         # Set initial schema version
         self._set_schema_version(SCHEMA_VERSION)
@@ -407,6 +471,77 @@ class PostgreSQLSchema:
             except Exception as e:
                 self.log.debug("Could not create trigram index on notes: %s", e)
 
+    def _create_family_edge_table(self):
+        """
+        Create the materialized parent/child edge table.
+
+        Rows are maintained from family commits and removed together
+        with their family through the foreign key.
+        """
+        self.conn.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {self._table_name('family_edge')} (
+                parent_handle VARCHAR(50) NOT NULL,
+                child_handle VARCHAR(50) NOT NULL,
+                family_handle VARCHAR(50) NOT NULL
+                    REFERENCES {self._table_name('family')} (handle)
+                    ON DELETE CASCADE,
+                PRIMARY KEY (parent_handle, child_handle, family_handle)
+            )
+        """
+        )
+
+        # The primary key serves parent -> child lookups
+        self.conn.execute(
+            f"""
+            CREATE INDEX IF NOT EXISTS idx_{self.table_prefix}family_edge_child
+                ON {self._table_name('family_edge')} (child_handle, parent_handle)
+        """
+        )
+
+        self.conn.execute(
+            f"""
+            CREATE INDEX IF NOT EXISTS idx_{self.table_prefix}family_edge_family
+                ON {self._table_name('family_edge')} (family_handle)
+        """
+        )
+
+    def refresh_family_edges(self, family_handle=None):
+        """
+        Rebuild parent/child edges from family JSON data.
+
+        :param family_handle: Only rebuild edges of this family, or all
+                              families if None
+        :type family_handle: str or None
+        """
+        edge_table = self._table_name("family_edge")
+        select = FAMILY_EDGE_SELECT.format(family=self._table_name("family"))
+
+        if family_handle is None:
+            self.conn.execute(f"DELETE FROM {edge_table}")
+            self.conn.execute(
+                f"""
+                INSERT INTO {edge_table}
+                    (parent_handle, child_handle, family_handle)
+                {select}
+            """
+            )
+            self.conn.execute(f"ANALYZE {edge_table}")
+        else:
+            self.conn.execute(
+                f"DELETE FROM {edge_table} WHERE family_handle = %s",
+                [family_handle],
+            )
+            self.conn.execute(
+                f"""
+                INSERT INTO {edge_table}
+                    (parent_handle, child_handle, family_handle)
+                {select}
+                AND f.handle = %s
+            """,
+                [family_handle],
+            )
+
     def _create_enhanced_features(self):
         """Create PostgreSQL-specific enhanced features."""
 
@@ -455,6 +590,110 @@ class PostgreSQLSchema:
         # Enable extensions if available
         self._enable_useful_extensions()
 
+        # Full-text search columns (trigram indexes need pg_trgm)
+        self._create_search_columns()
+
+        # Name column for duplicate detection
+        self._create_duplicate_columns()
+
+    def _ensure_enhanced_features(self):
+        """
+        Add enhanced features missing from an existing schema.
+
+        Only structures that do not exist yet are created, so this is
+        cheap to run every time a tree is opened.
+        """
+        if not self.conn.table_exists(self._table_name("family_edge")):
+            self._create_family_edge_table()
+            self.refresh_family_edges()
+
+        if not self.conn.column_exists(self._table_name("person"), "search_tsv"):
+            self._create_search_columns()
+
+        if not self.conn.column_exists(self._table_name("person"), "full_name"):
+            self._create_duplicate_columns()
+
+        self.conn.commit()
+
+    def _create_search_columns(self):
+        """
+        Create generated full-text search columns.
+
+        Each searchable table gets a ``search_text`` column holding the
+        text worth searching and a ``search_tsv`` tsvector built from the
+        same expression. The tsvector is served by a GIN index; if pg_trgm
+        is available, ``search_text`` also gets a trigram index so
+        substring matches can be answered without a table scan.
+        """
+        has_trgm = self._extension_enabled("pg_trgm")
+
+        for obj_type, document in SEARCH_DOCUMENTS.items():
+            table = self._table_name(obj_type)
+            self.conn.execute(
+                f"""
+                ALTER TABLE {table}
+                ADD COLUMN IF NOT EXISTS search_text TEXT
+                    GENERATED ALWAYS AS ({document}) STORED
+            """
+            )
+            self.conn.execute(
+                f"""
+                ALTER TABLE {table}
+                ADD COLUMN IF NOT EXISTS search_tsv TSVECTOR
+                    GENERATED ALWAYS AS (
+                        to_tsvector('{SEARCH_CONFIG}', {document})
+                    ) STORED
+            """
+            )
+            self.conn.execute(
+                f"""
+                CREATE INDEX IF NOT EXISTS idx_{self.table_prefix}{obj_type}_search_tsv
+                    ON {table} USING GIN (search_tsv)
+            """
+            )
+            if has_trgm:
+                self.conn.execute(
+                    f"""
+                    CREATE INDEX IF NOT EXISTS idx_{self.table_prefix}{obj_type}_search_trgm
+                        ON {table} USING GIN (search_text gin_trgm_ops)
+                """
+                )
+
+    def _create_duplicate_columns(self):
+        """
+        Create the generated full name column used for duplicate detection.
+
+        With pg_trgm available, a trigram GIN index lets the ``%``
+        similarity operator find candidate matches through the index
+        instead of comparing every pair of people.
+        """
+        table = self._table_name("person")
+        self.conn.execute(
+            f"""
+            ALTER TABLE {table}
+            ADD COLUMN IF NOT EXISTS full_name TEXT
+                GENERATED ALWAYS AS ({PERSON_FULL_NAME}) STORED
+        """
+        )
+        if self._extension_enabled("pg_trgm"):
+            self.conn.execute(
+                f"""
+                CREATE INDEX IF NOT EXISTS idx_{self.table_prefix}person_full_name_trgm
+                    ON {table} USING GIN (full_name gin_trgm_ops)
+            """
+            )
+
+    def _extension_enabled(self, extension_name):
+        """Check if a PostgreSQL extension is installed in this database."""
+        self.conn.execute(
+            """
+            SELECT COUNT(*) FROM pg_extension
+            WHERE extname = %s
+        """,
+            [extension_name],
+        )
+        return self.conn.fetchone()[0] > 0
+
     def _enable_useful_extensions(self):
         """Enable PostgreSQL extensions that benefit genealogy queries."""
 
@@ -462,6 +701,7 @@ class PostgreSQLSchema:
             ("pg_trgm", "Trigram similarity searches"),
             ("btree_gin", "Better GIN index performance"),
             ("intarray", "Array operations"),
+            ("fuzzystrmatch", "Phonetic name matching"),
         ]
 
         for ext_name, description in extensions:
@@ -530,6 +770,10 @@ class PostgreSQLSchema:
             # Initial version - no upgrades needed yet
             pass
 
+        # Add derived tables and columns used by the enhanced queries
+        if self.use_jsonb:
+            self._ensure_enhanced_features()
+
         # Update version
         self._set_schema_version(SCHEMA_VERSION)
         self.conn.commit()
@@ -25,22 +25,20 @@
 Relations tab.
 
 """
-import time
 import logging
 import platform
 import os
-from array import array
-from uuid import uuid4
-from gi.repository import Gtk
+import threading
+from collections import defaultdict, deque
+from gi.repository import Gtk, GLib
 
 from gramps.gui.listmodel import ListModel, INTEGER
 from gramps.gui.managedwindow import ManagedWindow
-from gramps.gui.utils import ProgressMeter
 from gramps.gui.plug import tool
 from gramps.gui.dialog import WarningDialog
 from gramps.gen.display.name import displayer as name_displayer
 from gramps.gen.relationship import get_relationship_calculator
-from gramps.gen.filters import GenericFilterFactory, rules
+from gramps.gen.lib import ChildRefType
 from gramps.gen.config import config
 from gramps.gen.utils.docgen import ODSTab
 from gramps.gen.utils.db import get_timeperiod
@@ -63,6 +61,9 @@ logging.basicConfig(filename='debug.log', level=logging.DEBUG)
 #except:
     #pass
 
+# Number of rows sent to the table at once
+BATCH_SIZE = 500
+
 #-------------------------------------------------------------------------
 #
 #
@@ -74,9 +75,7 @@ class RelationTab(tool.Tool, ManagedWindow):
         uistate = user.uistate
         self.label = _("Relation and distances with root")
         self.dbstate = dbstate
-        FilterClass = GenericFilterFactory('Person')
         self.path = '.'
-        filter = FilterClass()
 
         tool.Tool.__init__(self, dbstate, options_class, name)
         if uistate:
@@ -118,179 +117,116 @@ class RelationTab(tool.Tool, ManagedWindow):
                 ]
 
             treeview = Gtk.TreeView()
-            model = ListModel(treeview, self.titles)
+            self.model = ListModel(treeview, self.titles)
             s = Gtk.ScrolledWindow()
             s.add(treeview)
             box.pack_start(s, True, True, 0)
 
+            self.status = Gtk.Label(label=_('Please wait, computing...'))
+            box.pack_end(self.status, False, True, 0)
+
             button = Gtk.Button(label=_("Save"))
             button.connect("clicked", self.button_clicked)
             box.pack_end(button, False, True, 0)
 
         self.stats_list = []
-
-        # behavior can be different according to CPU and generation depth
+        self.stop = threading.Event()
 
         max_level = config.get('behavior.generation-depth')
-        # compact and interlinked tree
-        # single core 2.80 Ghz needs +/- 0.1 second per person
-        if max_level >= 15:
-            var = max_level * 0.01
-        elif 10 <= max_level < 15:
-            var = max_level * 0.02
-        else:
-            var = max_level * 0.025
-
-        plist = self.dbstate.db.iter_person_handles()
-        length = self.dbstate.db.get_number_of_people()
-        default_person = self.dbstate.db.get_default_person()
-        if uistate:
-            self.progress = ProgressMeter(self.label, can_cancel=True,
-                                          parent=window)
-        else:
-            self.progress = ProgressMeter(self.label)
-
-        if default_person: # rather designed for run via GUI...
-            root_id = default_person.get_gramps_id()
-            ancestors = rules.person.IsAncestorOf([str(root_id), True])
-            descendants = rules.person.IsDescendantOf([str(root_id), True])
-            related = rules.person.IsRelatedWith([str(root_id)])
-
-            # filtering people can be useful on some large data set
-            # counter on filtering pass was not efficient
-            # Not the proper solution, but a lazy one providing expected message
-
-            filter.add_rule(related)
-            self.progress.set_pass(_('Please wait, filtering...'))
-            filtered_list = filter.apply(self.dbstate.db, plist)
-
-            relationship = get_relationship_calculator()
-        else: # TODO: provide selection widget for CLI and GUI
+        self.root = self.dbstate.db.get_default_person()
+        if not self.root: # TODO: provide selection widget for CLI and GUI
             WarningDialog(_("No default_person"))
             return
+        self.relationship = get_relationship_calculator()
 
-        count = 0
-        filtered_people = len(filtered_list)
-        self.progress.set_pass(_('Generating relation map...'), filtered_people)
-        if self.progress.get_cancelled():
-            self.progress.close()
-            return
-        step_one = time.clock() # init for counters
-        for handle in filtered_list:
-            nb = len(self.stats_list)
-            count += 1
-            self.progress.step()
-            step_two = time.clock()
-            start = 99
-            if count > start: # provide a basic interface for counters
-                need = (step_two - step_one) / count
-                wait = need * filtered_people
-                remain = int(wait) - int(step_two - step_one)
-                # sorry, lazy
-                header = _("%d/%d \n %d/%d seconds \n %d/%d \n%f|\t%f"
-                           % (count, filtered_people, remain, int(wait),
-                              nb, length, float(need), float(var))
-                          )
-                self.progress.set_header(header)
-                if self.progress.get_cancelled():
-                    self.progress.close()
-                    return
-            person = dbstate.db.get_person_from_handle(handle)
-
-            timeout_one = time.clock() # for delta and timeout estimations
-            dist = relationship.get_relationship_distance_new(
-                dbstate.db, default_person, person, only_birth=True)
-            timeout_two = time.clock()
-
-            rank = dist[0][0]
-            if rank == -1 or rank > max_level: # not related and ignored people
-                continue
+        # Only the family links are read here: the database is not
+        # shared with the worker thread
+        parents, children = get_birth_links(self.dbstate.db)
+        rows = relation_rows(self.root.handle, parents, children, max_level)
 
-            limit = timeout_two - timeout_one
-            expect = (limit - var) / max_level
-            if limit > var:
-                n = name_displayer.display(person)
-                _LOG.debug("Sorry! '{0}' needs {1} second, \
-                            variation = '{2}'".format(n,
-                                                      limit,
-                                                      expect
-                                                     )
-                          )
-                continue
-            else:
-                _LOG.debug("variation = '{}'".format(limit)) # delta, see above max_level 'wall' section
-                rel = relationship.get_one_relationship(
-                    dbstate.db, default_person, person)
-                rel_a = dist[0][2]
-                Ga = len(rel_a)
-                rel_b = dist[0][4]
-                Gb = len(rel_b)
-                mra = 1
-
-                # m: mother; f: father
-                if Ga > 0:
-                    for letter in rel_a:
-                        if letter == 'm':
-                            mra = mra * 2 + 1
-                        if letter == 'f':
-                            mra = mra * 2
-                    # design: mra gender will be often female (m: mother)
-                    if rel_a[-1] == "f" and Gb != 0: # male gender, look at spouse
-                        mra = mra + 1
-
-                name = name_displayer.display(person)
-                # pseudo privacy; sample for DNA stuff and mapping
-                import hashlib
-                no_name = hashlib.sha384(name.encode() + handle.encode()).hexdigest()
-                _LOG.info(no_name) # own internal password via handle
-
-                kekule = number.get_number(Ga, Gb, rel_a, rel_b)
-
-                # workaround - possible unique ID and common numbers
-                uuid = str(uuid4())
-                _LOG.info("Random UUID: {}".format(uuid))
-
-                if kekule == "u": # TODO: cousin(e)s need a key
-                    kekule = 0
-                if kekule == "nb": # non-birth
-                    kekule = -1
-                try:
-                    test = int(kekule)
-                except: # 1: related to mother; 0.x : no more girls lineage
-                    kekule = 1
-
-                period = get_timeperiod(self.dbstate.db, handle)
-
-                # sometimes 'iterator' (generator) is more faster
-                #handle_list = map(handle, filtered_list)
-                iterator = (handle for handle in filtered_list)
-
-                # experimentations; not used yet
-                new_list=[int(kekule), int(Ga), int(Gb), int(mra), int(rank)]
-                if max_level > 7:
-                    line = (iterator, array('l', new_list))
-                else:
-                    line = (iterator, array('b', new_list))
-
-                self.stats_list.append((int(kekule), rel, name, int(Ga),
-                                        int(Gb), int(mra), int(rank), str(period)))
-        self.progress.close()
-
-        from itertools import groupby
-        for key, items in groupby(self.stats_list, lambda x: x[0]):
-            for subitem in items:
-                _LOG.info(subitem)
-
-        _LOG.debug("total: {}".format(nb))
-        for entry in self.stats_list:
-            if uistate:
-                model.add(entry, entry[0])
-            else:
-                print(entry)
         if uistate:
+            window.connect('destroy', lambda widget: self.stop.set())
             window.show()
             self.set_window(window, None, self.label)
             self.show()
+            threading.Thread(target=self.compute, args=(rows,),
+                             daemon=True).start()
+        else:
+            for row in rows:
+                entry = self.make_entry(row)
+                self.stats_list.append(entry)
+                print(entry)
+
+    def compute(self, rows):
+        """
+        Walk the tree in a worker thread, sending the rows to the table in
+        batches.
+        """
+        batch = []
+        for row in rows:
+            if self.stop.is_set():
+                return
+            batch.append(row)
+            if len(batch) == BATCH_SIZE:
+                GLib.idle_add(self.add_rows, batch)
+                batch = []
+        GLib.idle_add(self.add_rows, batch, True)
+
+    def add_rows(self, rows, done=False):
+        """
+        Fill the table with a batch of rows. Runs in the GUI thread.
+        """
+        if self.stop.is_set():
+            return False
+        for row in rows:
+            entry = self.make_entry(row)
+            self.stats_list.append(entry)
+            self.model.add(entry, entry[0])
+        if done:
+            for entry in self.stats_list:
+                _LOG.info(entry)
+            _LOG.debug("total: {}".format(len(self.stats_list)))
+            self.status.set_text(_('%d people') % len(self.stats_list))
+        else:
+            self.status.set_text(_('Please wait, computing... %d people')
+                                 % len(self.stats_list))
+        return False
+
+    def make_entry(self, row):
+        """
+        Complete a row with the data read from the database.
+        """
+        handle, kekule, rel_a, rel_b, mra, rank = row
+        person = self.dbstate.db.get_person_from_handle(handle)
+        rel = self.get_relation(person, rel_a, rel_b)
+        name = name_displayer.display(person)
+        # pseudo privacy; sample for DNA stuff and mapping
+        import hashlib
+        no_name = hashlib.sha384(name.encode() + handle.encode()).hexdigest()
+        _LOG.info(no_name) # own internal password via handle
+
+        period = get_timeperiod(self.dbstate.db, handle)
+        return (kekule, rel, name, len(rel_a), len(rel_b), mra, rank,
+                str(period))
+
+    def get_relation(self, person, rel_a, rel_b):
+        """
+        Describe the relation found by the traversal, as the relationship
+        calculator would.
+        """
+        db = self.dbstate.db
+        if person.handle == self.root.handle:
+            return ""
+        spouse = self.relationship.is_spouse(db, self.root, person)
+        if spouse:
+            return spouse
+        if len(rel_a) == len(rel_b) == 1:
+            return self.relationship.get_sibling_relationship_string(
+                self.relationship.get_sibling_type(db, self.root, person),
+                self.root.get_gender(), person.get_gender())
+        return self.relationship.get_single_relationship_string(
+            len(rel_a), len(rel_b), self.root.get_gender(),
+            person.get_gender(), rel_a, rel_b)
 
     def save(self):
         """
@@ -337,6 +273,106 @@ class RelationTab(tool.Tool, ManagedWindow):
     def button_clicked(self, button):
         self.save()
 
+def get_birth_links(db):
+    """
+    Return the birth parents in the main parent family of everyone, and the
+    reverse links, as dicts of lists of (handle, 'f' or 'm').
+    """
+    families = {}
+    for handle, family in db._iter_raw_family_data():
+        families[handle] = family
+    parents = {}
+    children = defaultdict(list)
+    for handle, person in db._iter_raw_person_data():
+        if not person.parent_family_list:
+            continue
+        family = families.get(person.parent_family_list[0])
+        if family is None:
+            continue
+        for child_ref in family.child_ref_list:
+            if child_ref.ref == handle:
+                links = []
+                if (family.father_handle and
+                        child_ref.frel.value == ChildRefType.BIRTH):
+                    links.append((family.father_handle, 'f'))
+                if (family.mother_handle and
+                        child_ref.mrel.value == ChildRefType.BIRTH):
+                    links.append((family.mother_handle, 'm'))
+                parents[handle] = links
+                for parent, letter in links:
+                    children[parent].append((handle, letter))
+                break
+    return parents, children
+
+def relation_rows(root, parents, children, max_level):
+    """
+    Walk the tree once from root, yielding everyone related by birth within
+    max_level generations, nearest first, as
+    (handle, Rel_id, path up from root, path up from person, MRA, rank).
+
+    The ancestors of root are found first; then everyone is reached down
+    from their most recent common ancestor with root.
+    """
+    up = {root: ""}
+    queue = deque([root])
+    while queue:
+        handle = queue.popleft()
+        rel_a = up[handle]
+        if len(rel_a) < max_level:
+            for parent, letter in parents.get(handle, ()):
+                if parent not in up:
+                    up[parent] = rel_a + letter
+                    queue.append(parent)
+
+    # one bucket per rank, ancestors enter at their own generation
+    levels = [[] for _rank in range(max_level + 1)]
+    for handle, rel_a in up.items():
+        levels[len(rel_a)].append((handle, rel_a, ""))
+    seen = set()
+    for rank, level in enumerate(levels):
+        for handle, rel_a, rel_b in level:
+            if handle in seen:
+                continue
+            seen.add(handle)
+            yield (handle, get_rel_id(rel_a, rel_b), rel_a, rel_b,
+                   get_mra(rel_a, rel_b), rank)
+            if rank < max_level:
+                for child, letter in children.get(handle, ()):
+                    if child not in seen:
+                        levels[rank + 1].append((child, rel_a,
+                                                 letter + rel_b))
+
+def get_rel_id(rel_a, rel_b):
+    """
+    Return the Rel_id number of a relation.
+    """
+    kekule = number.get_number(len(rel_a), len(rel_b), rel_a, rel_b)
+    if kekule == "u": # TODO: cousin(e)s need a key
+        kekule = 0
+    if kekule == "nb": # non-birth
+        kekule = -1
+    try:
+        return int(kekule)
+    except: # 1: related to mother; 0.x : no more girls lineage
+        return 1
+
+def get_mra(rel_a, rel_b):
+    """
+    Return the number of the most recent common ancestor.
+    """
+    mra = 1
+    # m: mother; f: father
+    if rel_a:
+        for letter in rel_a:
+            if letter == 'm':
+                mra = mra * 2 + 1
+            if letter == 'f':
+                mra = mra * 2
+        # design: mra gender will be often female (m: mother)
+        if rel_a[-1] == "f" and rel_b: # male gender, look at spouse
+            mra = mra + 1
+    return mra
+
 class TableReport:
     """
     This class provides an interface for the spreadsheet table
@@ -28,6 +28,14 @@
 import time
 import json
 import logging
+from collections import OrderedDict
+
+try:
+    from gi.repository import GLib
+
+    GLIB_AVAILABLE = True
+except ImportError:
+    GLIB_AVAILABLE = False
 
 # ------------------------------------------------------------------------
 #
@@ -74,6 +82,48 @@ from gramps.gen.const import GRAMPS_LOCALE as glocale
 LOG = logging.getLogger(".shareddbapi")
 _LOG = logging.getLogger(DBLOGNAME)
 
+REFERENCE_COLUMNS = ("treeid", "obj_handle", "obj_class", "ref_handle", "ref_class")
+# Number of reference rows collected before they are copied to the server
+REFERENCE_CHUNK_SIZE = 10000
+
+# Channel on which committed changes are published to the other clients
+NOTIFY_CHANNEL = "gramps_changes"
+# Handles per notification, keeping payloads below the 8000 byte limit
+NOTIFY_HANDLES = 100
+# Number of objects kept in the per-client cache
+OBJECT_CACHE_SIZE = 10000
+
+NAME_TO_KEY_MAP = {name: key for key, name in KEY_TO_NAME_MAP.items()}
+
+
+class ObjectCache:
+    """
+    A bounded, least recently used, cache of serialized objects, keyed by
+    (obj_key, handle).
+    """
+
+    def __init__(self, size=OBJECT_CACHE_SIZE):
+        self.size = size
+        self.data = OrderedDict()
+
+    def get(self, key):
+        value = self.data.get(key)
+        if value is not None:
+            self.data.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.data[key] = value
+        self.data.move_to_end(key)
+        if len(self.data) > self.size:
+            self.data.popitem(last=False)
+
+    def discard(self, key):
+        self.data.pop(key, None)
+
+    def clear(self):
+        self.data.clear()
+
 
 class SharedDBAPI(DbGeneric):
     """
@@ -323,8 +373,79 @@ class SharedDBAPI(DbGeneric):
         # we never do this for shared databases!
 
     def _close(self):
+        if self._notify_source:
+            GLib.source_remove(self._notify_source)
+            self._notify_source = None
         self.dbapi.close()
 
+    def _start_change_feed(self):
+        """
+        Start listening to the changes committed by other clients, and
+        create the object cache they invalidate.
+
+        With a GLib main loop the notifications are handled as soon as they
+        arrive, and signals are emitted so that views refresh the changed
+        rows. Otherwise they are polled for before each cached read.
+        """
+        self._object_cache = ObjectCache()
+        self._notify_source = None
+        self.dbapi.listen(NOTIFY_CHANNEL)
+        if GLIB_AVAILABLE:
+            self._notify_source = GLib.io_add_watch(
+                self.dbapi.fileno(), GLib.PRIORITY_DEFAULT, GLib.IO_IN,
+                self._on_notification,
+            )
+
+    def _on_notification(self, fd, condition):
+        """
+        GLib callback, called when notifications are waiting.
+        """
+        self._process_notifications(emit=True)
+        return True
+
+    def _process_notifications(self, emit=False):
+        """
+        Invalidate the cache for the changes other clients committed to
+        this tree, optionally emitting the matching signals.
+        """
+        treeid = self.dbapi.treeid
+        for payload in self.dbapi.get_notifications():
+            change = json.loads(payload)
+            if change["treeid"] != treeid:
+                continue
+            if change["change"] == "rebuild":
+                self._object_cache.clear()
+                if emit:
+                    self.request_rebuild()
+                continue
+            obj_key = NAME_TO_KEY_MAP[change["table"]]
+            for handle in change["handles"]:
+                self._object_cache.discard((obj_key, handle))
+            if emit:
+                self.emit(
+                    "%s-%s" % (change["table"], change["change"]),
+                    (change["handles"],),
+                )
+
+    def _publish_changes(self, changes):
+        """
+        Publish committed changes, a list of (table, change, handles), to
+        the other clients. Notifications are delivered on commit.
+        """
+        treeid = self.dbapi.treeid
+        payloads = []
+        for table, change, handles in changes:
+            for start in range(0, max(len(handles), 1), NOTIFY_HANDLES):
+                payload = {
+                    "treeid": treeid,
+                    "table": table,
+                    "change": change,
+                    "handles": handles[start : start + NOTIFY_HANDLES],
+                }
+                payloads.append((NOTIFY_CHANNEL, json.dumps(payload)))
+        if payloads:
+            self.dbapi.executemany("SELECT pg_notify(?, ?)", payloads)
+
     def _txn_begin(self):
         """
         Lowlevel interface to the backend transaction.
@@ -380,13 +501,14 @@ class SharedDBAPI(DbGeneric):
             txn.get_description(),
         )
 
-        action = {TXNADD: "-add", TXNUPD: "-update", TXNDEL: "-delete", None: "-delete"}
+        action = {TXNADD: "add", TXNUPD: "update", TXNDEL: "delete", None: "delete"}
+        changes = []
         if txn.batch:
             # FIXME: need a User GUI update callback here:
             self.reindex_reference_map(lambda percent: percent)
-        self.dbapi.commit()
-        if not txn.batch:
-            # Now, emit signals:
+            self._object_cache.clear()
+            self._publish_changes([("", "rebuild", [])])
+        else:
             # do deletes and adds first
             for trans_type in [TXNDEL, TXNADD, TXNUPD]:
                 for obj_type in range(11):
@@ -402,8 +524,14 @@ class SharedDBAPI(DbGeneric):
                                 if (handle, None) not in txn[(obj_type, TXNDEL)]
                             ]
                         if handles:
-                            signal = KEY_TO_NAME_MAP[obj_type] + action[trans_type]
-                            self.emit(signal, (handles,))
+                            changes.append(
+                                (KEY_TO_NAME_MAP[obj_type], action[trans_type], handles)
+                            )
+            self._publish_changes(changes)
+        self.dbapi.commit()
+        # Now, emit signals:
+        for table, change, handles in changes:
+            self.emit("%s-%s" % (table, change), (handles,))
         self.transaction = None
         msg = txn.get_description()
         self.undodb.commit(txn, msg)
@@ -416,6 +544,8 @@ class SharedDBAPI(DbGeneric):
         Executed after a batch operation abort.
         """
         self.dbapi.rollback()
+        # The cache may hold data read back after uncommitted writes
+        self._object_cache.clear()
         self.transaction = None
         txn.clear()
         txn.first = None
@@ -820,27 +950,27 @@ class SharedDBAPI(DbGeneric):
         obj.change = int(change_time or time.time())
         table = KEY_TO_NAME_MAP[obj_key]
 
-        if self._has_handle(obj_key, obj.handle):
-            old_data = self._get_raw_data(obj_key, obj.handle)
-            # update the object:
-            sql = (
-                f"UPDATE %s SET {self.serializer.data_field} = ? WHERE handle = ? AND treeid = ?"
-                % table
-            )
-            self.dbapi.execute(
-                sql,
-                [self.serializer.object_to_string(obj), obj.handle, self.dbapi.treeid],
-            )
+        self._object_cache.discard((obj_key, obj.handle))
+        # Write the object and its secondary columns in one statement
+        columns, values = self._get_secondary_values(obj)
+        values = [
+            self.dbapi.treeid,
+            obj.handle,
+            self.serializer.object_to_string(obj),
+        ] + values
+        if trans.batch and obj_key != PERSON_KEY:
+            # Nobody needs the old data: queue the row, it is sent with
+            # others in one round trip
+            self.dbapi.queue(self._upsert_sql(table, columns), values)
         else:
-            # Insert the object:
-            sql = (
-                f"INSERT INTO %s (treeid, handle, {self.serializer.data_field}) VALUES (?, ?, ?)"
-            ) % table
+            # commit_person needs the old data even in batch mode
             self.dbapi.execute(
-                sql,
-                [self.dbapi.treeid, obj.handle, self.serializer.object_to_string(obj)],
+                self._upsert_sql(table, columns, returning=True),
+                [self.dbapi.treeid, obj.handle] + values,
             )
-        self._update_secondary_values(obj)
+            row = self.dbapi.fetchone()
+            if row and row[0] is not None:
+                old_data = self.serializer.string_to_data(row[0])
         if not trans.batch:
             self._update_backlinks(obj, trans)
             if old_data:
@@ -870,25 +1000,40 @@ class SharedDBAPI(DbGeneric):
         table = KEY_TO_NAME_MAP[obj_key]
         handle = self.serializer.get_from_data_by_name(data, "handle")
 
-        if self._has_handle(obj_key, handle):
-            # update the object:
-            sql = (
-                f"UPDATE %s SET {self.serializer.data_field} = ? WHERE handle = ? AND treeid = ?"
-                % table
-            )
-            self.dbapi.execute(
-                sql, [self.serializer.data_to_string(data), handle, self.dbapi.treeid]
-            )
-        else:
-            # Insert the object:
+        self._object_cache.discard((obj_key, handle))
+        self.dbapi.execute(
+            self._upsert_sql(table, []),
+            [self.dbapi.treeid, handle, self.serializer.data_to_string(data)],
+        )
+
+    def _upsert_sql(self, table, columns, returning=False):
+        """
+        Return an INSERT ... ON CONFLICT statement writing the data field
+        and the given columns of an object.
+
+        Its arguments are the treeid, the handle, the data and the column
+        values. With returning, the treeid and handle are given twice more
+        at the front, and the statement returns the previous data, or NULL
+        for a new object.
+        """
+        data_field = self.serializer.data_field
+        columns = [data_field] + list(columns)
+        sql = "INSERT INTO %s (treeid, handle, %s) VALUES (?, ?, %s) " % (
+            table,
+            ", ".join(columns),
+            ", ".join("?" * len(columns)),
+        )
+        sql += "ON CONFLICT (treeid, handle) DO UPDATE SET %s" % ", ".join(
+            "%s = EXCLUDED.%s" % (column, column) for column in columns
+        )
+        if returning:
+            # The CTE reads the row as it was before the statement
             sql = (
-                f"INSERT INTO %s (treeid, handle, {self.serializer.data_field}) VALUES (?, ?)"
-            ) % table
-            self.dbapi.execute(
-                sql, [self.dbapi.treeid, handle, self.serializer.data_to_string(data)]
+                "WITH old AS (SELECT %s FROM %s WHERE treeid = ? AND handle = ? "
+                "FOR UPDATE) %s RETURNING (SELECT %s FROM old)"
+                % (data_field, table, sql, data_field)
             )
-
-        return
+        return sql
 
     def _update_backlinks(self, obj, transaction):
 
@@ -906,27 +1051,30 @@ class SharedDBAPI(DbGeneric):
         )
         new_references = current_references.difference(existing_references)
 
-        # Delete the existing references
-        self.dbapi.execute(
-            "DELETE FROM reference WHERE obj_handle = ? AND treeid = ?",
-            [obj.handle, self.dbapi.treeid],
-        )
-
-        # Now, add the current ones
-        for ref_class_name, ref_handle in current_references:
-            sql = (
-                "INSERT INTO reference "
-                + "(treeid, obj_handle, obj_class, ref_handle, ref_class)"
-                + "VALUES(?, ?, ?, ?, ?)"
+        # Only write the difference; usually there is none
+        if no_longer_required_references:
+            self.dbapi.executemany(
+                "DELETE FROM reference WHERE treeid = ? AND obj_handle = ? "
+                "AND ref_class = ? AND ref_handle = ?",
+                [
+                    (self.dbapi.treeid, obj.handle, ref_class_name, ref_handle)
+                    for ref_class_name, ref_handle in no_longer_required_references
+                ],
             )
-            self.dbapi.execute(
-                sql,
+        if new_references:
+            self.dbapi.executemany(
+                "INSERT INTO reference "
+                "(treeid, obj_handle, obj_class, ref_handle, ref_class) "
+                "VALUES (?, ?, ?, ?, ?)",
                 [
-                    self.dbapi.treeid,
-                    obj.handle,
-                    obj.__class__.__name__,
-                    ref_handle,
-                    ref_class_name,
+                    (
+                        self.dbapi.treeid,
+                        obj.handle,
+                        obj.__class__.__name__,
+                        ref_handle,
+                        ref_class_name,
+                    )
+                    for ref_class_name, ref_handle in new_references
                 ],
             )
 
@@ -956,6 +1104,7 @@ class SharedDBAPI(DbGeneric):
             obj_class = KEY_TO_CLASS_MAP[obj_key]
             self._remove_backlinks(obj_class, handle, transaction)
             table = KEY_TO_NAME_MAP[obj_key]
+            self._object_cache.discard((obj_key, handle))
             sql = "DELETE FROM %s WHERE handle = ? AND treeid = ?" % table
             self.dbapi.execute(sql, [handle, self.dbapi.treeid])
             if not transaction.batch:
@@ -1071,10 +1220,15 @@ class SharedDBAPI(DbGeneric):
     def reindex_reference_map(self, callback):
         """
         Reindex all primary records in the database.
+
+        The references are streamed with COPY into a temporary staging
+        table, which is not WAL-logged, and then swapped in for this tree's
+        rows in one statement pair.
         """
         self._txn_begin()
+        self.dbapi.execute("DROP TABLE IF EXISTS reference_stage")
         self.dbapi.execute(
-            "DELETE FROM reference WHERE treeid = ?", [self.dbapi.treeid]
+            "CREATE TEMPORARY TABLE reference_stage (LIKE reference)"
         )
         total = 0
         for tbl in (
@@ -1106,27 +1260,38 @@ class SharedDBAPI(DbGeneric):
         )
         # Now we use the functions and classes defined above
         # to loop through each of the primary object tables.
+        treeid = self.dbapi.treeid
+        rows = []
         for cursor_func, class_func in primary_table:
             logging.info("Rebuilding %s reference map", class_func.__name__)
             with cursor_func() as cursor:
                 for found_handle, val in cursor:
                     obj = self.serializer.data_to_object(val, class_func)
                     references = set(obj.get_referenced_handles_recursively())
-                    # handle addition of new references
-                    for ref_class_name, ref_handle in references:
-                        self.dbapi.execute(
-                            "INSERT INTO reference "
-                            "(treeid, obj_handle, obj_class, ref_handle, ref_class) "
-                            "VALUES (?, ?, ?, ?, ?)",
-                            [
-                                self.dbapi.treeid,
-                                obj.handle,
-                                obj.__class__.__name__,
-                                ref_handle,
-                                ref_class_name,
-                            ],
+                    rows.extend(
+                        (
+                            treeid,
+                            obj.handle,
+                            obj.__class__.__name__,
+                            ref_handle,
+                            ref_class_name,
                         )
+                        for ref_class_name, ref_handle in references
+                    )
+                    if len(rows) >= REFERENCE_CHUNK_SIZE:
+                        self.dbapi.copy_rows("reference_stage", REFERENCE_COLUMNS, rows)
+                        rows = []
                     self.update()
+        if rows:
+            self.dbapi.copy_rows("reference_stage", REFERENCE_COLUMNS, rows)
+
+        columns = ", ".join(REFERENCE_COLUMNS)
+        self.dbapi.execute("DELETE FROM reference WHERE treeid = ?", [treeid])
+        self.dbapi.execute(
+            "INSERT INTO reference (%s) SELECT %s FROM reference_stage"
+            % (columns, columns)
+        )
+        self.dbapi.execute("DROP TABLE reference_stage")
         self._txn_commit()
 
     def rebuild_secondary(self, callback=None):
@@ -1197,15 +1362,23 @@ class SharedDBAPI(DbGeneric):
         return [row[0] for row in rows]
 
     def _get_raw_data(self, obj_key, handle):
-        table = KEY_TO_NAME_MAP[obj_key]
-        sql = (
-            f"SELECT {self.serializer.data_field} FROM %s WHERE handle = ? AND treeid = ?"
-            % table
-        )
-        self.dbapi.execute(sql, [handle, self.dbapi.treeid])
-        row = self.dbapi.fetchone()
-        if row:
-            return self.serializer.string_to_data(row[0])
+        if not self._notify_source:
+            self._process_notifications()
+        # The serialized form is cached, so callers get their own copy
+        string = self._object_cache.get((obj_key, handle))
+        if string is None:
+            table = KEY_TO_NAME_MAP[obj_key]
+            sql = (
+                f"SELECT {self.serializer.data_field} FROM %s WHERE handle = ? AND treeid = ?"
+                % table
+            )
+            self.dbapi.execute(sql, [handle, self.dbapi.treeid])
+            row = self.dbapi.fetchone()
+            if not row:
+                return None
+            string = row[0]
+            self._object_cache.put((obj_key, handle), string)
+        return self.serializer.string_to_data(string)
 
     def _get_raw_from_id_data(self, obj_key, gramps_id):
         table = KEY_TO_NAME_MAP[obj_key]
@@ -1268,11 +1441,14 @@ class SharedDBAPI(DbGeneric):
         """
         cls = KEY_TO_CLASS_MAP[obj_key]
         table = cls.lower()
+        self._object_cache.discard((obj_key, handle))
         if data is None:
+            change = "delete"
             sql = "DELETE FROM %s WHERE handle = ? AND treeid = ?" % table
             self.dbapi.execute(sql, [handle, self.dbapi.treeid])
         else:
             if self._has_handle(obj_key, handle):
+                change = "update"
                 sql = (
                     f"UPDATE %s SET {self.serializer.data_field} = ? WHERE handle = ? AND treeid = ?"
                     % table
@@ -1282,6 +1458,7 @@ class SharedDBAPI(DbGeneric):
                     [self.serializer.data_to_string(data), handle, self.dbapi.treeid],
                 )
             else:
+                change = "add"
                 sql = (
                     f"INSERT INTO %s (treeid, handle, {self.serializer.data_field}) VALUES (?, ?, ?)"
                     % table
@@ -1292,6 +1469,7 @@ class SharedDBAPI(DbGeneric):
                 )
             obj = self.serializer.data_to_object(data, cls)
             self._update_secondary_values(obj)
+        self._publish_changes([(table, change, [handle])])
 
     def get_surname_list(self):
         """
@@ -1349,38 +1527,41 @@ class SharedDBAPI(DbGeneric):
                         % (table_name, field, sql_type)
                     )
 
-    def _update_secondary_values(self, obj):
+    def _get_secondary_values(self, obj):
         """
-        Given a primary object update its secondary field values
-        in the database.
-        Does not commit.
+        Given a primary object return its secondary column names, and
+        their values cast for the database.
         """
         table = obj.__class__.__name__
-        fields = [field[0] for field in obj.get_secondary_fields()]
-        sets = []
-        values = []
-        for field in fields:
-            sets.append("%s = ?" % field)
-            values.append(getattr(obj, field))
+        columns = [
+            field[0] for field in obj.get_secondary_fields() if field[0] != "handle"
+        ]
+        values = [getattr(obj, column) for column in columns]
 
         # Derived fields
         if table == "Person":
             given_name, surname = self._get_person_data(obj)
-            sets.append("given_name = ?")
-            values.append(given_name)
-            sets.append("surname = ?")
-            values.append(surname)
+            columns += ["given_name", "surname"]
+            values += [given_name, surname]
         if table == "Place":
-            handle = self._get_place_data(obj)
-            sets.append("enclosed_by = ?")
-            values.append(handle)
+            columns.append("enclosed_by")
+            values.append(self._get_place_data(obj))
+
+        return columns, self._sql_cast_list(values)
 
+    def _update_secondary_values(self, obj):
+        """
+        Given a primary object update its secondary field values
+        in the database.
+        Does not commit.
+        """
+        columns, values = self._get_secondary_values(obj)
         if len(values) > 0:
-            table_name = table.lower()
+            table_name = obj.__class__.__name__.lower()
             self.dbapi.execute(
                 "UPDATE %s SET %s where handle = ? AND treeid = ?"
-                % (table_name, ", ".join(sets)),
-                self._sql_cast_list(values) + [obj.handle, self.dbapi.treeid],
+                % (table_name, ", ".join("%s = ?" % column for column in columns)),
+                values + [obj.handle, self.dbapi.treeid],
             )
 
     def _sql_cast_list(self, values):
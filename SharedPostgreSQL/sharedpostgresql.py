@@ -24,11 +24,14 @@
 Backend for PostgreSQL database.
 """
 
+import io
 import os
 import re
+from itertools import groupby
 from uuid import uuid4
 
 import psycopg2
+from psycopg2.extras import execute_batch
 from gramps.gen.config import config
 from gramps.gen.const import GRAMPS_LOCALE as glocale
 from gramps.gen.db.dbconst import ARRAYSIZE
@@ -46,6 +49,9 @@ from shareddbapi import SharedDBAPI
 
 psycopg2.paramstyle = "format"
 
+# Number of statements sent to the server in one round trip by executemany
+BATCH_PAGE_SIZE = 500
+
 
 # -------------------------------------------------------------------------
 #
@@ -105,6 +111,7 @@ class SharedPostgreSQL(SharedDBAPI):
             self.dbapi = Connection(uuid=uuid, **dbkwargs)
         except psycopg2.OperationalError as msg:
             raise DbConnectionError(str(msg), config_file)
+        self._start_change_feed()
 
 
 # -------------------------------------------------------------------------
@@ -117,6 +124,7 @@ class Connection:
         self.__connection = psycopg2.connect(*args, **kwargs)
         self.__connection.autocommit = True
         self.__cursor = self.__connection.cursor()
+        self.__pending = []
         self.uuid = uuid
         self._treeid = ""
         self.check_collation(glocale)
@@ -189,7 +197,37 @@ class Connection:
             "(LOCALE = '%s')" % (collation, locale.collation)
         )
 
+    def queue(self, sql, args):
+        """
+        Queue a statement whose result is not needed. Queued statements
+        are sent together, before the next statement or at commit.
+        """
+        self.__pending.append((_hack_query(sql), args))
+        if len(self.__pending) >= BATCH_PAGE_SIZE:
+            self.flush()
+
+    def flush(self):
+        """
+        Send the queued statements, in order, in as few round trips as
+        possible.
+        """
+        if not self.__pending:
+            return
+        pending, self.__pending = self.__pending, []
+        try:
+            for sql, group in groupby(pending, key=lambda item: item[0]):
+                execute_batch(
+                    self.__cursor,
+                    sql,
+                    [args for _sql, args in group],
+                    page_size=BATCH_PAGE_SIZE,
+                )
+        except:
+            self.__cursor.execute("rollback")
+            raise
+
     def execute(self, *args, **kwargs):
+        self.flush()
         sql = _hack_query(args[0])
         if len(args) > 1:
             args = args[1]
@@ -201,6 +239,67 @@ class Connection:
             self.__cursor.execute("rollback")
             raise
 
+    def executemany(self, sql, args_list):
+        """
+        Execute a statement once for each set of arguments, sending them to
+        the server in pages instead of one round trip per row.
+        """
+        self.flush()
+        sql = _hack_query(sql)
+        try:
+            execute_batch(self.__cursor, sql, args_list, page_size=BATCH_PAGE_SIZE)
+        except:
+            self.__cursor.execute("rollback")
+            raise
+
+    def copy_rows(self, table, columns, rows):
+        """
+        Bulk load rows into a table with COPY.
+
+        :param table: name of the table to load.
+        :param columns: names of the columns, in row order.
+        :param rows: iterable of row tuples.
+        """
+        self.flush()
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write("\t".join(_copy_value(value) for value in row))
+            buffer.write("\n")
+        buffer.seek(0)
+        try:
+            self.__cursor.copy_expert(
+                "COPY %s (%s) FROM STDIN" % (table, ", ".join(columns)), buffer
+            )
+        except:
+            self.__cursor.execute("rollback")
+            raise
+
+    def listen(self, channel):
+        """
+        Subscribe this connection to a notification channel.
+        """
+        self.execute("LISTEN %s" % channel)
+
+    def fileno(self):
+        """
+        Return the socket of the connection, readable when notifications
+        arrive.
+        """
+        return self.__connection.fileno()
+
+    def get_notifications(self):
+        """
+        Return the payloads of the notifications sent by other sessions
+        since the last call. Does not wait.
+        """
+        self.__connection.poll()
+        pid = self.__connection.get_backend_pid()
+        payloads = [
+            notify.payload for notify in self.__connection.notifies if notify.pid != pid
+        ]
+        del self.__connection.notifies[:]
+        return payloads
+
     def fetchone(self):
         try:
             return self.__cursor.fetchone()
@@ -211,15 +310,19 @@ class Connection:
         return self.__cursor.fetchall()
 
     def begin(self):
+        self.flush()
         self.__cursor.execute("BEGIN;")
 
     def commit(self):
+        self.flush()
         self.__cursor.execute("COMMIT;")
 
     def rollback(self):
+        self.__pending = []
         self.__connection.rollback()
 
     def table_exists(self, table):
+        self.flush()
         self.__cursor.execute(
             "SELECT COUNT(*) " "FROM information_schema.tables " "WHERE table_name=%s;",
             [table],
@@ -236,6 +339,7 @@ class Connection:
         :returns: True if the column exists, False otherwise.
         :rtype: bool
         """
+        self.flush()
         self.__cursor.execute(
             "SELECT COUNT(*) FROM information_schema.columns "
             "WHERE table_name = %s AND column_name = %s",
@@ -250,6 +354,7 @@ class Connection:
         self.__connection.close()
 
     def cursor(self):
+        self.flush()
         return Cursor(self.__connection)
 
 
@@ -297,6 +402,21 @@ class Cursor:
             return None
 
 
+def _copy_value(value):
+    """
+    Format a value for the COPY text format.
+    """
+    if value is None:
+        return "\\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
 def _hack_query(query):
     query = query.replace("?", "%s")
     query = query.replace("REGEXP", "~")
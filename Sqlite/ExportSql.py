@@ -85,7 +85,7 @@ def lookup(index, event_ref_list):
 
 def makeDB(db, callback):
     count = 0
-    total = 28
+    total = 26
 
     db.query("""drop table note;""")
     db.query("""CREATE TABLE note (
@@ -131,11 +131,6 @@ def makeDB(db, callback):
     count += 1
     callback(100 * count / total)
 
-    db.query("""CREATE INDEX idx_surname_handle ON
-                  surname(handle);""")
-    count += 1
-    callback(100 * count / total)
-
     db.query("""drop table date;""")
     db.query("""CREATE TABLE date (
                   handle CHARACTER(25) PRIMARY KEY,
@@ -298,11 +293,6 @@ def makeDB(db, callback):
     count += 1
     callback(100 * count / total)
 
-    db.query("""CREATE INDEX idx_link_to ON
-                  link(from_type, from_handle, to_type);""")
-    count += 1
-    callback(100 * count / total)
-
     db.query("""drop table markup;""")
     db.query("""CREATE TABLE markup (
                  handle CHARACTER(25) PRIMARY KEY,
@@ -435,17 +425,77 @@ def makeDB(db, callback):
     callback(100 * count / total)
 
 
+def makeIndexes(db):
+    """
+    Create the secondary indexes.
+
+    Called after the data is loaded: building an index once is much
+    cheaper than keeping it up to date row by row.
+    """
+    db.query("""CREATE INDEX idx_surname_handle ON
+                  surname(handle);""")
+    db.query("""CREATE INDEX idx_link_to ON
+                  link(from_type, from_handle, to_type);""")
+
+
 class Database(object):
     """
     The db connection.
+
+    In batch mode INSERT statements are not executed one by one; their
+    rows are buffered per statement and written with executemany.
     """
+    BUFFER_SIZE = 5000
+
     def __init__(self, database):
         self.batch = False
         self.database = database
         self.db = sqlite.connect(self.database)
         self.cursor = self.db.cursor()
+        self.buffers = {}
+
+    def start_batch(self):
+        """
+        Start a bulk load: buffer inserts, and skip journaling and syncing.
+        """
+        self.cursor.execute("PRAGMA journal_mode=OFF;")
+        self.cursor.execute("PRAGMA synchronous=OFF;")
+        self.batch = True
+
+    def end_batch(self):
+        """
+        Write out all buffered rows, commit, and restore safe settings.
+        """
+        self.flush()
+        self.batch = False
+        self.db.commit()
+        self.cursor.execute("PRAGMA journal_mode=DELETE;")
+        self.cursor.execute("PRAGMA synchronous=FULL;")
+
+    def flush(self, q=None):
+        """
+        Write buffered rows, of one statement or of all of them.
+        """
+        for query in [q] if q else list(self.buffers):
+            rows = self.buffers.pop(query, None)
+            if not rows:
+                continue
+            try:
+                self.cursor.executemany(query, rows)
+            except:
+                print("ERROR: query :", query)
+                raise
 
     def query(self, q, *args):
+        if self.batch and q.lstrip()[:6].upper() == "INSERT":
+            rows = self.buffers.setdefault(q, [])
+            rows.append(args)
+            if len(rows) >= self.BUFFER_SIZE:
+                self.flush(q)
+            return []
+
+        if self.buffers:
+            self.flush()
         args = list(args)
         if q.strip().upper().startswith("DROP"):
             try:
@@ -1040,7 +1090,7 @@ def exportData(database, filename, user, option_box):
     db = Database(filename)
     makeDB(db, callback)
 
-    db.batch = True  # don't commit till end
+    db.start_batch()  # buffer inserts, don't commit till end
     # ---------------------------------
     # Notes
     # ---------------------------------
@@ -1338,8 +1388,9 @@ def exportData(database, filename, user, option_box):
         count += 1
         callback(100 * count / total)
 
-    db.batch = False  # turn off batch processing
-    db.db.commit()  # commit all changes
+    db.end_batch()  # write buffered rows and commit all changes
+    makeIndexes(db)
+    db.db.commit()
     db.db.close()
 
     total_time = time.time() - start
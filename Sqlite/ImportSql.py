@@ -28,7 +28,7 @@
 #-------------------------------------------------------------------------
 import sqlite3 as sqlite
 import time
-from collections import abc
+from collections import abc, defaultdict
 
 #------------------------------------------------------------------------
 #
@@ -55,6 +55,29 @@ except ValueError:
 _ = trans.gettext
 ngettext = trans.ngettext
 
+# Detail tables read in one pass before the import, and the column their
+# rows are looked up by
+PRELOAD_TABLES = {
+    "address": "handle",
+    "attribute": "handle",
+    "child_ref": "handle",
+    "date": "handle",
+    "event_ref": "handle",
+    "location": "handle",
+    "lds": "handle",
+    "markup": "handle",
+    "media_ref": "handle",
+    "name": "handle",
+    "person_ref": "handle",
+    "place": "handle",
+    "repository_ref": "handle",
+    "surname": "handle",
+    "url": "handle",
+    "datamap": "from_handle",
+    "place_name": "from_handle",
+    "place_ref": "from_place_handle",
+}
+
 
 #-------------------------------------------------------------------------
 #
@@ -129,6 +152,8 @@ class SQLReader(object):
         self.filename = filename
         self.callback = callback
         self.debug = 0
+        self.links = {}
+        self.rows = {}
 
     def openSQL(self):
         try:
@@ -144,6 +169,33 @@ class SQLReader(object):
             return None
         return sql
 
+    def preload(self, sql):
+        """
+        Read the link table and the detail tables once, grouping the rows
+        by the handle they are looked up by, so objects are assembled
+        without a query per reference.
+        """
+        self.links = defaultdict(list)
+        for (from_type, from_handle, to_type,
+             to_handle) in sql.query("select from_type, from_handle, to_type,"
+                                     " to_handle from link order by rowid;"):
+            self.links[(from_type, from_handle, to_type)].append(to_handle)
+        self.rows = {}
+        for table, column in PRELOAD_TABLES.items():
+            rows = sql.query("select * from %s;" % table)
+            columns = [desc[0] for desc in sql.cursor.description]
+            position = columns.index(column)
+            grouped = defaultdict(list)
+            for row in rows:
+                grouped[row[position]].append(row)
+            self.rows[table] = grouped
+
+    def get_rows(self, table, handle):
+        """
+        Return the preloaded rows of a table for a handle.
+        """
+        return self.rows[table].get(handle, [])
+
     # -----------------------------------------------
     # Get methods to retrieve data from the tables
     # -----------------------------------------------
@@ -152,8 +204,7 @@ class SQLReader(object):
         results = self.get_links(sql, from_type, from_handle, "address")
         retval = []
         for handle in results:
-            result = sql.query("select * from address where handle = ?;",
-                               handle)
+            result = self.get_rows("address", handle)
             retval.append(self.pack_address(sql, result[0], with_parish))
         return retval
 
@@ -161,8 +212,7 @@ class SQLReader(object):
         handles = self.get_links(sql, from_type, from_handle, "attribute")
         retval = []
         for handle in handles:
-            rows = sql.query("select * from attribute where handle = ?;",
-                             handle)
+            rows = self.get_rows("attribute", handle)
             for row in rows:
                 (handle, the_type0, the_type1, value, private) = row
                 citation_list = self.get_citation_list(sql, "attribute",
@@ -176,8 +226,7 @@ class SQLReader(object):
         results = self.get_links(sql, from_type, from_handle, "child_ref")
         retval = []
         for handle in results:
-            rows = sql.query("select * from child_ref where handle = ?;",
-                             handle)
+            rows = self.get_rows("child_ref", handle)
             for row in rows:
                 (handle, ref, frel0, frel1, mrel0, mrel1, private) = row
                 citation_list = self.get_citation_list(sql, "child_ref",
@@ -189,8 +238,7 @@ class SQLReader(object):
 
     def get_datamap_list(self, sql, from_type, from_handle):
         datamap = []
-        rows = sql.query("select * from datamap where from_handle = ?;",
-                         from_handle)
+        rows = self.get_rows("datamap", from_handle)
         for row in rows:
             (from_handle,
              the_type0,
@@ -204,8 +252,7 @@ class SQLReader(object):
         results = self.get_links(sql, from_type, from_handle, "event_ref")
         retval = []
         for handle in results:
-            result = sql.query("select * from event_ref where handle = ?;",
-                               handle)
+            result = self.get_rows("event_ref", handle)
             retval.append(self.pack_event_ref(sql, result[0]))
         return retval
 
@@ -219,8 +266,7 @@ class SQLReader(object):
         handles = self.get_links(sql, from_type, from_handle, "person_ref")
         retval = []
         for ref_handle in handles:
-            rows = sql.query("select * from person_ref where handle = ?;",
-                             ref_handle)
+            rows = self.get_rows("person_ref", ref_handle)
             for row in rows:
                 (handle,
                  ref,
@@ -240,8 +286,7 @@ class SQLReader(object):
         handles = self.get_links(sql, from_type, from_handle, "location")
         results = []
         for handle in handles:
-            results += sql.query("select * from location where handle = ?;",
-                                 handle)
+            results += self.get_rows("location", handle)
         return [self.pack_location(sql, result, with_parish) for
                 result in results]
 
@@ -249,22 +294,20 @@ class SQLReader(object):
         handles = self.get_links(sql, from_type, from_handle, "lds")
         results = []
         for handle in handles:
-            results += sql.query("""select * from lds where handle = ?;""",
-                                 handle)
+            results += self.get_rows("lds", handle)
         return [self.pack_lds(sql, result) for result in results]
 
     def get_media_list(self, sql, from_type, from_handle):
         handles = self.get_links(sql, from_type, from_handle, "media_ref")
         results = []
         for handle in handles:
-            results += sql.query("select * from media_ref where handle = ?;",
-                                 handle)
+            results += self.get_rows("media_ref", handle)
         return [self.pack_media_ref(sql, result) for result in results]
 
     def get_surname_list(self, sql, handle):
-        results = sql.query(
-            "select s.* from surname s inner join link l ON l.to_handle = "
-            "s.handle where l.from_handle = ?;", handle)
+        results = []
+        for surname_handle in self.get_links(sql, "name", handle, "surname"):
+            results += self.get_rows("surname", surname_handle)
         return [self.pack_surnames(sql, result) for result in results]
 
     def get_note_list(self, sql, from_type, from_handle):
@@ -274,8 +317,7 @@ class SQLReader(object):
         handles = self.get_links(sql, from_type, from_handle, "repository_ref")
         results = []
         for handle in handles:
-            results += sql.query(
-                """select * from repository_ref where handle = ?;""", handle)
+            results += self.get_rows("repository_ref", handle)
         return [self.pack_repository_ref(sql, result) for result in results]
 
     def get_citation_list(self, sql, from_type, from_handle):
@@ -286,8 +328,7 @@ class SQLReader(object):
         handles = self.get_links(sql, from_type, from_handle, "url")
         results = []
         for handle in handles:
-            results += sql.query("""select * from url where handle = ?;""",
-                                 handle)
+            results += self.get_rows("url", handle)
         return [self.pack_url(sql, result) for result in results]
 
     # ---------------------------------
@@ -412,8 +453,7 @@ class SQLReader(object):
     def get_location(self, sql, from_type, from_handle, with_parish):
         handle = self.get_link(sql, from_type, from_handle, "location")
         if handle:
-            results = sql.query("""select * from location where handle = ?;""",
-                                handle)
+            results = self.get_rows("location", handle)
             if len(results) == 1:
                 return self.pack_location(sql, results[0], with_parish)
 
@@ -421,11 +461,8 @@ class SQLReader(object):
         handles = self.get_links(sql, from_type, from_handle, "name")
         names = []
         for handle in handles:
-            results = sql.query(
-                "select * from name where handle = ? and primary_name = ?;",
-                handle, primary)
-            if len(results) > 0:
-                names += results
+            names += [row for row in self.get_rows("name", handle)
+                      if bool(row[1]) == bool(primary)]
         result = [self.pack_name(sql, name) for name in names]
         if primary:
             if len(result) == 1:
@@ -464,8 +501,7 @@ class SQLReader(object):
 
     def get_place_from_handle(self, sql, ref_handle):
         if ref_handle:
-            place_row = sql.query("select * from place where handle = ?;",
-                                  ref_handle)
+            place_row = self.get_rows("place", ref_handle)
             if len(place_row) == 1:
                 # return just the handle here:
                 return place_row[0][0]
@@ -478,8 +514,7 @@ class SQLReader(object):
         return ''
 
     def get_alt_place_name_list(self, sql, handle):
-        place_name_list = sql.query(
-            """select * from place_name where from_handle = ?;""", handle)
+        place_name_list = self.get_rows("place_name", handle)
         retval = []
         for place_name_data in place_name_list:
             ref_handle, handle, value, lang = place_name_data
@@ -491,8 +526,7 @@ class SQLReader(object):
     def get_place_ref_list(self, sql, handle):
         # place_ref_list = Enclosed by:  [('4ECKQCWCLO5YIHXEXC', None)]
         # [(handle, date)...]
-        place_ref_list = sql.query(
-            """select * from place_ref where from_place_handle = ?;""", handle)
+        place_ref_list = self.get_rows("place_ref", handle)
         retval = []
         for place_ref_data in place_ref_list:
             ref_handle, handle, to_place_handle = place_ref_data
@@ -504,8 +538,7 @@ class SQLReader(object):
     def get_main_location(self, sql, from_handle, with_parish):
         ref_handle = self.get_link(sql, "place_main", from_handle, "location")
         if ref_handle:
-            place_row = sql.query("select * from location where handle = ?;",
-                                  ref_handle)
+            place_row = self.get_rows("location", ref_handle)
             if len(place_row) == 1:
                 return self.pack_location(sql, place_row[0], with_parish)
             elif len(place_row) == 0:
@@ -537,17 +570,13 @@ class SQLReader(object):
         """
         Return a list of handles (possibly none).
         """
-        results = sql.query(
-            """select to_handle from link where from_type = ? and """
-            """from_handle = ? and to_type = ?;""",
-            from_type, from_handle, to_link)
-        return [result[0] for result in results]
+        return list(self.links.get((from_type, from_handle, to_link), []))
 
     def get_date(self, sql, handle):
         assert type(handle) in [str, type(None)], ("handle is wrong type: %s" %
                                                    handle)
         if handle:
-            rows = sql.query("select * from date where handle = ?;", handle)
+            rows = self.get_rows("date", handle)
             if len(rows) == 1:
                 (handle,
                  calendar,
@@ -591,6 +620,7 @@ class SQLReader(object):
             self.db.disable_signals()
             count = 0.0
             self.t = time.time()
+            self.preload(sql)
             self._process(count, total, sql)
         sql.db.commit()
         sql.db.close()
@@ -611,13 +641,8 @@ class SQLReader(object):
              change,
              private) = note
             styled_text = [text, []]
-            markups = sql.query("""select * from link where from_handle = ? """
-                                """and to_type = 'markup';""",
-                                handle)
-            for markup_link in markups:
-                _from_type, _from_handle, _to_type, to_handle = markup_link
-                markup_detail = sql.query(
-                    """select * from markup where handle = ?;""", to_handle)
+            for to_handle in self.get_links(sql, "note", handle, "markup"):
+                markup_detail = self.get_rows("markup", to_handle)
                 for markup in markup_detail:
                     (_mhandle,
                      markup0,
@@ -21,6 +21,23 @@
 
 """Tools/Utilities/Thumbnail Generator"""
 
+#-------------------------------------------------------------------------
+#
+# Python modules
+#
+#-------------------------------------------------------------------------
+import os
+import logging
+from hashlib import md5
+from concurrent.futures import ProcessPoolExecutor
+
+#-------------------------------------------------------------------------
+#
+# GTK modules
+#
+#-------------------------------------------------------------------------
+from gi.repository import GdkPixbuf
+
 #-------------------------------------------------------------------------
 #
 # Gramps modules
@@ -28,8 +45,10 @@
 #-------------------------------------------------------------------------
 from gramps.gui.plug import tool
 from gramps.gui.utils import ProgressMeter
-from gramps.gen.utils.thumbnails import get_thumbnail_image, SIZE_NORMAL, SIZE_LARGE
+from gramps.gen.utils.thumbnails import get_thumbnail_path, SIZE_NORMAL, SIZE_LARGE
 from gramps.gen.utils.file import media_path_full
+from gramps.gen.const import (THUMB_NORMAL, THUMB_LARGE, THUMBSCALE,
+                              THUMBSCALE_LARGE)
 
 from gramps.gen.const import GRAMPS_LOCALE as glocale
 try:
@@ -38,6 +57,11 @@ except ValueError:
     _trans = glocale.translation
 _ = _trans.gettext
 
+LOG = logging.getLogger(".thumbnail")
+
+# Number of images handed to a worker process at a time
+CHUNK_SIZE = 8
+
 #-------------------------------------------------------------------------
 #
 # Thumbnail Generator
@@ -52,82 +76,186 @@ class ThumbnailGenerator(tool.Tool):
         self.db = dbstate.db
         progress = ProgressMeter(_('Thumbnail Generator'), can_cancel=True)
 
-        length = self.db.get_number_of_media()
-        progress.set_pass(_('Generating media thumbnails'),
-                               length)
-        for media in dbstate.db.iter_media():
-            full_path = media_path_full(dbstate.db, media.get_path())
-            mime_type = media.get_mime_type()
-            generate_thumbnail(full_path, mime_type)
-            progress.step()
-            if progress.get_cancelled():
-                break
+        jobs = self.find_thumbnails(progress)
+        if not progress.get_cancelled():
+            jobs = self.find_stale(jobs, progress)
+        if not progress.get_cancelled():
+            self.generate_thumbnails(jobs, progress)
 
-        length = self.db.get_number_of_people()
-        progress.set_pass(_('Generating thumbnails for person references'),
-                               length)
-        for person in dbstate.db.iter_people():
-            self.generate_thumbnails(person)
-            progress.step()
-            if progress.get_cancelled():
-                break
+        progress.close()
 
-        length = self.db.get_number_of_families()
-        progress.set_pass(_('Generating thumbnails for family references'),
-                               length)
-        for family in dbstate.db.iter_families():
-            self.generate_thumbnails(family)
-            progress.step()
-            if progress.get_cancelled():
-                break
+    def find_thumbnails(self, progress):
+        """
+        Return the unique (path, mime type, rectangle) thumbnail sources of
+        all media objects and of the media references of people, families,
+        events, places and sources.
+        """
+        jobs = {}
+        media_files = {}
 
-        length = self.db.get_number_of_events()
-        progress.set_pass(_('Generating thumbnails for event references'),
-                               length)
-        for event in dbstate.db.iter_events():
-            self.generate_thumbnails(event)
+        length = self.db.get_number_of_media()
+        progress.set_pass(_('Finding media files'), length)
+        for media in self.db.iter_media():
+            full_path = media_path_full(self.db, media.get_path())
+            mime_type = media.get_mime_type()
+            media_files[media.get_handle()] = (full_path, mime_type)
+            jobs[(full_path, None)] = (full_path, mime_type, None)
             progress.step()
             if progress.get_cancelled():
-                break
+                return jobs
 
-        length = self.db.get_number_of_places()
-        progress.set_pass(_('Generating thumbnails for place references'),
-                               length)
-        for place in dbstate.db.iter_places():
-            self.generate_thumbnails(place)
-            progress.step()
-            if progress.get_cancelled():
-                break
+        length = (self.db.get_number_of_people() +
+                  self.db.get_number_of_families() +
+                  self.db.get_number_of_events() +
+                  self.db.get_number_of_places() +
+                  self.db.get_number_of_sources())
+        progress.set_pass(_('Finding media references'), length)
+        for objects in (self.db.iter_people(), self.db.iter_families(),
+                        self.db.iter_events(), self.db.iter_places(),
+                        self.db.iter_sources()):
+            for obj in objects:
+                for media_ref in obj.get_media_list():
+                    handle = media_ref.get_reference_handle()
+                    if handle not in media_files:
+                        continue
+                    full_path, mime_type = media_files[handle]
+                    rectangle = media_ref.get_rectangle()
+                    # thumbnails are named after str(rectangle), so it is
+                    # also the key here
+                    key = (full_path,
+                           None if rectangle is None else str(rectangle))
+                    jobs[key] = (full_path, mime_type, rectangle)
+                progress.step()
+                if progress.get_cancelled():
+                    return jobs
+        return jobs
 
-        length = self.db.get_number_of_sources()
-        progress.set_pass(_('Generating thumbnails for source references'),
-                               length)
-        for source in dbstate.db.iter_sources():
-            self.generate_thumbnails(source)
+    def find_stale(self, jobs, progress):
+        """
+        Return the thumbnails sources with the sizes that are missing or
+        older than their source file.
+        """
+        stale = []
+        progress.set_pass(_('Checking thumbnails'), len(jobs))
+        for full_path, mime_type, rectangle in jobs.values():
+            sizes = [size for size in (SIZE_NORMAL, SIZE_LARGE)
+                     if not is_fresh(full_path, rectangle, size)]
+            if sizes:
+                stale.append((full_path, mime_type, rectangle, sizes))
             progress.step()
             if progress.get_cancelled():
                 break
+        return stale
 
-        progress.close()
-
-    def generate_thumbnails(self, obj):
+    def generate_thumbnails(self, jobs, progress):
         """
-        Generate thumbnails for media references of a given object.
+        Generate the thumbnails. Local images are decoded once for all
+        sizes in worker processes; other files are handed to the
+        thumbnailer plugins.
         """
-        for media_ref in obj.get_media_list():
-            handle = media_ref.get_reference_handle()
-            media = self.db.get_media_from_handle(handle)
-            full_path = media_path_full(self.db, media.get_path())
-            mime_type = media.get_mime_type()
-            rectangle = media_ref.get_rectangle()
-            generate_thumbnail(full_path, mime_type, rectangle)
+        progress.set_pass(_('Generating media thumbnails'), len(jobs))
+        images = []
+        for full_path, mime_type, rectangle, sizes in jobs:
+            if (mime_type and mime_type.startswith('image') and
+                    not full_path.startswith(('http://', 'https://'))):
+                images.append((full_path, mime_type, rectangle, sizes))
+            else:
+                for size in sizes:
+                    get_thumbnail_path(full_path, mime_type, rectangle, size)
+                progress.step()
+                if progress.get_cancelled():
+                    return
+
+        if not images:
+            return
+        executor = ProcessPoolExecutor()
+        try:
+            results = executor.map(make_thumbnails,
+                                   [image[0] for image in images],
+                                   [image[2] for image in images],
+                                   [image[3] for image in images],
+                                   chunksize=CHUNK_SIZE)
+            for image, success in zip(images, results):
+                full_path, mime_type, rectangle, sizes = image
+                if not success:
+                    # let the thumbnailer plugins try
+                    for size in sizes:
+                        get_thumbnail_path(full_path, mime_type, rectangle,
+                                           size)
+                progress.step()
+                if progress.get_cancelled():
+                    break
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+def thumbnail_path(full_path, rectangle, size):
+    """
+    Return the thumbnail file of an image rectangle, named as by
+    gramps.gen.utils.thumbnails.
+    """
+    prehash = full_path
+    if rectangle is not None:
+        prehash += '?' + str(rectangle)
+    base_dir = THUMB_LARGE if size == SIZE_LARGE else THUMB_NORMAL
+    return os.path.join(base_dir,
+                        md5(prehash.encode('utf-8')).hexdigest() + '.png')
+
+def is_fresh(full_path, rectangle, size):
+    """
+    Return True if a thumbnail need not be generated: it exists and is
+    not older than a local source file, or the source file is missing.
+    """
+    filename = thumbnail_path(full_path, rectangle, size)
+    if not os.path.isfile(filename):
+        return (not full_path.startswith(('http://', 'https://')) and
+                not os.path.isfile(full_path))
+    if full_path.startswith(('http://', 'https://')):
+        return True
+    try:
+        return os.path.getmtime(full_path) <= os.path.getmtime(filename)
+    except OSError:
+        return True
 
-def generate_thumbnail(full_path, mime_type, rectangle=None):
+def make_thumbnails(full_path, rectangle, sizes):
     """
-    Generate thumbnails for an image rectangle.
+    Decode an image once and write its thumbnails in the given sizes.
+    Runs in a worker process.
     """
-    get_thumbnail_image(full_path, mime_type, rectangle, SIZE_NORMAL)
-    get_thumbnail_image(full_path, mime_type, rectangle, SIZE_LARGE)
+    try:
+        pixbuf = GdkPixbuf.Pixbuf.new_from_file(full_path)
+        width = pixbuf.get_width()
+        height = pixbuf.get_height()
+
+        if rectangle is not None:
+            upper_x = min(rectangle[0], rectangle[2]) / 100.0
+            lower_x = max(rectangle[0], rectangle[2]) / 100.0
+            upper_y = min(rectangle[1], rectangle[3]) / 100.0
+            lower_y = max(rectangle[1], rectangle[3]) / 100.0
+            sub_x = int(upper_x * width)
+            sub_y = int(upper_y * height)
+            sub_width = int((lower_x - upper_x) * width)
+            sub_height = int((lower_y - upper_y) * height)
+            if sub_width > 0 and sub_height > 0:
+                pixbuf = pixbuf.new_subpixbuf(sub_x, sub_y,
+                                              sub_width, sub_height)
+                width = sub_width
+                height = sub_height
+
+        for size in sizes:
+            if size == SIZE_LARGE:
+                thumbscale = THUMBSCALE_LARGE
+            else:
+                thumbscale = THUMBSCALE
+            scale = thumbscale / float(max(width, height))
+            scaled = pixbuf.scale_simple(int(width * scale),
+                                         int(height * scale),
+                                         GdkPixbuf.InterpType.BILINEAR)
+            scaled.savev(thumbnail_path(full_path, rectangle, size),
+                         'png', [], [])
+        return True
+    except Exception as err:
+        LOG.warning("Error scaling image down: %s", str(err))
+        return False
 
 #------------------------------------------------------------------------
 #
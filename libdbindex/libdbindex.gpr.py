@@ -0,0 +1,22 @@
+# ------------------------------------------------------------------------
+#
+# Register the Addon
+#
+# ------------------------------------------------------------------------
+
+register(
+    GENERAL,
+    id="libdbindex",
+    name="libdbindex",
+    description=_(
+        "Library for database indexes shared by filter rules. Indexes of "
+        "proxy databases are rebuilt on every update, so rules update them "
+        "once per prepare."
+    ),
+    status=STABLE,
+    version = '1.0.0',
+    gramps_target_version="6.0",
+    fname="libdbindex.py",
+    load_on_reg=True,
+    audience=DEVELOPER,
+)
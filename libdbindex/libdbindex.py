@@ -0,0 +1,132 @@
+#
+# Gramps - a GTK+/GNOME based genealogy program
+#
+# Copyright (C) 2025  Steve Youngs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+"""
+Indexes of a whole database, shared by filter rules.
+
+An index is built from raw data once, and rebuilt only after one of its
+signals was emitted. Proxy databases (private, living, filter, ...) emit
+no signals of their own and forward unknown attributes to the database
+they wrap, so they are read through their public, filtered interface and
+never cached: update() rebuilds the index on every call for them. Callers
+must therefore call update() once per filter rule prepare, and query the
+index afterwards without updating it again.
+"""
+
+# -------------------------------------------------------------------------
+#
+# Standard python modules
+#
+# -------------------------------------------------------------------------
+from abc import ABC, abstractmethod
+
+# -------------------------------------------------------------------------
+#
+# Gramps modules
+#
+# -------------------------------------------------------------------------
+from gramps.gen.db.generic import DbGeneric
+
+# -------------------------------------------------------------------------
+#
+# Typing modules
+#
+# -------------------------------------------------------------------------
+from typing import Iterator, List, Tuple
+from gramps.gen.db import Database
+
+
+def is_tracked(db: Database) -> bool:
+    """Return True if the database emits signals and its raw data is its own."""
+    return isinstance(db, DbGeneric)
+
+
+def iter_raw_people(db: Database) -> Iterator[Tuple[str, dict]]:
+    """Yield (handle, raw data) of the people of a database or proxy."""
+    if is_tracked(db):
+        return db._iter_raw_person_data()
+    return (
+        (handle, db.get_raw_person_data(handle))
+        for handle in db.iter_person_handles()
+    )
+
+
+def iter_raw_families(db: Database) -> Iterator[Tuple[str, dict]]:
+    """Yield (handle, raw data) of the families of a database or proxy."""
+    if is_tracked(db):
+        return db._iter_raw_family_data()
+    return (
+        (handle, db.get_raw_family_data(handle))
+        for handle in db.iter_family_handles()
+    )
+
+
+# -------------------------------------------------------------------------
+#
+# SharedIndex
+#
+# -------------------------------------------------------------------------
+class SharedIndex(ABC):
+    """
+    Base class of the shared indexes. Subclasses list the signals that
+    make the index outdated in SIGNALS, and fill the index in build().
+    """
+
+    SIGNALS: Tuple[str, ...] = ()
+
+    def __init__(self):
+        self.db = None
+        self.dbid = None
+        self.keys: List[int] = []
+        self.generation = 0
+        self.built_generation = -1
+
+    def update(self, db: Database):
+        """
+        Make sure the index matches the database. A proxy database is read
+        again on every call.
+        """
+        if not is_tracked(db):
+            self.build(db)
+            # the next tracked database must be read again
+            self.built_generation = -1
+            return
+        if db is not self.db or db.get_dbid() != self.dbid:
+            self.disconnect()
+            self.db = db
+            self.dbid = db.get_dbid()
+            self.keys = [db.connect(signal, self.changed) for signal in self.SIGNALS]
+            self.generation += 1
+        if self.built_generation != self.generation:
+            self.build(db)
+            self.built_generation = self.generation
+
+    def disconnect(self):
+        """Stop listening to the signals of the current database."""
+        for key in self.keys:
+            self.db.disconnect(key)
+        self.keys = []
+
+    def changed(self, *args):
+        """Mark the index as outdated."""
+        self.generation += 1
+
+    @abstractmethod
+    def build(self, db: Database):
+        """Fill the index from the database."""